@@ -9,8 +9,18 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+if settings.DEBUG:
+    # Served by runserver before, the event stream needs an ASGI server.
+    django_application = ASGIStaticFilesHandler(django_application)
+
+# Imported once Django is set up.
+from recipe.events import EventStreamRouter  # noqa: E402
+
+application = EventStreamRouter(django_application)
@@ -17,10 +17,14 @@ DEBUG = True
 ALLOWED_HOSTS = []
 
 
+# Process role: 'api' workers serve only the REST API and skip optional apps
+# (the admin), 'all' serves everything.
+APP_ROLE = os.getenv('APP_ROLE', 'all')
+
+
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -33,8 +37,13 @@ INSTALLED_APPS = [
     'recipe',
 ]
 
+if APP_ROLE != 'api':
+    INSTALLED_APPS.insert(0, 'django.contrib.admin')
+
 MIDDLEWARE = [
+    'core.middleware.QueryAuditMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -128,8 +137,126 @@ USE_TZ = True
 STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 
-STATIC_ROOL = '/vol/web/static'
-MEDIA_ROOL = '/vol/web/media'
+STATIC_ROOT = os.getenv('STATIC_ROOT', str(BASE_DIR / 'static'))
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', str(BASE_DIR / 'media'))
+
+# How /media/ responses are sent: 'django' streams files with FileResponse
+# (zero-copy where the WSGI server supports it), 'x-accel-redirect' (nginx)
+# and 'x-sendfile' (Apache, lighttpd) hand the transfer to the web server.
+MEDIA_SERVE_MODE = os.getenv('MEDIA_SERVE_MODE', 'django')
+MEDIA_ACCEL_PREFIX = os.getenv('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+# Storage of uploaded media: core.storage.LocalObjectStorage keeps files in
+# MEDIA_ROOT, core.storage.S3Storage in an S3 compatible bucket (e.g. MinIO).
+DEFAULT_FILE_STORAGE = os.getenv('STORAGE_BACKEND', 'core.storage.LocalObjectStorage')
+
+OBJECT_STORAGE = {
+    'BUCKET': os.getenv('STORAGE_BUCKET'),
+    'ENDPOINT_URL': os.getenv('STORAGE_ENDPOINT_URL'),
+    'REGION': os.getenv('STORAGE_REGION'),
+    'ACCESS_KEY': os.getenv('STORAGE_ACCESS_KEY'),
+    'SECRET_KEY': os.getenv('STORAGE_SECRET_KEY'),
+    'PUBLIC_URL': os.getenv('STORAGE_PUBLIC_URL'),
+    'UPLOAD_EXPIRES': 600,
+    'MAX_UPLOAD_SIZE': 10 * 1024 * 1024,
+}
 
 # Custom user model
 AUTH_USER_MODEL = 'core.User'
+
+
+# Seconds for which /readyz reuses the result of its database and cache checks
+HEALTH_CHECK_CACHE_SECONDS = 5
+
+
+# Server-sent change events served by app.asgi, woken through Postgres NOTIFY
+# ('postgres') or, with a single server process, in-process ('local')
+EVENT_STREAM = {
+    'BROADCASTER': os.getenv('EVENT_BROADCASTER', 'postgres'),
+    'CHANNEL': 'recipe_changes',
+    'HEARTBEAT_SECONDS': int(os.getenv('EVENT_HEARTBEAT_SECONDS', 15)),
+    'RETRY_MS': 3000,
+    'PAGE_SIZE': 100,
+}
+
+
+# Database backed task queue, run by `manage.py run_worker`
+TASK_QUEUE = {
+    'MAX_ATTEMPTS': 5,
+    'RETRY_BACKOFF_SECONDS': 10,
+    'MAX_BACKOFF_SECONDS': 3600,
+    # Running tasks locked for longer belong to a dead worker and are queued again.
+    'LOCK_TIMEOUT_SECONDS': 600,
+    # Interval at which workers refresh the lock of the tasks they run.
+    'HEARTBEAT_SECONDS': 60,
+    'POLL_INTERVAL_SECONDS': 1,
+}
+
+
+# Idempotency-Key handling of API writes, see core.idempotency
+IDEMPOTENCY = {
+    # Responses are replayed for keys reused within this time.
+    'TTL_HOURS': 24,
+    # A key still in progress after this long belongs to a crashed request.
+    'LOCK_TIMEOUT_SECONDS': 60,
+    'MAX_KEY_LENGTH': 255,
+}
+
+
+# Background purge of the data of deleted users
+USER_PURGE = {
+    # Rows deleted per transaction when purging a deleted user's data.
+    'BATCH_SIZE': 500,
+    # Released images are kept this long, as gc_images does, then deleted.
+    'IMAGE_GRACE_SECONDS': 24 * 3600,
+}
+
+
+# Admin changelists of unfiltered tables with more rows show an estimated count
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+# Number of users whose ingredient index is kept in memory by each process
+INGREDIENT_INDEX_CACHE_SIZE = 128
+
+
+# Signed access tokens and rotated refresh tokens
+AUTH_TOKENS = {
+    'ACCESS_LIFETIME_SECONDS': int(os.getenv('ACCESS_TOKEN_LIFETIME_SECONDS', 300)),
+    'REFRESH_LIFETIME_DAYS': int(os.getenv('REFRESH_TOKEN_LIFETIME_DAYS', 30)),
+    # Database tokens (`token` of the login response) expire this long after creation.
+    'DATABASE_TOKEN_LIFETIME_DAYS': int(os.getenv('DATABASE_TOKEN_LIFETIME_DAYS', 30)),
+    'REVOCATION_REFRESH_SECONDS': 10,
+}
+
+
+# Query auditing (N+1 and slow query detection), meant for tests and staging
+QUERY_AUDIT = {
+    'ENABLED': bool(int(os.getenv('QUERY_AUDIT', 0))),
+    'SLOW_QUERY_MS': int(os.getenv('QUERY_AUDIT_SLOW_MS', 100)),
+    'REPEAT_THRESHOLD': int(os.getenv('QUERY_AUDIT_REPEAT_THRESHOLD', 5)),
+    'EXPLAIN': True,
+}
+
+
+# Response compression by core.middleware.CompressionMiddleware. 'br' and
+# 'zstd' are used when the brotli and zstandard packages are installed.
+# Responses mixing secrets with reflected input are open to BREACH, the
+# API only sends tokens in small responses, below MIN_SIZE.
+COMPRESSION = {
+    'ENABLED': bool(int(os.getenv('COMPRESSION', 1))),
+    'ENCODINGS': ('zstd', 'br', 'gzip'),
+    'LEVELS': {'zstd': 3, 'br': 4, 'gzip': 6},
+    'MIN_SIZE': 1024,
+    'SKIP_CONTENT_TYPES': (
+        'image/',
+        'video/',
+        'audio/',
+        'font/woff',
+        'application/zip',
+        'application/gzip',
+        'application/zstd',
+        'application/octet-stream',
+        'text/event-stream',
+    ),
+}
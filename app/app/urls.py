@@ -1,10 +1,18 @@
-from django.contrib import admin
 from django.urls import path, include
-from django.conf.urls.static import static
 from django.conf import settings
 
+from core import views as core_views
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    path('healthz', core_views.healthz, name='healthz'),
+    path('readyz', core_views.readyz, name='readyz'),
+    path('storage/upload/', core_views.storage_upload, name='storage-upload'),
     path('api/users/', include('users.urls')),
     path('api/recipe/', include('recipe.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', core_views.serve_media, name='media'),
+]
+
+if settings.APP_ROLE != 'api':
+    from django.contrib import admin
+
+    urlpatterns.append(path('admin/', admin.site.urls))
@@ -1,25 +1,110 @@
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.core.paginator import Paginator
+from django.db import connections, router
+from django.utils.functional import cached_property
 from django.utils.translation import gettext as _
 
 from core import models
+from users.tasks import soft_delete_user
+
+
+def estimated_count(model) -> int:
+    """Return the row count of the model's table estimated by Postgres, -1 when unknown."""
+    using = router.db_for_read(model)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [model._meta.db_table],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else -1
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that estimates the count of unfiltered big tables instead of counting.
+
+    Exact counts scan the table, estimates from the planner statistics are
+    used from ADMIN_ESTIMATED_COUNT_THRESHOLD rows on.
+    """
+
+    @cached_property
+    def count(self) -> int:
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_count(self.object_list.model)
+            if estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Admin of a table with millions of rows.
+
+    Search fields are prefix searches (`^`), served by the UPPER(...)
+    text_pattern_ops indexes of migration 0015.
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-id',)
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
 
 
 class UserAdmin(BaseUserAdmin):
     ordering = ('id',)
     list_display = ('id', 'email', 'name', 'is_staff')
+    search_fields = ('^email', '^name')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    readonly_fields = ('deleted_at',)
     fieldsets = (
         (None, dict(fields=('email', 'password'))),
         (_('Personal Info'), dict(fields=('name',))),
         (_('Permissions'), dict(fields=('is_active', 'is_superuser', 'is_staff'))),
-        (_('Dates'), dict(fields=('last_login',))),
+        (_('Dates'), dict(fields=('last_login', 'deleted_at'))),
     )
     add_fieldsets = (
         (None, dict(classes=('wide',), fields=('email', 'password1', 'password2'))),
     )
 
+    def get_deleted_objects(self, objs, request):
+        """List only the users, their objects are purged in the background."""
+        perms_needed = set()
+        if not self.has_delete_permission(request):
+            perms_needed.add(self.opts.verbose_name)
+        users = [str(user) for user in objs]
+        return users, {self.opts.verbose_name_plural: len(users)}, perms_needed, []
+
+    def delete_model(self, request, obj):
+        if obj.deleted_at is None:
+            soft_delete_user(obj)
+
+    def delete_queryset(self, request, queryset):
+        for user in queryset.filter(deleted_at__isnull=True):
+            soft_delete_user(user)
+
+
+class TagAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'user')
+    search_fields = ('^name',)
+
+
+class IngredientAdmin(LargeTableAdmin):
+    list_display = ('id', 'name', 'user')
+    search_fields = ('^name',)
+
+
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ('id', 'title', 'user', 'time_minutes', 'price')
+    search_fields = ('^title',)
+    # Only the selected tags and ingredients are rendered, others are searched for.
+    autocomplete_fields = ('tags', 'ingredients')
+
 
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Tag)
-admin.site.register(models.Ingredient)
-admin.site.register(models.Recipe)
+admin.site.register(models.Tag, TagAdmin)
+admin.site.register(models.Ingredient, IngredientAdmin)
+admin.site.register(models.Recipe, RecipeAdmin)
@@ -0,0 +1,197 @@
+import hashlib
+import secrets
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import FrozenSet, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+
+from core.models import RefreshToken
+
+ACCESS_TOKEN_SALT = 'core.authentication.access'
+
+
+def get_token_settings() -> dict:
+    return settings.AUTH_TOKENS
+
+
+def _hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def issue_access_token(user_id: int, family: uuid.UUID) -> str:
+    """Return an HMAC signed access token, verified without a database query."""
+    return signing.dumps({'u': user_id, 'f': family.hex}, salt=ACCESS_TOKEN_SALT)
+
+
+def load_access_token(token: str) -> dict:
+    """Return the payload of a valid access token, raising BadSignature otherwise."""
+    max_age = get_token_settings()['ACCESS_LIFETIME_SECONDS']
+    return signing.loads(token, salt=ACCESS_TOKEN_SALT, max_age=max_age)
+
+
+def issue_tokens(user, family: uuid.UUID = None) -> dict:
+    """Create a refresh token for the user and return it with a new access token."""
+    options = get_token_settings()
+    family = family or uuid.uuid4()
+    refresh = secrets.token_urlsafe(32)
+    RefreshToken.objects.create(
+        user=user,
+        token_hash=_hash(refresh),
+        family=family,
+        expires_at=timezone.now() + timedelta(days=options['REFRESH_LIFETIME_DAYS']),
+    )
+    return {
+        'access': issue_access_token(user.pk, family),
+        'refresh': refresh,
+        'expires_in': options['ACCESS_LIFETIME_SECONDS'],
+    }
+
+
+def rotate_refresh_token(refresh: str) -> Optional[dict]:
+    """Exchange a refresh token for new tokens, return None when it is not valid.
+
+    A token that was already used has leaked, or its use raced another, so its
+    whole family is revoked.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        token = (
+            RefreshToken.objects.select_for_update()
+            .select_related('user')
+            .filter(token_hash=_hash(refresh))
+            .first()
+        )
+        if token is None or token.revoked_at or token.expires_at <= now:
+            return None
+        if token.used_at:
+            revoke_family(token.family)
+            return None
+        if not token.user.is_active:
+            return None
+        token.used_at = now
+        token.save(update_fields=['used_at'])
+        return issue_tokens(token.user, token.family)
+
+
+def revoke_family(family: uuid.UUID):
+    RefreshToken.objects.filter(family=family, revoked_at__isnull=True).update(
+        revoked_at=timezone.now()
+    )
+    revocation_list.invalidate()
+
+
+def revoke_refresh_token(refresh: str) -> bool:
+    """Revoke the family of a refresh token, its access tokens stop working too."""
+    token = RefreshToken.objects.filter(token_hash=_hash(refresh)).first()
+    if token is None:
+        return False
+    revoke_family(token.family)
+    return True
+
+
+def revoke_user(user_id: int):
+    RefreshToken.objects.filter(user_id=user_id, revoked_at__isnull=True).update(
+        revoked_at=timezone.now()
+    )
+    revocation_list.invalidate()
+
+
+class RevocationList:
+    """Token families revoked recently enough for their access tokens to be valid.
+
+    Kept in memory and reloaded every REVOCATION_REFRESH_SECONDS, so a
+    revocation takes up to that long to reach other processes.
+    """
+
+    def __init__(self):
+        self.families: FrozenSet[str] = frozenset()
+        self.loaded_at = None
+        self.lock = threading.Lock()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def load(self):
+        options = get_token_settings()
+        since = timezone.now() - timedelta(seconds=options['ACCESS_LIFETIME_SECONDS'])
+        families = RefreshToken.objects.filter(revoked_at__gte=since).values_list(
+            'family', flat=True
+        )
+        self.families = frozenset(family.hex for family in families.distinct())
+        self.loaded_at = time.monotonic()
+
+    def is_revoked(self, family: str) -> bool:
+        interval = get_token_settings()['REVOCATION_REFRESH_SECONDS']
+        if self.loaded_at is None or time.monotonic() - self.loaded_at >= interval:
+            with self.lock:
+                if self.loaded_at is None or time.monotonic() - self.loaded_at >= interval:
+                    self.load()
+        return family in self.families
+
+
+revocation_list = RevocationList()
+
+
+def authenticate_access_token(token: str):
+    """Return the active user of a valid access token, or None.
+
+    The token is verified without a query, the user is loaded by its
+    primary key, so deactivated users are rejected at once in every process.
+    """
+    try:
+        payload = load_access_token(token)
+    except signing.BadSignature:
+        return None
+    if revocation_list.is_revoked(payload['f']):
+        return None
+    return get_user_model().objects.filter(pk=payload['u'], is_active=True).first()
+
+
+def database_token_expired(token: Token) -> bool:
+    lifetime = timedelta(days=get_token_settings()['DATABASE_TOKEN_LIFETIME_DAYS'])
+    return token.created < timezone.now() - lifetime
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authenticate `Authorization: Bearer <access token>` headers."""
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request) -> Optional[Tuple[object, None]]:
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid bearer header.'))
+        user = authenticate_access_token(auth[1].decode('latin1'))
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('Invalid, expired or revoked token.'))
+        return user, None
+
+    def authenticate_header(self, request) -> str:
+        return self.keyword
+
+
+class ExpiringTokenAuthentication(TokenAuthentication):
+    """Authenticate database tokens, rejecting those older than DATABASE_TOKEN_LIFETIME_DAYS."""
+
+    def authenticate_credentials(self, key):
+        user, token = super().authenticate_credentials(key)
+        if database_token_expired(token):
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        return user, token
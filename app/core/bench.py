@@ -0,0 +1,218 @@
+import io
+import math
+import platform
+import random
+import subprocess
+import time
+from typing import Callable, Dict, List
+
+import django
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import compression
+from core.models import Tag, Ingredient, Recipe
+from core.seed import SEED_PASSWORD, seed_dataset
+
+
+# Levels measured by the compression report: fastest, default and smallest.
+COMPRESSION_LEVELS = {'gzip': (1, 6, 9), 'br': (1, 4, 11), 'zstd': (1, 3, 19)}
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Return the nearest-rank percentile of the samples."""
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def measure(call: Callable[[], object], iterations: int, warmup: int = 3) -> dict:
+    """Run `call` repeatedly and return latency percentiles (ms) and throughput."""
+    for _ in range(warmup):
+        call()
+
+    samples = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'iterations': iterations,
+        'throughput_rps': round(iterations / elapsed, 2),
+        'mean_ms': round(sum(samples) / len(samples), 3),
+        'p50_ms': round(percentile(samples, 50), 3),
+        'p99_ms': round(percentile(samples, 99), 3),
+    }
+
+
+def _jpeg_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def _expect(response, status_code):
+    if response.status_code != status_code:
+        raise RuntimeError(
+            f'Expected {status_code}, got {response.status_code}: {response.content[:200]}'
+        )
+    return response
+
+
+def build_scenarios(user) -> Dict[str, Callable[[], object]]:
+    """Return benchmark scenarios for the API hot paths, run as `user`."""
+    rnd = random.Random(0)
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    anonymous = APIClient()
+
+    recipe_ids = list(Recipe.objects.filter(user=user).values_list('id', flat=True))
+    tag_ids = list(Tag.objects.filter(user=user).values_list('id', flat=True))
+    ingredient_ids = list(Ingredient.objects.filter(user=user).values_list('id', flat=True))
+    recipes_url = reverse('recipe:recipe-list')
+    image = _jpeg_bytes()
+
+    def recipe_detail():
+        url = reverse('recipe:recipe-detail', args=[rnd.choice(recipe_ids)])
+        return _expect(client.get(url), 200)
+
+    def recipe_filter():
+        params = {
+            'tags': ','.join(str(pk) for pk in rnd.sample(tag_ids, min(2, len(tag_ids)))),
+            'ingredients': ','.join(
+                str(pk) for pk in rnd.sample(ingredient_ids, min(2, len(ingredient_ids)))
+            ),
+        }
+        return _expect(client.get(recipes_url, params), 200)
+
+    def image_upload():
+        url = reverse('recipe:recipe-upload-image', args=[rnd.choice(recipe_ids)])
+        upload = io.BytesIO(image)
+        upload.name = 'bench.jpg'
+        return _expect(client.post(url, {'image': upload}, format='multipart'), 200)
+
+    large_ingredient_ids = ingredient_ids[:100]
+    large_recipe_id = Recipe.objects.filter(user=user).values_list('id', flat=True).first()
+
+    def recipe_create_large():
+        payload = {
+            'title': 'Bench recipe',
+            'time_minutes': 10,
+            'price': '5.00',
+            'tags': tag_ids[:5],
+            'ingredients': large_ingredient_ids,
+        }
+        return _expect(client.post(recipes_url, payload, format='json'), 201)
+
+    def recipe_update_large():
+        # Swap about half of the ingredients on every call.
+        half = len(large_ingredient_ids) // 2
+        selected = large_ingredient_ids[:half] + rnd.sample(
+            large_ingredient_ids[half:], len(large_ingredient_ids) - half - half // 2
+        )
+        url = reverse('recipe:recipe-detail', args=[large_recipe_id])
+        return _expect(client.patch(url, {'ingredients': selected}, format='json'), 200)
+
+    return {
+        'recipe_list': lambda: _expect(client.get(recipes_url), 200),
+        'recipe_list_gzip': lambda: _expect(
+            client.get(recipes_url, HTTP_ACCEPT_ENCODING='gzip'), 200
+        ),
+        'recipe_detail': recipe_detail,
+        'recipe_filter': recipe_filter,
+        'tag_list_assigned': lambda: _expect(
+            client.get(reverse('recipe:tag-list'), {'assigned_only': 1}), 200
+        ),
+        'ingredient_list_assigned': lambda: _expect(
+            client.get(reverse('recipe:ingredient-list'), {'assigned_only': 1}), 200
+        ),
+        'token_create': lambda: _expect(
+            anonymous.post(
+                reverse('users:token'), {'email': user.email, 'password': SEED_PASSWORD}
+            ),
+            200,
+        ),
+        'image_upload': image_upload,
+        'recipe_create_large': recipe_create_large,
+        'recipe_update_large': recipe_update_large,
+    }
+
+
+def compression_report(payload: bytes, iterations: int) -> dict:
+    """Measure the size and CPU time of compressing `payload` with each installed coding.
+
+    Shows the tradeoff between bandwidth (`ratio`) and CPU
+    (`compress_mb_per_s`) of every coding at a few levels.
+    """
+    report = {'identity': {'bytes': len(payload)}}
+    for name, levels in COMPRESSION_LEVELS.items():
+        codec_class, module = compression.CODECS[name]
+        if module is None:
+            continue
+        for level in levels:
+            codec = codec_class(level)
+            compressed = codec.compress(payload)
+            timing = measure(lambda: codec.compress(payload), iterations)
+            report[f'{name}-{level}'] = {
+                'bytes': len(compressed),
+                'ratio': round(len(payload) / len(compressed), 2),
+                'compress_p50_ms': timing['p50_ms'],
+                'compress_mb_per_s': round(len(payload) / 1e3 / timing['mean_ms'], 2),
+            }
+    return report
+
+
+def run_benchmarks(scale: dict, iterations: int, only=None) -> dict:
+    """Seed a dataset at the given scale and measure every scenario."""
+    started = time.perf_counter()
+    users = seed_dataset(**scale)
+    seed_seconds = time.perf_counter() - started
+
+    scenarios = build_scenarios(users[0])
+    results = {
+        name: measure(call, iterations)
+        for name, call in scenarios.items()
+        if not only or name in only
+    }
+    return {
+        'meta': environment_info(),
+        'scale': scale,
+        'seed_seconds': round(seed_seconds, 3),
+        'results': results,
+        'compression': compression_report(scenarios['recipe_list']().content, iterations),
+    }
+
+
+def environment_info() -> dict:
+    """Describe where the benchmark ran, so results can be told apart."""
+    try:
+        commit = subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': int(time.time()),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+    }
+
+
+def compare(baseline: dict, current: dict, metric='p50_ms') -> Dict[str, float]:
+    """Return the relative change (%) of `metric` for scenarios present in both runs."""
+    changes = {}
+    for name, result in current['results'].items():
+        previous = baseline['results'].get(name)
+        if previous and previous[metric]:
+            changes[name] = round((result[metric] - previous[metric]) / previous[metric] * 100, 2)
+    return changes
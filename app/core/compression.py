@@ -0,0 +1,155 @@
+import gzip
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+
+def get_compression_settings() -> dict:
+    return settings.COMPRESSION
+
+
+class Codec(ABC):
+    """A content encoding: one shot compression, and streaming that flushes every chunk."""
+
+    name = None
+
+    def __init__(self, level: int):
+        self.level = level
+
+    @abstractmethod
+    def compress(self, data: bytes) -> bytes:
+        """Return `data` compressed at once."""
+
+    @abstractmethod
+    def compressor(self):
+        """Return an object with `compress(chunk)` and `flush()`, both returning bytes."""
+
+
+class GzipCodec(Codec):
+    name = 'gzip'
+
+    def compress(self, data):
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def compressor(self):
+        return _ZlibStream(zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS))
+
+
+class _ZlibStream:
+    def __init__(self, compressobj):
+        self.compressobj = compressobj
+
+    def compress(self, chunk: bytes) -> bytes:
+        # A sync flush sends what the chunk compressed to right away.
+        return self.compressobj.compress(chunk) + self.compressobj.flush(zlib.Z_SYNC_FLUSH)
+
+    def flush(self) -> bytes:
+        return self.compressobj.flush(zlib.Z_FINISH)
+
+
+class BrotliCodec(Codec):
+    name = 'br'
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.level)
+
+    def compressor(self):
+        return _BrotliStream(brotli.Compressor(quality=self.level))
+
+
+class _BrotliStream:
+    def __init__(self, compressor):
+        self.compressor = compressor
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self.compressor.process(chunk) + self.compressor.flush()
+
+    def flush(self) -> bytes:
+        return self.compressor.finish()
+
+
+class ZstdCodec(Codec):
+    name = 'zstd'
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def compressor(self):
+        return _ZstdStream(zstandard.ZstdCompressor(level=self.level).compressobj())
+
+
+class _ZstdStream:
+    def __init__(self, compressobj):
+        self.compressobj = compressobj
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self.compressobj.compress(chunk) + self.compressobj.flush(
+            zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        )
+
+    def flush(self) -> bytes:
+        return self.compressobj.flush()
+
+
+CODECS = {
+    GzipCodec.name: (GzipCodec, gzip),
+    BrotliCodec.name: (BrotliCodec, brotli),
+    ZstdCodec.name: (ZstdCodec, zstandard),
+}
+
+
+def available_codecs() -> Dict[str, Codec]:
+    """Return the configured codecs whose library is installed, in order of preference."""
+    options = get_compression_settings()
+    codecs = {}
+    for name in options['ENCODINGS']:
+        codec_class, module = CODECS[name]
+        if module is not None:
+            codecs[name] = codec_class(options['LEVELS'][name])
+    return codecs
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Return the quality of each coding in an Accept-Encoding header."""
+    qualities = {}
+    for item in header.split(','):
+        coding, *params = item.strip().split(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    return qualities
+
+
+def negotiate(header: str, codecs: List[str]) -> Optional[str]:
+    """Return the coding the client accepts with the highest quality, ties by `codecs` order.
+
+    None means the response is sent uncompressed.
+    """
+    qualities = parse_accept_encoding(header or '')
+    best, best_quality = None, 0.0
+    for name in codecs:
+        quality = qualities.get(name, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
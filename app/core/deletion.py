@@ -0,0 +1,28 @@
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+def _deleting() -> set:
+    if not hasattr(_local, 'users'):
+        _local.users = set()
+    return _local.users
+
+
+@contextmanager
+def deleting_user(user_id: int):
+    """Mark a user as being deleted with all its objects in the block.
+
+    Receivers maintaining data derived from a user's objects skip them, it
+    is deleted with the user anyway.
+    """
+    _deleting().add(user_id)
+    try:
+        yield
+    finally:
+        _deleting().discard(user_id)
+
+
+def is_deleting(user_id: int) -> bool:
+    return user_id in _deleting()
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+CACHE_PING_KEY = 'health:ping'
+
+_lock = threading.Lock()
+_last_result = None
+_last_checked = 0.0
+
+
+def ping_database(alias=DEFAULT_DB_ALIAS):
+    """Run `SELECT 1` on the database, raising OperationalError when it is unreachable."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+
+
+def ping_cache(alias='default'):
+    """Write and read back a key, raising ConnectionError when the cache does not answer."""
+    cache = caches[alias]
+    value = str(time.time())
+    cache.set(CACHE_PING_KEY, value, 10)
+    if cache.get(CACHE_PING_KEY) != value:
+        raise ConnectionError('Cache did not return the written value.')
+
+
+def run_checks() -> dict:
+    """Check every dependency and return an error message (or None) per dependency."""
+    results = {}
+    for name, check in (('database', ping_database), ('cache', ping_cache)):
+        try:
+            check()
+        except Exception as exc:
+            results[name] = str(exc) or exc.__class__.__name__
+        else:
+            results[name] = None
+    return results
+
+
+def get_readiness() -> dict:
+    """Return dependency checks, reusing the last result for HEALTH_CHECK_CACHE_SECONDS.
+
+    The result is kept in process memory, as the cache itself is one of the
+    checked dependencies.
+    """
+    global _last_result, _last_checked
+    with _lock:
+        now = time.monotonic()
+        if _last_result is None or now - _last_checked >= settings.HEALTH_CHECK_CACHE_SECONDS:
+            _last_result = run_checks()
+            _last_checked = now
+        return _last_result
+
+
+def reset_readiness():
+    """Forget the cached readiness result."""
+    global _last_result
+    with _lock:
+        _last_result = None
@@ -0,0 +1,149 @@
+import functools
+import hashlib
+import json
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, OperationalError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import IdempotencyRecord
+from core.storage import content_digest
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def get_idempotency_settings() -> dict:
+    return settings.IDEMPOTENCY
+
+
+def _encode(value) -> str:
+    if isinstance(value, UploadedFile):
+        return f'file:{value.name}:{content_digest(value)}'
+    return str(value)
+
+
+def fingerprint(request) -> str:
+    """Return a digest of the method, path and parsed body of a DRF request."""
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, default=_encode)
+    return hashlib.sha256(
+        f'{request.method} {request.get_full_path()}\n{body}'.encode()
+    ).hexdigest()
+
+
+def _claim(
+    user_id: int, key: str, digest: str
+) -> Tuple[Optional[IdempotencyRecord], Optional[Response]]:
+    """Record that the request of `key` is handled now, or return the response to send instead."""
+    options = get_idempotency_settings()
+    now = timezone.now()
+    record = IdempotencyRecord(user_id=user_id, key=key, fingerprint=digest, created=now)
+    try:
+        with transaction.atomic():
+            record.save(force_insert=True)
+    except IntegrityError:
+        pass
+    else:
+        IdempotencyRecord.objects.filter(
+            user_id=user_id, created__lt=now - timedelta(hours=options['TTL_HOURS'])
+        ).delete()
+        return record, None
+
+    in_progress = Response(
+        {'detail': 'A request with this idempotency key is in progress.'},
+        status=status.HTTP_409_CONFLICT,
+    )
+    try:
+        with transaction.atomic():
+            record = (
+                IdempotencyRecord.objects.select_for_update(nowait=True)
+                .filter(user_id=user_id, key=key)
+                .first()
+            )
+            if record is None:
+                # Deleted by the request that held it, after it failed.
+                return None, Response(
+                    {'detail': 'A request with this idempotency key failed, retry it.'},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            expired = record.created < now - timedelta(hours=options['TTL_HOURS'])
+            abandoned = record.status_code is None and record.created < now - timedelta(
+                seconds=options['LOCK_TIMEOUT_SECONDS']
+            )
+            if expired or abandoned:
+                record.fingerprint, record.created = digest, now
+                record.status_code = record.response = None
+                record.save()
+                return record, None
+    except OperationalError:
+        # Locked by the request handling the key.
+        return None, in_progress
+
+    if record.fingerprint != digest:
+        return None, Response(
+            {'detail': 'This idempotency key was used for another request.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.status_code is None:
+        return None, in_progress
+    return None, Response(
+        record.response, status=record.status_code, headers={REPLAYED_HEADER: 'true'}
+    )
+
+
+def idempotent(handler):
+    """Make a DRF view handler replay its response to requests reusing an `Idempotency-Key`.
+
+    Successful responses are kept for IDEMPOTENCY['TTL_HOURS'] per user
+    and key. The same key with another method, path or body is rejected
+    with 422, and a duplicate sent while the first is handled with 409.
+    Keys of failed requests are released, so they can be retried.
+
+    The handler runs in one transaction with the update storing its
+    response, holding the record locked: a request dying in between leaves
+    neither, and the key is taken over once its lock timed out.
+    """
+
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None or not request.user.is_authenticated:
+            return handler(view, request, *args, **kwargs)
+        if not key or len(key) > get_idempotency_settings()['MAX_KEY_LENGTH']:
+            return Response(
+                {'detail': f'Invalid {HEADER} header.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        record, response = _claim(request.user.pk, key, fingerprint(request))
+        if response is not None:
+            return response
+        try:
+            with transaction.atomic():
+                IdempotencyRecord.objects.select_for_update().get(pk=record.pk)
+                response = handler(view, request, *args, **kwargs)
+                if not status.is_success(response.status_code):
+                    record.delete()
+                    return response
+                record.status_code, record.response = response.status_code, response.data
+                record.save(update_fields=['status_code', 'response'])
+        except Exception:
+            record.delete()
+            raise
+        return response
+
+    return wrapper
+
+
+def prune() -> int:
+    """Delete expired records of all users, return how many."""
+    cutoff = timezone.now() - timedelta(hours=get_idempotency_settings()['TTL_HOURS'])
+    deleted, _ = IdempotencyRecord.objects.filter(created__lt=cutoff).delete()
+    return deleted
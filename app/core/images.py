@@ -0,0 +1,115 @@
+import posixpath
+from datetime import timedelta
+from typing import Iterator, List
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from core.models import RECIPE_PATH, Recipe, StoredFile
+
+
+def add_reference(name: str, count: int = 1):
+    """Record `count` new references to a stored file."""
+    if not name:
+        return
+    StoredFile.objects.bulk_create([StoredFile(name=name)], ignore_conflicts=True)
+    StoredFile.objects.filter(name=name).update(
+        references=F('references') + count, updated=timezone.now()
+    )
+
+
+def release(name: str, count: int = 1):
+    """Drop `count` references to a stored file, the garbage collector removes unused ones."""
+    if not name:
+        return
+    StoredFile.objects.filter(name=name, references__gte=count).update(
+        references=F('references') - count, updated=timezone.now()
+    )
+
+
+def recount() -> int:
+    """Rebuild reference counts from recipe images, return the number of corrected files."""
+    counts = dict(
+        Recipe.objects.exclude(image__isnull=True)
+        .exclude(image='')
+        .values_list('image')
+        .annotate(total=Count('id'))
+    )
+    StoredFile.objects.bulk_create(
+        [StoredFile(name=name) for name in counts], ignore_conflicts=True
+    )
+    corrected = 0
+    for stored in StoredFile.objects.all().iterator():
+        references = counts.get(stored.name, 0)
+        if stored.references != references:
+            stored.references = references
+            stored.save(update_fields=['references', 'updated'])
+            corrected += 1
+    return corrected
+
+
+def collect_garbage(
+    grace=timedelta(days=1), dry_run=False, storage=default_storage, names: List[str] = None
+) -> List[str]:
+    """Delete stored files nothing has referenced for at least `grace`, only `names` if given."""
+    deleted = []
+    candidates = StoredFile.objects.filter(
+        references=0, updated__lt=timezone.now() - grace
+    ).values_list('name', flat=True)
+    if names is not None:
+        candidates = candidates.filter(name__in=names)
+    for name in candidates.iterator():
+        with transaction.atomic():
+            stored = (
+                StoredFile.objects.select_for_update(skip_locked=True)
+                .filter(name=name, references=0)
+                .first()
+            )
+            if stored is None:
+                continue
+            references = Recipe.objects.filter(image=name).count()
+            if references:
+                # The count drifted, e.g. after a bulk update bypassing signals.
+                add_reference(name, references)
+                continue
+            if not dry_run:
+                # Under the lock, a save of equal content waits and stores it again.
+                storage.delete(name)
+                stored.delete()
+        deleted.append(name)
+    return deleted
+
+
+def walk(storage, directory: str) -> Iterator[str]:
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for subdirectory in directories:
+        yield from walk(storage, posixpath.join(directory, subdirectory))
+
+
+def sweep_orphans(
+    directory=RECIPE_PATH, grace=timedelta(days=1), dry_run=False, storage=default_storage
+) -> List[str]:
+    """Delete files in `directory` that no stored file or recipe knows about."""
+    cutoff = timezone.now() - grace
+    deleted = []
+    for name in walk(storage, directory.rstrip('/')):
+        if storage.get_modified_time(name) >= cutoff:
+            continue
+        if StoredFile.objects.filter(name=name).exists():
+            continue
+        if Recipe.objects.filter(image=name).exists():
+            continue
+        if not dry_run:
+            with transaction.atomic():
+                # Checked again under the lock, the file may be attached meanwhile.
+                stored = StoredFile.objects.lock(name)
+                if stored.references or Recipe.objects.filter(image=name).exists():
+                    continue
+                storage.delete(name)
+                stored.delete()
+        deleted.append(name)
+    return deleted
@@ -0,0 +1,64 @@
+import json
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment
+
+from core import bench
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the REST API hot paths on a throwaway database."""
+
+    help = 'Seed a synthetic dataset in a test database and measure API latency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--recipes', type=int, default=100, help='Recipes per user.')
+        parser.add_argument('--tags', type=int, default=20, help='Tags per user.')
+        parser.add_argument('--ingredients', type=int, default=50, help='Ingredients per user.')
+        parser.add_argument('--links', type=int, default=5, help='Tags/ingredients per recipe.')
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--only', nargs='*', help='Run only the given scenarios.')
+        parser.add_argument('--output', help='Write JSON results to this file.')
+        parser.add_argument('--compare', help='JSON results of a previous run to compare with.')
+        parser.add_argument(
+            '--max-regression',
+            type=float,
+            help='Fail when p50 of any scenario grows by more than this percentage.',
+        )
+        parser.add_argument('--keepdb', action='store_true', help='Keep the benchmark database.')
+
+    def handle(self, *args, **options):
+        scale = {
+            key: options[key] for key in ('users', 'recipes', 'tags', 'ingredients', 'links')
+        }
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(MEDIA_ROOT=media_root):
+                    results = bench.run_benchmarks(scale, options['iterations'], options['only'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output)
+        self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                changes = bench.compare(json.load(f), results)
+            for name, change in changes.items():
+                self.stdout.write(f'{name}: {change:+.2f}% p50')
+            regressions = {
+                name: change
+                for name, change in changes.items()
+                if options['max_regression'] is not None and change > options['max_regression']
+            }
+            if regressions:
+                raise CommandError(f'Benchmark regressions: {regressions}')
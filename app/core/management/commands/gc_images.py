@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core import images
+
+
+class Command(BaseCommand):
+    """Django command to delete stored images nothing refers to anymore."""
+
+    help = 'Delete unreferenced content addressed images and orphaned upload files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Keep files released or written less than this many hours ago.',
+        )
+        parser.add_argument(
+            '--recount', action='store_true', help='Rebuild reference counts first.'
+        )
+        parser.add_argument(
+            '--sweep', action='store_true', help='Also delete files unknown to the database.'
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        grace = timedelta(hours=options['grace_hours'])
+        if options['recount']:
+            corrected = images.recount()
+            self.stdout.write(f'Corrected {corrected} reference counts.')
+
+        deleted = images.collect_garbage(grace, dry_run=options['dry_run'])
+        if options['sweep']:
+            deleted += images.sweep_orphans(grace=grace, dry_run=options['dry_run'])
+
+        for name in deleted:
+            self.stdout.write(name)
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(deleted)} files.'))
@@ -0,0 +1,102 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Cold start of a WSGI worker: load settings and apps, then the URLconf
+# (which the first request would otherwise pay for).
+STARTUP_SCRIPT = '''
+import time
+start = time.perf_counter()
+from app.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - start)
+'''
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int]]:
+    """Return (module, self microseconds) pairs from `python -X importtime` output."""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        modules.append((name.strip(), int(self_us)))
+    return modules
+
+
+def group_by_package(modules: List[Tuple[str, int]]) -> Dict[str, int]:
+    """Sum import times per package (e.g. `django.db`, `django.contrib.admin`, `PIL.Image`)."""
+    packages = {}
+    for name, us in modules:
+        depth = 3 if name.startswith('django.contrib.') else 2
+        package = '.'.join(name.split('.')[:depth])
+        packages[package] = packages.get(package, 0) + us
+    return packages
+
+
+class Command(BaseCommand):
+    """Django command to measure the cold start time of a worker process."""
+
+    help = 'Start fresh interpreters that load the WSGI app and report their startup time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help='Slowest imports to list.')
+        parser.add_argument('--role', choices=('all', 'api'), help='APP_ROLE of the workers.')
+        parser.add_argument(
+            '--no-bytecode',
+            action='store_true',
+            help='Ignore compiled bytecode, like a container without precompiled .pyc files.',
+        )
+        parser.add_argument('--json', action='store_true', help='Print JSON results.')
+
+    def _run(self, env, *flags) -> subprocess.CompletedProcess:
+        result = subprocess.run(
+            (sys.executable, *flags, '-c', STARTUP_SCRIPT),
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr)
+        return result
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        if options['role']:
+            env['APP_ROLE'] = options['role']
+
+        with tempfile.TemporaryDirectory() as pycache:
+            if options['no_bytecode']:
+                env['PYTHONDONTWRITEBYTECODE'] = '1'
+                env['PYTHONPYCACHEPREFIX'] = pycache
+            timings = [float(self._run(env).stdout) for _ in range(options['runs'])]
+            imports = parse_importtime(self._run(env, '-X', 'importtime').stderr)
+
+        packages = sorted(group_by_package(imports).items(), key=lambda p: p[1], reverse=True)
+        results = {
+            'role': env.get('APP_ROLE', 'all'),
+            'runs': options['runs'],
+            'min_ms': round(min(timings) * 1000, 1),
+            'median_ms': round(statistics.median(timings) * 1000, 1),
+            'imports_ms': {name: round(us / 1000, 1) for name, us in packages[: options['top']]},
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        self.stdout.write(
+            f'Cold start ({results["role"]}): median {results["median_ms"]} ms, '
+            f'min {results["min_ms"]} ms over {results["runs"]} runs'
+        )
+        for name, ms in results['imports_ms'].items():
+            self.stdout.write(f'{ms:>10.1f} ms  {name}')
@@ -0,0 +1,80 @@
+import signal
+import threading
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.utils.module_loading import autodiscover_modules
+
+from core import idempotency, tasks
+
+
+class Command(BaseCommand):
+    """Django command running queued tasks until stopped."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=1, help='Number of tasks run at the same time.'
+        )
+        parser.add_argument(
+            '--burst', action='store_true', help='Exit once no task is due, instead of polling.'
+        )
+        parser.add_argument('--poll-interval', type=float, default=None)
+        parser.add_argument(
+            '--prune-days',
+            type=float,
+            default=7,
+            help='Delete finished tasks after this many days.',
+        )
+
+    def handle(self, *args, **options):
+        autodiscover_modules('tasks')
+        poll_interval = (
+            options['poll_interval'] or tasks.get_task_settings()['POLL_INTERVAL_SECONDS']
+        )
+        stopping = threading.Event()
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(signum, lambda *args: stopping.set())
+
+        requeued = tasks.requeue_stale()
+        pruned = tasks.prune(timedelta(days=options['prune_days']))
+        self.stdout.write(f'Requeued {requeued} stale tasks, pruned {pruned} finished tasks.')
+        pruned = idempotency.prune()
+        self.stdout.write(f'Pruned {pruned} expired idempotency keys.')
+
+        counts = []
+        workers = [
+            threading.Thread(
+                target=self.work,
+                args=(stopping, options['burst'], poll_interval, counts),
+                name=f'worker-{number}',
+            )
+            for number in range(options['concurrency'])
+        ]
+        for worker in workers:
+            worker.start()
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(poll_interval)
+            if not options['burst'] and not stopping.is_set():
+                tasks.requeue_stale()
+        connection.close()
+        self.stdout.write(self.style.SUCCESS(f'Ran {sum(counts)} tasks.'))
+
+    def work(self, stopping, burst, poll_interval, counts):
+        ran = 0
+        try:
+            while not stopping.is_set():
+                close_old_connections()
+                claimed = tasks.claim()
+                if claimed:
+                    tasks.run(claimed[0])
+                    ran += 1
+                elif burst:
+                    break
+                else:
+                    stopping.wait(poll_interval)
+        finally:
+            counts.append(ran)
+            connection.close()
@@ -0,0 +1,84 @@
+import multiprocessing
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.seed import SEED_PASSWORD, seed_users
+
+
+def _seed_chunk(args):
+    first_user, users, options = args
+    try:
+        return seed_users(first_user, users, **options)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    """Django command to fill the database with synthetic data for load testing."""
+
+    help = 'Generate users, tags, ingredients, recipes and their links in bulk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=50, help='Mean recipes per user.')
+        parser.add_argument('--tags', type=int, default=10, help='Mean tags per user.')
+        parser.add_argument(
+            '--ingredients', type=int, default=30, help='Mean ingredients per user.'
+        )
+        parser.add_argument(
+            '--links', type=int, default=5, help='Mean tags/ingredients per recipe.'
+        )
+        parser.add_argument(
+            '--seed', type=int, help='Random seed, also used in the generated emails.'
+        )
+        parser.add_argument('--uniform', action='store_true', help='Use exact counts.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--no-copy', action='store_true', help='Never use COPY.')
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument(
+            '--users-per-chunk', type=int, default=100, help='Users seeded per transaction.'
+        )
+        parser.add_argument(
+            '--password-hash', help=f'Precomputed password hash (default: of "{SEED_PASSWORD}").'
+        )
+
+    def handle(self, *args, **options):
+        seed = options['seed'] if options['seed'] is not None else int(time.time())
+        seed_options = {
+            'recipes': options['recipes'],
+            'tags': options['tags'],
+            'ingredients': options['ingredients'],
+            'links': options['links'],
+            'seed': seed,
+            'realistic': not options['uniform'],
+            'password_hash': options['password_hash'] or make_password(SEED_PASSWORD),
+            'batch_size': options['batch_size'],
+            'use_copy': False if options['no_copy'] else None,
+        }
+        step = options['users_per_chunk']
+        chunks = [
+            (first, min(step, options['users'] - first), seed_options)
+            for first in range(0, options['users'], step)
+        ]
+
+        started = time.perf_counter()
+        if options['workers'] > 1:
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with context.Pool(options['workers']) as pool:
+                results = pool.map(_seed_chunk, chunks)
+        else:
+            results = [seed_users(*chunk[:2], **chunk[2]) for chunk in chunks]
+        elapsed = time.perf_counter() - started
+
+        totals = {}
+        for result in results:
+            for key, count in result.items():
+                totals[key] = totals.get(key, 0) + count
+        summary = ', '.join(f'{count} {key}' for key, count in totals.items())
+        self.stdout.write(
+            self.style.SUCCESS(f'Seeded {summary} (seed {seed}) in {elapsed:.1f}s.')
+        )
@@ -1,20 +1,41 @@
+import random
 import time
 
-from django.db import connections
+from django.db import DEFAULT_DB_ALIAS
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+
+from core.health import ping_database
 
 
 class Command(BaseCommand):
     """Django command to pause execution until database is available."""
 
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            '--timeout', type=float, default=60, help='Give up after this many seconds.'
+        )
+        parser.add_argument('--initial-delay', type=float, default=0.5)
+        parser.add_argument('--max-delay', type=float, default=5)
+
     def handle(self, *args, **options):
         self.stdout.write('Waiting for database...')
-        db_conn = None
-        while not db_conn:
+        deadline = time.monotonic() + options['timeout']
+        delay = options['initial_delay']
+        while True:
             try:
-                db_conn = connections['default']
+                ping_database(options['database'])
+                break
             except OperationalError:
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f'Database unavailable after {options["timeout"]:g} seconds.'
+                    )
+                # Jitter keeps many containers from retrying in lockstep.
+                wait = min(delay / 2 + random.uniform(0, delay / 2), remaining)
+                self.stdout.write(f'Database unavailable, waiting {wait:.2f} seconds...')
+                time.sleep(wait)
+                delay = min(delay * 2, options['max_delay'])
         self.stdout.write(self.style.SUCCESS('Database avaiable!'))
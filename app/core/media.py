@@ -0,0 +1,74 @@
+import re
+from typing import Optional, Tuple
+
+from core.storage import CONTENT_ADDRESSED_RE
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MUTABLE_CACHE_CONTROL = 'public, max-age=3600'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def media_etag(name: str, stat) -> str:
+    """Return a strong ETag, the content digest for content addressed names."""
+    match = CONTENT_ADDRESSED_RE.search(name)
+    if match:
+        return f'"{match.group(2)}"'
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def cache_control(name: str) -> str:
+    """Content addressed files never change, everything else may be replaced."""
+    if CONTENT_ADDRESSED_RE.search(name):
+        return IMMUTABLE_CACHE_CONTROL
+    return MUTABLE_CACHE_CONTROL
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Return the inclusive (first, last) byte positions of a single range request.
+
+    Returns None when the header is missing, malformed or asks for several
+    ranges (the whole file is sent then) and raises ValueError when the
+    range cannot be satisfied.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes.
+        length = int(last)
+        if length == 0:
+            raise ValueError('Empty suffix range.')
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        raise ValueError('Range not satisfiable.')
+    return first, last
+
+
+class FileRange:
+    """Read-only view of `length` bytes of an open file starting at `first`.
+
+    It keeps `fileno()`, so WSGI servers that implement `wsgi.file_wrapper`
+    with `os.sendfile` (gunicorn, uWSGI) still send the range zero-copy.
+    """
+
+    def __init__(self, file, first: int, length: int):
+        file.seek(first)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
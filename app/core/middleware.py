@@ -0,0 +1,110 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+from core import compression
+from core.query_audit import QueryAudit, get_audit_settings
+
+logger = logging.getLogger('core.query_audit')
+
+
+class QueryAuditMiddleware:
+    """Log repeated (N+1) and slow queries executed while handling a request."""
+
+    def __init__(self, get_response):
+        self.settings = get_audit_settings()
+        if not self.settings['ENABLED']:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        audit = QueryAudit()
+        with audit.capture():
+            response = self.get_response(request)
+
+        report = audit.report(explain=self.settings['EXPLAIN'])
+        response['X-Query-Count'] = str(report['count'])
+        for shape, count in report['repeated'].items():
+            logger.warning(
+                'Repeated query on %s %s (%sx): %s', request.method, request.path, count, shape
+            )
+        for query in report['slow']:
+            logger.warning(
+                'Slow query on %s %s (%.1f ms): %s\n%s',
+                request.method,
+                request.path,
+                query['duration_ms'],
+                query['sql'],
+                query['plan'],
+            )
+        return response
+
+
+class CompressionMiddleware:
+    """Compress responses with the best coding the client accepts: zstd, br or gzip.
+
+    Responses smaller than MIN_SIZE, of types that are already compressed
+    (images and other media) and media files are sent as they are. Streaming
+    responses are compressed chunk by chunk.
+    """
+
+    def __init__(self, get_response):
+        self.settings = compression.get_compression_settings()
+        self.codecs = compression.available_codecs()
+        if not self.settings['ENABLED'] or not self.codecs:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self._compressible(request, response):
+            return response
+        # Whether compressed or not, the response depends on Accept-Encoding.
+        patch_vary_headers(response, ('Accept-Encoding',))
+        name = compression.negotiate(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''), list(self.codecs)
+        )
+        if name is None:
+            return response
+        codec = self.codecs[name]
+
+        length = response.get('Content-Length')
+        if response.streaming and length and int(length) < self.settings['MIN_SIZE']:
+            return response
+        if response.streaming:
+            response.streaming_content = self._compress_stream(codec, response.streaming_content)
+            del response['Content-Length']
+        else:
+            if len(response.content) < self.settings['MIN_SIZE']:
+                return response
+            compressed = codec.compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The compressed body differs byte for byte, strong validators no longer hold.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = name
+        return response
+
+    def _compressible(self, request, response) -> bool:
+        if response.has_header('Content-Encoding') or response.status_code in (204, 206, 304):
+            return False
+        if request.path.startswith(settings.MEDIA_URL):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        return not content_type.startswith(self.settings['SKIP_CONTENT_TYPES'])
+
+    @staticmethod
+    def _compress_stream(codec, chunks):
+        compressor = codec.compressor()
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
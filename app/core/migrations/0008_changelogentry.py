@@ -0,0 +1,55 @@
+# Generated by Django 3.1.14 on 2026-10-19 05:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_user_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeLogEntry',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    'model',
+                    models.CharField(
+                        choices=[
+                            ('recipe', 'Recipe'),
+                            ('tag', 'Tag'),
+                            ('ingredient', 'Ingredient'),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ('object_id', models.PositiveIntegerField()),
+                (
+                    'action',
+                    models.CharField(
+                        choices=[('saved', 'Saved'), ('deleted', 'Deleted')],
+                        max_length=10,
+                    ),
+                ),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                (
+                    'user',
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name='+',
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='changelogentry',
+            index=models.Index(fields=['user', 'id'], name='changelog_user_id_idx'),
+        ),
+    ]
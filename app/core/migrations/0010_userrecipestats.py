@@ -0,0 +1,39 @@
+# Generated by Django 3.1.14 on 2026-10-19 05:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_task'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserRecipeStats',
+            fields=[
+                (
+                    'user',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='recipe_stats',
+                        serialize=False,
+                        to='core.user',
+                    ),
+                ),
+                ('recipe_count', models.PositiveIntegerField(default=0)),
+                ('total_time_minutes', models.BigIntegerField(default=0)),
+                (
+                    'total_price',
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ('price_buckets', models.JSONField(default=list)),
+                ('tag_counts', models.JSONField(default=dict)),
+                ('ingredient_counts', models.JSONField(default=dict)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 3.1.14 on 2026-10-19 05:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_refreshtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientBitmap',
+            fields=[
+                (
+                    'id',
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name='ID',
+                    ),
+                ),
+                ('bits', models.BinaryField(default=bytes)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IngredientIndex',
+            fields=[
+                (
+                    'user',
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name='ingredient_index',
+                        serialize=False,
+                        to='core.user',
+                    ),
+                ),
+                ('next_slot', models.PositiveIntegerField(default=0)),
+                ('free_slots', models.JSONField(default=list)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='slot',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'slot'], name='recipe_user_slot_idx'),
+        ),
+        migrations.AddField(
+            model_name='ingredientbitmap',
+            name='ingredient',
+            field=models.OneToOneField(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='+',
+                to='core.ingredient',
+            ),
+        ),
+        migrations.AddField(
+            model_name='ingredientbitmap',
+            name='user',
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name='+',
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
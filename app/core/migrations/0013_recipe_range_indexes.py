@@ -0,0 +1,26 @@
+# Generated by Django 3.1.14 on 2026-10-19 05:45
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Indexes are built without locking writes to the recipes.
+    atomic = False
+
+    dependencies = [
+        ('core', '0012_ingredient_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(
+                fields=['user', 'time_minutes'], name='recipe_user_time_idx'
+            ),
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', 'price'], name='recipe_user_price_idx'),
+        ),
+    ]
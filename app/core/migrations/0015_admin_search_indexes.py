@@ -0,0 +1,28 @@
+from django.db import migrations
+
+# Admin prefix searches (`^field`) filter on UPPER(field::text) LIKE 'PREFIX%'.
+SEARCH_INDEXES = (
+    ('user_email_search_idx', 'core_user', 'email'),
+    ('user_name_search_idx', 'core_user', 'name'),
+    ('tag_name_search_idx', 'core_tag', 'name'),
+    ('ingredient_name_search_idx', 'core_ingredient', 'name'),
+    ('recipe_title_search_idx', 'core_recipe', 'title'),
+)
+
+
+class Migration(migrations.Migration):
+    # Indexes are built without locking writes to the tables.
+    atomic = False
+
+    dependencies = [
+        ('core', '0014_user_deleted_at'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+            f'ON {table} ((UPPER({column}::text)) text_pattern_ops)',
+            f'DROP INDEX CONCURRENTLY IF EXISTS {name}',
+        )
+        for name, table, column in SEARCH_INDEXES
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def backfill_stored_files(apps, schema_editor):
+    """Count the references to images uploaded before files were reference counted."""
+    Recipe = apps.get_model('core', 'Recipe')
+    StoredFile = apps.get_model('core', 'StoredFile')
+    counts = dict(
+        Recipe.objects.exclude(image__isnull=True)
+        .exclude(image='')
+        .values_list('image')
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    StoredFile.objects.bulk_create(
+        [StoredFile(name=name) for name in counts], batch_size=1000, ignore_conflicts=True
+    )
+    for stored in StoredFile.objects.filter(name__in=list(counts)).iterator():
+        if stored.references != counts[stored.name]:
+            stored.references = counts[stored.name]
+            stored.save(update_fields=['references', 'updated'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_recipe_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_stored_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.14 on 2026-10-19 06:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_backfill_stored_files'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredientbitmap',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
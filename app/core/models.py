@@ -1,13 +1,18 @@
-import uuid
 import os
 
 from django.db import models
+from django.utils import timezone
+from django.db.models.fields.files import ImageFieldFile
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from core.deletion import deleting_user
+from core.storage import content_addressed_name
 
 
 RECIPE_PATH = 'uploads/recipe/'
@@ -15,12 +20,28 @@ RECIPE_PATH = 'uploads/recipe/'
 
 def recipe_image_file_path(instance, filename) -> str:
     """Generate file path for new image."""
-    ext = filename.split('.')[-1]
-    filename = f'{uuid.uuid4()}.{ext}'
-
     return os.path.join(RECIPE_PATH, filename)
 
 
+class ContentAddressedFieldFile(ImageFieldFile):
+    """Image file named after the digest of its content, so equal images share a file.
+
+    Saved in a transaction, which holds the stored file lock until the
+    reference is added.
+    """
+
+    def save(self, name, content, save=True):
+        ext = name.split('.')[-1].lower()
+        name = content_addressed_name(content, ext)
+        # Equal content is not stored again, the file must outlive the save.
+        StoredFile.objects.lock(self.field.generate_filename(self.instance, name))
+        super().save(name, content, save)
+
+
+class ContentAddressedImageField(models.ImageField):
+    attr_class = ContentAddressedFieldFile
+
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         """Creates and saves a new user."""
@@ -45,11 +66,22 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Set when the user deleted the account, its data is purged in the background.
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     objects = UserManager()
 
     USERNAME_FIELD = 'email'
 
+    def delete(self, using=None, keep_parents=False):
+        """Delete the user and its objects, without maintaining data derived from them.
+
+        Users with many objects take long to delete, `users.tasks.soft_delete_user`
+        purges them in the background.
+        """
+        with deleting_user(self.pk):
+            return super().delete(using, keep_parents)
+
 
 class Tag(models.Model):
     """Tag for recipe."""
@@ -81,7 +113,207 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     ingredients = models.ManyToManyField('core.Ingredient')
     tags = models.ManyToManyField('core.Tag')
-    image = models.ImageField(null=True, blank=True, upload_to=recipe_image_file_path)
+    image = ContentAddressedImageField(null=True, blank=True, upload_to=recipe_image_file_path)
+    # Bit position of the recipe in the user's ingredient index.
+    slot = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # Incremented by every update, sent as the ETag clients pass in If-Match.
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='recipe_user_id_idx'),
+            models.Index(fields=['user', 'slot'], name='recipe_user_slot_idx'),
+            models.Index(fields=['user', 'time_minutes'], name='recipe_user_time_idx'),
+            models.Index(fields=['user', 'price'], name='recipe_user_price_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class StoredFileManager(models.Manager):
+    def lock(self, name: str) -> 'StoredFile':
+        """Lock the stored file `name` until the transaction ends, creating it when missing.
+
+        Whoever checks that a file exists to reference it holds the lock
+        until the reference is added, and files are only deleted under it,
+        so a file found in storage is not deleted before it is referenced.
+        """
+        while True:
+            self.bulk_create([self.model(name=name)], ignore_conflicts=True)
+            stored = self.select_for_update().filter(name=name).first()
+            if stored is not None:
+                return stored
+            # Deleted by the garbage collector while waiting for the lock.
+
+
+class StoredFile(models.Model):
+    """Content addressed file in media storage, shared by all objects referencing it."""
+
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = StoredFileManager()
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class ChangeLogEntry(models.Model):
+    """Change to one of a user's objects, `id` is the sequence clients sync from."""
+
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    MODEL_CHOICES = ((RECIPE, 'Recipe'), (TAG, 'Tag'), (INGREDIENT, 'Ingredient'))
+
+    SAVED = 'saved'
+    DELETED = 'deleted'
+    ACTION_CHOICES = ((SAVED, 'Saved'), (DELETED, 'Deleted'))
+
+    id = models.BigAutoField(primary_key=True)
+    # Entries are written while a user's objects are deleted, so there is no
+    # constraint. They are removed once the user is.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name='+',
+    )
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.PositiveIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'id'], name='changelog_user_id_idx')]
+
+
+class Task(models.Model):
+    """Call of a registered task function, run by the `run_worker` command."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=255)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    idempotency_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField()
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['run_after'],
+                name='task_queued_idx',
+                condition=models.Q(status='queued'),
+            ),
+            models.Index(
+                fields=['locked_at'],
+                name='task_running_idx',
+                condition=models.Q(status='running'),
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.name} ({self.status})'
+
+
+class IdempotencyRecord(models.Model):
+    """Response to a write sent with an `Idempotency-Key`, replayed when the key is reused.
+
+    Without a status code the request is still being handled.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq')
+        ]
+
+
+class UserRecipeStats(models.Model):
+    """Aggregates over a user's recipes, kept up to date as recipes change."""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='recipe_stats',
+    )
+    recipe_count = models.PositiveIntegerField(default=0)
+    total_time_minutes = models.BigIntegerField(default=0)
+    total_price = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Recipe counts per price range, tag id and ingredient id.
+    price_buckets = models.JSONField(default=list)
+    tag_counts = models.JSONField(default=dict)
+    ingredient_counts = models.JSONField(default=dict)
+    updated = models.DateTimeField(auto_now=True)
+
+
+class RefreshToken(models.Model):
+    """Single use token exchanged for a new access token, only its hash is stored.
+
+    Tokens rotated from one another share a `family`, revoked as a whole on
+    logout or when a used token is presented again.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='refresh_tokens'
+    )
+    token_hash = models.CharField(max_length=64, unique=True)
+    family = models.UUIDField(db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    used_at = models.DateTimeField(null=True, blank=True)
+    revoked_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+
+class IngredientIndex(models.Model):
+    """Allocation of recipe slots in a user's ingredient bitmaps.
+
+    `version` changes with every write to the user's bitmaps, so cached
+    copies can be validated cheaply.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ingredient_index',
+    )
+    next_slot = models.PositiveIntegerField(default=0)
+    free_slots = models.JSONField(default=list)
+    version = models.BigIntegerField(default=0)
+
+
+class IngredientBitmap(models.Model):
+    """Bitset of the slots of the recipes using an ingredient, little endian."""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    ingredient = models.OneToOneField(Ingredient, on_delete=models.CASCADE, related_name='+')
+    bits = models.BinaryField(default=bytes)
+    # Version of the index the bits were last written at.
+    version = models.BigIntegerField(default=0)
@@ -0,0 +1,135 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+DEFAULTS = {
+    'ENABLED': False,
+    'SLOW_QUERY_MS': 100,
+    'REPEAT_THRESHOLD': 5,
+    'EXPLAIN': True,
+}
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def get_audit_settings() -> dict:
+    """Return query audit settings merged with the defaults."""
+    return {**DEFAULTS, **getattr(settings, 'QUERY_AUDIT', {})}
+
+
+def normalize_sql(sql: str) -> str:
+    """Reduce a SQL statement to its shape, so that N+1 loops collapse together."""
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = LITERAL_RE.sub('?', sql)
+    return WHITESPACE_RE.sub(' ', sql).strip()
+
+
+class CapturedQuery(NamedTuple):
+    sql: str
+    params: tuple
+    many: bool
+    duration_ms: float
+
+    @property
+    def shape(self) -> str:
+        return normalize_sql(self.sql)
+
+
+class QueryAudit:
+    """Collects queries executed within a block and reports suspicious patterns."""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS, slow_query_ms=None, repeat_threshold=None):
+        audit_settings = get_audit_settings()
+        self.using = using
+        self.slow_query_ms = (
+            audit_settings['SLOW_QUERY_MS'] if slow_query_ms is None else slow_query_ms
+        )
+        self.repeat_threshold = (
+            audit_settings['REPEAT_THRESHOLD'] if repeat_threshold is None else repeat_threshold
+        )
+        self.queries: List[CapturedQuery] = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self.queries.append(CapturedQuery(sql, tuple(params or ()), many, duration_ms))
+
+    @contextmanager
+    def capture(self):
+        """Record every query run on the audited connection inside the block."""
+        with connections[self.using].execute_wrapper(self):
+            yield self
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def repeated_shapes(self) -> Dict[str, int]:
+        """Return query shapes executed at least `repeat_threshold` times."""
+        counter = Counter(query.shape for query in self.queries)
+        return {
+            shape: count for shape, count in counter.items() if count >= self.repeat_threshold
+        }
+
+    def slow_queries(self) -> List[CapturedQuery]:
+        """Return queries that took longer than `slow_query_ms`."""
+        return [query for query in self.queries if query.duration_ms >= self.slow_query_ms]
+
+    def explain(self, query: CapturedQuery) -> str:
+        """Return the query plan of a captured SELECT statement."""
+        if query.many or not query.sql.lstrip().upper().startswith('SELECT'):
+            return ''
+        with connections[self.using].cursor() as cursor:
+            cursor.execute(f'EXPLAIN {query.sql}', query.params)
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def report(self, explain=True) -> dict:
+        """Summarize captured queries in a JSON serializable form."""
+        return {
+            'count': len(self.queries),
+            'total_ms': round(sum(query.duration_ms for query in self.queries), 3),
+            'repeated': self.repeated_shapes(),
+            'slow': [
+                {
+                    'sql': query.sql,
+                    'duration_ms': round(query.duration_ms, 3),
+                    'plan': self.explain(query) if explain else '',
+                }
+                for query in self.slow_queries()
+            ],
+        }
+
+
+class QueryAuditTestMixin:
+    """TestCase mixin with assertions guarding the number and shape of queries."""
+
+    @contextmanager
+    def assertQueryBudget(self, budget: int, using=DEFAULT_DB_ALIAS):
+        """Fail when the block runs more queries than its budget."""
+        audit = QueryAudit(using=using)
+        with audit.capture():
+            yield audit
+        if len(audit) > budget:
+            executed = '\n'.join(f'{i}. {query.sql}' for i, query in enumerate(audit.queries, 1))
+            self.fail(f'{len(audit)} queries executed, budget is {budget}:\n{executed}')
+
+    @contextmanager
+    def assertNoRepeatedQueries(self, threshold=None, using=DEFAULT_DB_ALIAS):
+        """Fail when the same query shape runs `threshold` times or more (N+1)."""
+        audit = QueryAudit(using=using, repeat_threshold=threshold)
+        with audit.capture():
+            yield audit
+        repeated = audit.repeated_shapes()
+        if repeated:
+            shapes = '\n'.join(f'{count}x {shape}' for shape, count in repeated.items())
+            self.fail(f'Repeated queries detected:\n{shapes}')
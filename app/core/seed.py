@@ -0,0 +1,194 @@
+import csv
+import io
+import random
+from typing import List
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+
+from core.models import Tag, Ingredient, Recipe
+
+SEED_PASSWORD = 'seedpass123'
+
+TAG_NAMES = (
+    'Vegan', 'Vegetarian', 'Dessert', 'Breakfast', 'Dinner', 'Lunch', 'Quick', 'Spicy',
+    'Gluten free', 'Dairy free', 'Low carb', 'Keto', 'Italian', 'Mexican', 'Asian', 'Soup',
+    'Salad', 'Grill', 'Baking', 'Comfort food', 'Party', 'Kids', 'Healthy', 'Budget',
+)
+INGREDIENT_NAMES = (
+    'Salt', 'Pepper', 'Olive oil', 'Garlic', 'Onion', 'Butter', 'Sugar', 'Flour', 'Egg',
+    'Milk', 'Tomato', 'Lemon', 'Chicken', 'Rice', 'Potato', 'Carrot', 'Cheese', 'Basil',
+    'Parsley', 'Paprika', 'Cream', 'Beef', 'Pasta', 'Mushroom', 'Spinach', 'Honey',
+    'Ginger', 'Chili', 'Cumin', 'Bacon', 'Salmon', 'Shrimp', 'Avocado', 'Cucumber',
+    'Zucchini', 'Broccoli', 'Yogurt', 'Oats', 'Almond', 'Cinnamon',
+)
+TITLE_WORDS = (
+    'Roasted', 'Creamy', 'Spicy', 'Grilled', 'Baked', 'Quick', 'Classic', 'Rustic',
+    'Stuffed', 'Crispy', 'Braised', 'Sweet', 'Smoky', 'Fresh', 'Slow cooked', 'Glazed',
+)
+
+
+class Distribution:
+    """Random shapes of the synthetic dataset.
+
+    With `realistic` disabled every user gets exactly the requested counts,
+    otherwise the counts are heavy-tailed around them and popular tags and
+    ingredients are picked far more often than the rest (Zipf-like).
+    """
+
+    def __init__(self, rnd: random.Random, realistic: bool):
+        self.rnd = rnd
+        self.realistic = realistic
+
+    def count(self, mean: int) -> int:
+        if not self.realistic or mean <= 1:
+            return mean
+        return max(1, min(int(self.rnd.lognormvariate(0, 0.8) * mean * 0.75), mean * 20))
+
+    def sample(self, population: List[int], k: int) -> List[int]:
+        k = min(k, len(population))
+        if not self.realistic:
+            return self.rnd.sample(population, k)
+        weights = [1 / rank for rank in range(1, len(population) + 1)]
+        chosen = set()
+        while len(chosen) < k:
+            chosen.update(self.rnd.choices(population, weights, k=k - len(chosen)))
+        return list(chosen)
+
+    def name(self, names, i: int) -> str:
+        base = names[i % len(names)]
+        return base if i < len(names) else f'{base} {i // len(names) + 1}'
+
+    def title(self, ingredient_names: List[str]) -> str:
+        main = self.rnd.choice(ingredient_names or INGREDIENT_NAMES)
+        return f'{self.rnd.choice(TITLE_WORDS)} {main.lower()}'
+
+
+def copy_rows(table: str, columns, rows) -> int:
+    """Write rows with PostgreSQL COPY and return their number."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer
+        )
+    return count
+
+
+def insert_links(through, column: str, links, batch_size: int, use_copy: bool) -> int:
+    """Insert (recipe_id, <column>) M2M rows with COPY or batched bulk_create."""
+    if use_copy:
+        return copy_rows(through._meta.db_table, ('recipe_id', column), links)
+    objs = [through(recipe_id=recipe_id, **{column: pk}) for recipe_id, pk in links]
+    through.objects.bulk_create(objs, batch_size=batch_size)
+    return len(objs)
+
+
+def seed_users(
+    first_user: int,
+    users: int,
+    recipes=50,
+    tags=10,
+    ingredients=30,
+    links=5,
+    seed=0,
+    realistic=False,
+    password_hash=None,
+    batch_size=1000,
+    use_copy=None,
+) -> dict:
+    """Create users `first_user`..`first_user + users` with their tags, ingredients and recipes.
+
+    `recipes`, `tags` and `ingredients` are (mean) counts per user and `links`
+    is the (mean) number of tags and ingredients attached to every recipe.
+    Returns the number of rows written per model.
+    """
+    rnd = random.Random(f'{seed}-{first_user}')
+    dist = Distribution(rnd, realistic)
+    if use_copy is None:
+        use_copy = connection.vendor == 'postgresql'
+    password_hash = password_hash or make_password(SEED_PASSWORD)
+    user_model = get_user_model()
+    written = dict.fromkeys(('users', 'tags', 'ingredients', 'recipes', 'links'), 0)
+
+    with transaction.atomic():
+        created_users = user_model.objects.bulk_create(
+            (
+                user_model(
+                    email=f'user{seed}-{i}@seed.local', name=f'User {i}', password=password_hash
+                )
+                for i in range(first_user, first_user + users)
+            ),
+            batch_size=batch_size,
+        )
+        written['users'] = len(created_users)
+
+        user_tags = {user.id: [] for user in created_users}
+        user_ingredients = {user.id: [] for user in created_users}
+        tag_objs = [
+            Tag(user=user, name=dist.name(TAG_NAMES, i))
+            for user in created_users
+            for i in range(dist.count(tags))
+        ]
+        ingredient_objs = [
+            Ingredient(user=user, name=dist.name(INGREDIENT_NAMES, i))
+            for user in created_users
+            for i in range(dist.count(ingredients))
+        ]
+        for tag in Tag.objects.bulk_create(tag_objs, batch_size=batch_size):
+            user_tags[tag.user_id].append(tag.id)
+        for ingredient in Ingredient.objects.bulk_create(ingredient_objs, batch_size=batch_size):
+            user_ingredients[ingredient.user_id].append(ingredient.id)
+        written['tags'], written['ingredients'] = len(tag_objs), len(ingredient_objs)
+
+        recipe_objs = []
+        for user in created_users:
+            names = [dist.name(INGREDIENT_NAMES, i) for i in range(len(user_ingredients[user.id]))]
+            recipe_objs.extend(
+                Recipe(
+                    user=user,
+                    title=dist.title(names),
+                    time_minutes=max(1, int(rnd.gammavariate(2, 20))) if realistic else 30,
+                    price=round(rnd.lognormvariate(2.3, 0.6), 2) if realistic else 10,
+                )
+                for _ in range(dist.count(recipes))
+            )
+        Recipe.objects.bulk_create(recipe_objs, batch_size=batch_size)
+        written['recipes'] = len(recipe_objs)
+
+        tag_links = (
+            (recipe.id, tag_id)
+            for recipe in recipe_objs
+            for tag_id in dist.sample(user_tags[recipe.user_id], dist.count(links))
+        )
+        ingredient_links = (
+            (recipe.id, ingredient_id)
+            for recipe in recipe_objs
+            for ingredient_id in dist.sample(
+                user_ingredients[recipe.user_id], dist.count(links)
+            )
+        )
+        written['links'] = insert_links(
+            Recipe.tags.through, 'tag_id', tag_links, batch_size, use_copy
+        ) + insert_links(
+            Recipe.ingredients.through, 'ingredient_id', ingredient_links, batch_size, use_copy
+        )
+
+    return written
+
+
+def seed_dataset(users=10, **options) -> list:
+    """Create a synthetic dataset and return the created users."""
+    seed_users(0, users, **options)
+    seed = options.get('seed', 0)
+    return list(
+        get_user_model()
+        .objects.filter(email__endswith='@seed.local', email__startswith=f'user{seed}-')
+        .order_by('id')
+    )
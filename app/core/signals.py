@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from core import authentication, images
+from core.models import Recipe
+
+
+def _loaded_image_name(instance):
+    """Return the image name without loading a deferred field (None when deferred)."""
+    value = instance.__dict__.get('image')
+    return getattr(value, 'name', value)
+
+
+@receiver(post_init, sender=Recipe)
+def remember_image(sender, instance, **kwargs):
+    instance._saved_image = _loaded_image_name(instance) if instance.pk else ''
+
+
+@receiver(post_save, sender=Recipe)
+def count_image_references(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    old, new = instance._saved_image, _loaded_image_name(instance)
+    if old is None or new is None or old == new:
+        return
+    images.release(old)
+    images.add_reference(new)
+    instance._saved_image = new
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image(sender, instance, **kwargs):
+    images.release(_loaded_image_name(instance))
+
+
+@receiver(post_save, sender=get_user_model())
+def revoke_tokens(sender, instance, created, **kwargs):
+    # `_password` is set until the save of a changed password completes.
+    if not created and (not instance.is_active or instance._password is not None):
+        authentication.revoke_user(instance.pk)
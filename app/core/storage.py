@@ -0,0 +1,227 @@
+import base64
+import hashlib
+import mimetypes
+import posixpath
+import re
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage, Storage, default_storage
+from django.urls import reverse
+from django.utils.deconstruct import deconstructible
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # pragma: no cover - boto3 is only needed for S3Storage
+    boto3 = None
+    ClientError = Exception
+
+UPLOAD_SALT = 'core.storage.upload'
+
+CONTENT_ADDRESSED_RE = re.compile(r'(?:^|/)([0-9a-f]{2})/(\1[0-9a-f]{62})\.\w+$')
+
+IMAGE_CONTENT_TYPES = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+}
+
+
+def get_storage_settings() -> dict:
+    return settings.OBJECT_STORAGE
+
+
+def content_digest(content) -> str:
+    """Return the SHA-256 hex digest of a Django File."""
+    sha = hashlib.sha256()
+    for chunk in content.chunks():
+        sha.update(chunk)
+    content.seek(0)
+    return sha.hexdigest()
+
+
+def content_addressed_name(content, ext: str, digest: str = None) -> str:
+    """Return `<aa>/<sha256>.<ext>`, a name derived from the file content only."""
+    digest = digest or content_digest(content)
+    return f'{digest[:2]}/{digest}.{ext}'
+
+
+def is_content_addressed(name: str) -> bool:
+    return CONTENT_ADDRESSED_RE.search(name) is not None
+
+
+class ContentAddressedMixin:
+    """Store content addressed names once: equal names mean equal content."""
+
+    _saving = threading.local()
+
+    def get_available_name(self, name, max_length=None):
+        if is_content_addressed(name):
+            if getattr(self._saving, 'name', None) == name:
+                # FileSystemStorage asks for another name when the file was
+                # created meanwhile, there is none.
+                raise FileExistsError(name)
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        if not is_content_addressed(name):
+            return super()._save(name, content)
+        if self.exists(name):
+            return name
+        self._saving.name = name
+        try:
+            return super()._save(name, content)
+        except FileExistsError:
+            if not self.exists(name):
+                raise
+            # A concurrent save stored the same content first.
+            return name
+        finally:
+            self._saving.name = None
+
+
+class DirectUploadMixin(ABC):
+    """Storage that lets clients upload objects directly, without passing through the API."""
+
+    @abstractmethod
+    def presign_upload(
+        self, name: str, content_type: str, expires_in: int, sha256: str = None
+    ) -> dict:
+        """Return the request (url, method and headers) that uploads `name`.
+
+        With `sha256` given, the storage rejects content with another digest.
+        """
+
+
+@deconstructible
+class LocalObjectStorage(ContentAddressedMixin, DirectUploadMixin, FileSystemStorage):
+    """Filesystem storage with signed upload URLs, a local stand-in for object storage."""
+
+    def presign_upload(self, name, content_type, expires_in, sha256=None):
+        token = signing.dumps(
+            {
+                'name': name,
+                'content_type': content_type,
+                'expires_in': expires_in,
+                'sha256': sha256,
+            },
+            salt=UPLOAD_SALT,
+        )
+        return {
+            'url': f'{reverse("storage-upload")}?{urlencode({"token": token})}',
+            'method': 'PUT',
+            'headers': {'Content-Type': content_type},
+        }
+
+    @staticmethod
+    def load_upload_token(token: str) -> dict:
+        """Return the upload described by a signed token, raising BadSignature when invalid."""
+        data = signing.loads(token, salt=UPLOAD_SALT)
+        # Verify again, now that the token lifetime is known.
+        return signing.loads(token, salt=UPLOAD_SALT, max_age=data['expires_in'])
+
+
+@deconstructible
+class S3Storage(ContentAddressedMixin, DirectUploadMixin, Storage):
+    """Storage on an S3 compatible service (AWS S3, MinIO, ...), configured by OBJECT_STORAGE."""
+
+    def __init__(self, client=None, bucket=None, public_url=None):
+        options = get_storage_settings()
+        self.bucket = bucket or options['BUCKET']
+        self.public_url = public_url or options['PUBLIC_URL']
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            if boto3 is None:
+                raise ImproperlyConfigured('S3Storage requires the boto3 package.')
+            options = get_storage_settings()
+            self._client = boto3.client(
+                's3',
+                endpoint_url=options['ENDPOINT_URL'],
+                region_name=options['REGION'],
+                aws_access_key_id=options['ACCESS_KEY'],
+                aws_secret_access_key=options['SECRET_KEY'],
+            )
+        return self._client
+
+    def _head(self, name):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=name)
+        except ClientError:
+            return None
+
+    def _open(self, name, mode='rb'):
+        body = self.client.get_object(Bucket=self.bucket, Key=name)['Body'].read()
+        return File(BytesIO(body), name=name)
+
+    def _save(self, name, content):
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        content.seek(0)
+        self.client.upload_fileobj(
+            content, self.bucket, name, ExtraArgs={'ContentType': content_type}
+        )
+        return name
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=name)
+
+    def exists(self, name):
+        return self._head(name) is not None
+
+    def size(self, name):
+        return self._head(name)['ContentLength']
+
+    def url(self, name):
+        if self.public_url:
+            return f'{self.public_url.rstrip("/")}/{name}'
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': name}
+        )
+
+    def listdir(self, path):
+        prefix = f'{path.rstrip("/")}/' if path else ''
+        directories, files = [], []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter='/'):
+            directories.extend(
+                p['Prefix'][len(prefix):].rstrip('/') for p in page.get('CommonPrefixes', ())
+            )
+            files.extend(obj['Key'][len(prefix):] for obj in page.get('Contents', ()))
+        return directories, files
+
+    def get_modified_time(self, name):
+        return self._head(name)['LastModified']
+
+    def presign_upload(self, name, content_type, expires_in, sha256=None):
+        params = {'Bucket': self.bucket, 'Key': name, 'ContentType': content_type}
+        headers = {'Content-Type': content_type}
+        if sha256:
+            checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+            params['ChecksumSHA256'] = checksum
+            headers['x-amz-checksum-sha256'] = checksum
+        url = self.client.generate_presigned_url('put_object', Params=params, ExpiresIn=expires_in)
+        return {'url': url, 'method': 'PUT', 'headers': headers}
+
+
+def new_upload_name(directory: str, content_type: str, sha256: str = None) -> str:
+    """Return the object name for a direct upload, content addressed when `sha256` is known."""
+    ext = IMAGE_CONTENT_TYPES[content_type]
+    if sha256:
+        return posixpath.join(directory, content_addressed_name(None, ext, sha256))
+    return posixpath.join(directory, f'{uuid.uuid4()}.{ext}')
+
+
+def supports_direct_upload(storage=default_storage) -> bool:
+    return isinstance(storage, DirectUploadMixin)
@@ -0,0 +1,197 @@
+import logging
+import random
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry: Dict[str, Callable] = {}
+
+STALE_ERROR = 'The worker running the task stopped.'
+
+
+def get_task_settings() -> dict:
+    return settings.TASK_QUEUE
+
+
+def task(func=None, *, name: str = None, max_attempts: int = None):
+    """Register a function as a task, its keyword arguments must be JSON serializable."""
+
+    def register(func):
+        func.task_name = name or f'{func.__module__}.{func.__qualname__}'
+        func.max_attempts = max_attempts
+        _registry[func.task_name] = func
+        return func
+
+    return register(func) if func is not None else register
+
+
+def get_task(name: str) -> Callable:
+    return _registry[name]
+
+
+def enqueue(
+    func: Callable, kwargs: dict = None, key: str = None, delay: float = 0
+) -> Optional[Task]:
+    """Queue a call of a registered task, in the current transaction when there is one.
+
+    A task with the same idempotency `key` is only queued once, later calls
+    return None. A task that failed is queued again with the new arguments
+    and all its attempts, so failed work can be retried.
+    """
+    options = get_task_settings()
+    task = Task(
+        name=func.task_name,
+        kwargs=kwargs or {},
+        idempotency_key=key,
+        max_attempts=func.max_attempts or options['MAX_ATTEMPTS'],
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    if key is None:
+        task.save()
+        return task
+    try:
+        with transaction.atomic():
+            task.save()
+    except IntegrityError:
+        requeued = Task.objects.filter(idempotency_key=key, status=Task.FAILED).update(
+            name=task.name,
+            kwargs=task.kwargs,
+            status=Task.QUEUED,
+            attempts=0,
+            max_attempts=task.max_attempts,
+            run_after=task.run_after,
+            locked_at=None,
+            last_error='',
+            updated=timezone.now(),
+        )
+        return Task.objects.get(idempotency_key=key) if requeued else None
+    return task
+
+
+def backoff(attempts: int) -> float:
+    """Seconds to wait before the next attempt, exponential with jitter."""
+    options = get_task_settings()
+    delay = min(
+        options['RETRY_BACKOFF_SECONDS'] * 2 ** (attempts - 1), options['MAX_BACKOFF_SECONDS']
+    )
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def claim(limit: int = 1) -> List[Task]:
+    """Lock due tasks for this worker, skipping those locked by other workers."""
+    now = timezone.now()
+    with transaction.atomic():
+        tasks = list(
+            Task.objects.select_for_update(skip_locked=True)
+            .filter(status=Task.QUEUED, run_after__lte=now)
+            .order_by('run_after')[:limit]
+        )
+        if tasks:
+            # Counted when claimed, so attempts of workers that died count too.
+            Task.objects.filter(id__in=[task.id for task in tasks]).update(
+                status=Task.RUNNING, locked_at=now, attempts=F('attempts') + 1, updated=now
+            )
+    for task in tasks:
+        task.status, task.locked_at = Task.RUNNING, now
+        task.attempts += 1
+    return tasks
+
+
+def requeue_stale() -> int:
+    """Queue again tasks of workers that died while running them, return how many.
+
+    Tasks without attempts left are marked failed instead.
+    """
+    options = get_task_settings()
+    now = timezone.now()
+    stale = Task.objects.filter(
+        status=Task.RUNNING, locked_at__lt=now - timedelta(seconds=options['LOCK_TIMEOUT_SECONDS'])
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Task.FAILED, locked_at=None, last_error=STALE_ERROR, updated=now
+    )
+    if failed:
+        logger.error('%d tasks failed, their workers stopped on the last attempt.', failed)
+    return stale.update(status=Task.QUEUED, locked_at=None, updated=now)
+
+
+@contextmanager
+def heartbeat(task: Task):
+    """Refresh the lock of a running task until the block ends.
+
+    Long tasks are not taken for the tasks of dead workers. The lock is
+    refreshed from a thread with its own database connection, so it
+    commits while the task holds a transaction open.
+    """
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(get_task_settings()['HEARTBEAT_SECONDS']):
+                Task.objects.filter(id=task.id, status=Task.RUNNING).update(
+                    locked_at=timezone.now()
+                )
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=beat, name=f'heartbeat-{task.id}', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def run(task: Task) -> bool:
+    """Run a claimed task, scheduling a retry when it fails. Return whether it succeeded."""
+    try:
+        with heartbeat(task):
+            get_task(task.name)(**task.kwargs)
+    except Exception:
+        task.last_error = traceback.format_exc()
+        if task.attempts < task.max_attempts:
+            task.status = Task.QUEUED
+            task.run_after = timezone.now() + timedelta(seconds=backoff(task.attempts))
+            logger.warning('Task %s failed, retrying at %s.', task.name, task.run_after)
+        else:
+            task.status = Task.FAILED
+            logger.error('Task %s failed after %d attempts.', task.name, task.attempts)
+        task.locked_at = None
+        task.save(
+            update_fields=['status', 'attempts', 'run_after', 'locked_at', 'last_error', 'updated']
+        )
+        return False
+    task.status, task.locked_at = Task.DONE, None
+    task.save(update_fields=['status', 'attempts', 'locked_at', 'updated'])
+    return True
+
+
+def run_pending(limit: int = 100) -> int:
+    """Run due tasks in this process until none is left or `limit` ran, return how many ran."""
+    ran = 0
+    while ran < limit:
+        tasks = claim()
+        if not tasks:
+            break
+        run(tasks[0])
+        ran += 1
+    return ran
+
+
+def prune(older_than: timedelta) -> int:
+    """Delete finished tasks, and with them their idempotency keys."""
+    cutoff = timezone.now() - older_than
+    deleted, _ = Task.objects.filter(status=Task.DONE, updated__lt=cutoff).delete()
+    return deleted
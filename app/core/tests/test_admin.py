@@ -1,8 +1,14 @@
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 
+from core.admin import EstimatedCountPaginator
+from core.models import Ingredient, Recipe, Tag, Task
+from users.tasks import purge_user
+
 
 class AdminSiteTests(TestCase):
     def setUp(self):
@@ -40,3 +46,102 @@ class AdminSiteTests(TestCase):
         res = self.client.get(url)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_delete_user_soft_deletes(self):
+        """Test that deleting users in the admin deactivates them and queues the purge."""
+        other = get_user_model().objects.create_user(email='other@gmail.com', password='pass')
+        self._create_recipes(3)
+        url = reverse('admin:core_user_delete', args=(self.user.id,))
+
+        confirm = self.client.get(url)
+        self.client.post(url, {'post': 'yes'})
+        self.client.post(
+            reverse('admin:core_user_changelist'),
+            {'action': 'delete_selected', '_selected_action': [other.id], 'post': 'yes'},
+        )
+
+        self.assertContains(confirm, self.user.email)
+        self.assertNotContains(confirm, 'Dish 0')
+        for user in (self.user, other):
+            user.refresh_from_db()
+            self.assertIsNotNone(user.deleted_at)
+            self.assertFalse(user.is_active)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(Task.objects.filter(name=purge_user.task_name).count(), 2)
+
+    def _create_recipes(self, count):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                user=self.user, title=f'Dish {i}', time_minutes=5, price=1
+            )
+            recipe.tags.add(tag)
+
+    def _count_queries(self, url) -> int:
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(context)
+
+    def test_changelist_queries_do_not_grow(self):
+        """Test that the changelists do not query per row."""
+        urls = [
+            reverse(f'admin:core_{name}_changelist') for name in ('recipe', 'tag', 'ingredient')
+        ]
+        Ingredient.objects.create(user=self.user, name='Salt')
+        self._create_recipes(2)
+        few = [self._count_queries(url) for url in urls]
+
+        self._create_recipes(10)
+        Ingredient.objects.create(user=self.admin_user, name='Pepper')
+
+        self.assertEqual([self._count_queries(url) for url in urls], few)
+
+    def test_recipe_change_page_renders_selected_only(self):
+        """Test that the recipe form does not load all tags and ingredients."""
+        recipe = Recipe.objects.create(user=self.user, title='Dish', time_minutes=5, price=1)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Selected'))
+        Tag.objects.create(user=self.admin_user, name='Unrelated')
+
+        res = self.client.get(reverse('admin:core_recipe_change', args=(recipe.id,)))
+
+        self.assertContains(res, 'Selected')
+        self.assertNotContains(res, 'Unrelated')
+
+    def test_user_search_uses_index(self):
+        """Test that searching users is planned on the prefix indexes."""
+        get_user_model().objects.bulk_create(
+            get_user_model()(email=f'user{i}@gmail.com', name=f'User {i}') for i in range(500)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_user')
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(reverse('admin:core_user_changelist'), {'q': 'client'})
+        self.assertContains(res, self.user.email)
+        sql = next(
+            query['sql']
+            for query in context.captured_queries
+            if 'FROM "core_user"' in query['sql'] and 'LIKE' in query['sql']
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+        self.assertIn('user_email_search_idx', plan)
+        self.assertIn('user_name_search_idx', plan)
+
+    @override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=2)
+    def test_estimated_count(self):
+        """Test that unfiltered big tables are counted from planner statistics."""
+        self._create_recipes(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_recipe')
+        self._create_recipes(2)
+
+        self.assertEqual(EstimatedCountPaginator(Recipe.objects.order_by('id'), 10).count, 3)
+        self.assertEqual(
+            EstimatedCountPaginator(Recipe.objects.filter(user=self.user).order_by('id'), 10).count,
+            5,
+        )
@@ -0,0 +1,59 @@
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from core import bench
+from core.models import Recipe, Tag
+
+
+class BenchHelpersTests(TestCase):
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        samples = list(range(1, 101))
+
+        self.assertEqual(bench.percentile(samples, 50), 50)
+        self.assertEqual(bench.percentile(samples, 99), 99)
+        self.assertEqual(bench.percentile([7], 99), 7)
+
+    def test_compare(self):
+        """Test relative change between two runs."""
+        baseline = {'results': {'a': {'p50_ms': 10.0}, 'b': {'p50_ms': 4.0}}}
+        current = {'results': {'a': {'p50_ms': 15.0}, 'c': {'p50_ms': 1.0}}}
+
+        self.assertEqual(bench.compare(baseline, current), {'a': 50.0})
+
+
+class RunBenchmarksTests(TestCase):
+    def test_run_benchmarks(self):
+        """Test that every scenario is measured on the seeded dataset."""
+        scale = {'users': 2, 'recipes': 3, 'tags': 4, 'ingredients': 4, 'links': 2}
+
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                results = bench.run_benchmarks(scale, iterations=2)
+
+        seeded = Recipe.objects.exclude(title='Bench recipe')
+        self.assertEqual(seeded.count(), 6)
+        self.assertEqual(Tag.objects.count(), 8)
+        self.assertEqual(Recipe.tags.through.objects.filter(recipe__in=seeded).count(), 12)
+        self.assertEqual(
+            set(results['results']),
+            {
+                'recipe_list',
+                'recipe_list_gzip',
+                'recipe_detail',
+                'recipe_filter',
+                'tag_list_assigned',
+                'ingredient_list_assigned',
+                'token_create',
+                'image_upload',
+                'recipe_create_large',
+                'recipe_update_large',
+            },
+        )
+        for result in results['results'].values():
+            self.assertEqual(result['iterations'], 2)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertLess(
+            results['compression']['gzip-6']['bytes'], results['compression']['identity']['bytes']
+        )
@@ -1,26 +1,137 @@
+import json
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import F
 from django.db.utils import OperationalError
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.health import ping_database
+from core.management.commands.profile_startup import group_by_package, parse_importtime
+from core.models import Tag, Ingredient, Recipe
+from core.seed import SEED_PASSWORD
 
 
 class CommandTests(TestCase):
     def test_wait_for_db_ready(self):
         """Test waiting for db when db is available."""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-
-            call_command('wait_for_db')
+        with patch('core.management.commands.wait_for_db.ping_database') as ping:
+            call_command('wait_for_db', stdout=StringIO())
 
-            self.assertEqual(gi.call_count, 1)
+            self.assertEqual(ping.call_count, 1)
 
     @patch('time.sleep', return_value=True)
     def test_wait_for_db(self, time_mock):
         """Test waiting for db."""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
+        with patch('core.management.commands.wait_for_db.ping_database') as ping:
+            ping.side_effect = [OperationalError] * 5 + [None]
+
+            call_command('wait_for_db', stdout=StringIO())
+
+            self.assertEqual(ping.call_count, 6)
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_backoff(self, time_mock):
+        """Test that retries back off exponentially up to the maximum delay."""
+        with patch('core.management.commands.wait_for_db.ping_database') as ping:
+            ping.side_effect = [OperationalError] * 5 + [None]
+
+            call_command('wait_for_db', initial_delay=1, max_delay=4, stdout=StringIO())
+
+        waits = [call.args[0] for call in time_mock.call_args_list]
+        for wait, delay in zip(waits, (1, 2, 4, 4, 4)):
+            self.assertGreaterEqual(wait, delay / 2)
+            self.assertLessEqual(wait, delay)
+
+    @patch('time.sleep', return_value=True)
+    def test_wait_for_db_timeout(self, time_mock):
+        """Test giving up once the timeout has passed."""
+        with patch('core.management.commands.wait_for_db.ping_database') as ping:
+            ping.side_effect = OperationalError
+
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', timeout=0, stdout=StringIO())
+
+    def test_ping_database(self):
+        """Test that the probe runs a real query."""
+        with CaptureQueriesContext(connection) as queries:
+            ping_database()
+
+        self.assertEqual(queries[0]['sql'], 'SELECT 1')
+
+
+class SeedCommandTests(TestCase):
+    def test_seed_uniform(self):
+        """Test seeding exact counts per user."""
+        call_command(
+            'seed',
+            users=3,
+            recipes=4,
+            tags=2,
+            ingredients=5,
+            links=2,
+            seed=1,
+            uniform=True,
+            stdout=StringIO(),
+        )
+
+        self.assertEqual(get_user_model().objects.count(), 3)
+        self.assertEqual(Tag.objects.count(), 6)
+        self.assertEqual(Ingredient.objects.count(), 15)
+        self.assertEqual(Recipe.objects.count(), 12)
+        self.assertEqual(Recipe.tags.through.objects.count(), 24)
+        self.assertEqual(Recipe.ingredients.through.objects.count(), 24)
+
+    def test_seed_links_stay_within_user(self):
+        """Test that recipes only link tags and ingredients of their owner."""
+        call_command('seed', users=4, users_per_chunk=2, seed=2, no_copy=True, stdout=StringIO())
+
+        self.assertFalse(
+            Recipe.ingredients.through.objects.exclude(
+                recipe__user=F('ingredient__user')
+            ).exists()
+        )
+        self.assertFalse(Recipe.tags.through.objects.exclude(recipe__user=F('tag__user')).exists())
+
+    def test_seed_password_hash_reused(self):
+        """Test that seeded users can log in with the seed password."""
+        call_command('seed', users=2, recipes=1, seed=3, stdout=StringIO())
+
+        users = get_user_model().objects.all()
+        self.assertEqual(len({user.password for user in users}), 1)
+        self.assertTrue(users[0].check_password(SEED_PASSWORD))
+
+
+class ProfileStartupCommandTests(TestCase):
+    def test_parse_importtime(self):
+        """Test parsing `python -X importtime` output into per-package times."""
+        output = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       100 |        100 |     django.db.models\n'
+            'import time:        50 |        150 |   django.db\n'
+            'import time:        30 |         30 |   django.contrib.admin.sites\n'
+            'import time:        20 |        200 | app.wsgi\n'
+        )
+
+        modules = parse_importtime(output)
+
+        self.assertEqual(modules[0], ('django.db.models', 100))
+        self.assertEqual(
+            group_by_package(modules),
+            {'django.db': 150, 'django.contrib.admin': 30, 'app.wsgi': 20},
+        )
+
+    def test_profile_startup(self):
+        """Test measuring the cold start of a fresh interpreter."""
+        out = StringIO()
 
-            call_command('wait_for_db')
+        call_command('profile_startup', runs=1, top=3, json=True, stdout=out)
 
-            self.assertEqual(gi.call_count, 6)
+        results = json.loads(out.getvalue())
+        self.assertGreater(results['median_ms'], 0)
+        self.assertLessEqual(len(results['imports_ms']), 3)
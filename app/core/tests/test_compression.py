@@ -0,0 +1,111 @@
+import gzip
+import json
+import unittest
+import zlib
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from core import compression
+from core.middleware import CompressionMiddleware
+
+BODY = json.dumps([{'id': i, 'title': f'Recipe {i}', 'price': '5.00'} for i in range(200)]).encode()
+
+
+class NegotiationTests(SimpleTestCase):
+    def test_negotiate(self):
+        """Test that the accepted coding with the highest quality is chosen."""
+        codecs = ['zstd', 'br', 'gzip']
+
+        self.assertEqual(compression.negotiate('gzip, deflate, br', codecs), 'br')
+        self.assertEqual(compression.negotiate('gzip;q=1, br;q=0.5', codecs), 'gzip')
+        self.assertEqual(compression.negotiate('*', codecs), 'zstd')
+        self.assertEqual(compression.negotiate('*, zstd;q=0', codecs), 'br')
+        self.assertIsNone(compression.negotiate('deflate, identity', codecs))
+        self.assertIsNone(compression.negotiate('gzip;q=0', codecs))
+        self.assertIsNone(compression.negotiate('', codecs))
+
+    def test_codec_without_streaming_not_instantiated(self):
+        """Test that a codec missing a method fails when created, not when used."""
+
+        class OneShotCodec(compression.Codec):
+            name = 'one-shot'
+
+            def compress(self, data):
+                return data
+
+        with self.assertRaises(TypeError):
+            OneShotCodec(1)
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _process(self, response, path='/api/recipe/recipes/', accept='gzip'):
+        request = self.factory.get(path, HTTP_ACCEPT_ENCODING=accept)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_compress_response(self):
+        """Test that large responses are compressed for clients accepting gzip."""
+        response = HttpResponse(BODY, content_type='application/json')
+        response['ETag'] = '"abc"'
+
+        response = self._process(response)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), BODY)
+
+    def test_small_and_unaccepted_responses_not_compressed(self):
+        """Test that small responses and clients without gzip get the body as it is."""
+        small = self._process(HttpResponse(b'{}', content_type='application/json'))
+        identity = self._process(HttpResponse(BODY), accept='identity')
+
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertEqual(identity.content, BODY)
+        self.assertFalse(identity.has_header('Content-Encoding'))
+
+    def test_media_not_compressed(self):
+        """Test that compressed media types and media files are skipped."""
+        image = self._process(HttpResponse(BODY, content_type='image/jpeg'))
+        media = self._process(HttpResponse(BODY, content_type='text/plain'), path='/media/a.txt')
+
+        for response in (image, media):
+            self.assertEqual(response.content, BODY)
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_compress_streaming_response(self):
+        """Test that streaming responses are compressed chunk by chunk."""
+        chunks = [BODY[i:i + 1000] for i in range(0, len(BODY), 1000)]
+        response = StreamingHttpResponse(iter(chunks), content_type='text/csv')
+
+        response = self._process(response)
+        compressed = list(response.streaming_content)
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertGreater(len(compressed), 1)
+        self.assertEqual(zlib.decompress(b''.join(compressed), 16 + zlib.MAX_WBITS), BODY)
+        # Each chunk is flushed, the first decompresses on its own.
+        first = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(compressed[0])
+        self.assertEqual(first, chunks[0])
+
+    @unittest.skipIf(compression.brotli is None, 'brotli is not installed')
+    def test_compress_brotli(self):
+        """Test that brotli is preferred over gzip when installed."""
+        response = self._process(HttpResponse(BODY), accept='gzip, br')
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(response.content), BODY)
+
+    @unittest.skipIf(compression.zstandard is None, 'zstandard is not installed')
+    def test_compress_zstd(self):
+        """Test that zstd is preferred when installed."""
+        response = self._process(HttpResponse(BODY), accept='gzip, br, zstd')
+
+        self.assertEqual(response['Content-Encoding'], 'zstd')
+        decompressor = compression.zstandard.ZstdDecompressor()
+        self.assertEqual(decompressor.decompressobj().decompress(response.content), BODY)
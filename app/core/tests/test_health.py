@@ -0,0 +1,51 @@
+from unittest.mock import patch
+
+from django.db.utils import OperationalError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+
+from core import health
+
+HEALTHZ_URL = reverse('healthz')
+READYZ_URL = reverse('readyz')
+
+
+class HealthCheckTests(TestCase):
+    def setUp(self):
+        health.reset_readiness()
+
+    def tearDown(self):
+        health.reset_readiness()
+
+    def test_healthz(self):
+        """Test that the liveness probe does not touch the database."""
+        with self.assertNumQueries(0):
+            res = self.client.get(HEALTHZ_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_readyz(self):
+        """Test that the readiness probe reports reachable dependencies."""
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['checks'], {'database': 'ok', 'cache': 'ok'})
+
+    @patch('core.health.ping_database', side_effect=OperationalError('connection refused'))
+    def test_readyz_database_down(self, ping):
+        """Test that the readiness probe fails when the database is unreachable."""
+        res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res.json()['checks']['database'], 'connection refused')
+
+    @override_settings(HEALTH_CHECK_CACHE_SECONDS=60)
+    def test_readyz_result_cached(self):
+        """Test that repeated probes reuse the last result."""
+        self.client.get(READYZ_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(READYZ_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
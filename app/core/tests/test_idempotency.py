@@ -0,0 +1,166 @@
+import tempfile
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import idempotency
+from core.models import IdempotencyRecord, Recipe, Tag
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+PAYLOAD = {'title': 'Omelette', 'time_minutes': 10, 'price': '5.00', 'tags': [], 'ingredients': []}
+
+
+class IdempotencyApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@gmail.com', 'password123')
+        self.client.force_authenticate(self.user)
+
+    def _post(self, url, data, key='key-1', **kwargs):
+        kwargs.setdefault('format', 'json')
+        return self.client.post(url, data, HTTP_IDEMPOTENCY_KEY=key, **kwargs)
+
+    def test_retry_replays_response(self):
+        """Test that a retried create returns the first response without creating again."""
+        first = self._post(RECIPES_URL, PAYLOAD)
+        second = self._post(RECIPES_URL, PAYLOAD)
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(second[idempotency.REPLAYED_HEADER], 'true')
+        self.assertFalse(first.has_header(idempotency.REPLAYED_HEADER))
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_keys_are_per_user_and_optional(self):
+        """Test that other users and requests without a key are not replayed."""
+        other = get_user_model().objects.create_user('other@gmail.com', 'password123')
+        self._post(TAGS_URL, {'name': 'Vegan'})
+        self.client.post(TAGS_URL, {'name': 'Vegan'}, format='json')
+        self.client.force_authenticate(other)
+        res = self._post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Tag.objects.filter(user=other).count(), 1)
+
+    def test_reused_key_with_other_body_rejected(self):
+        """Test that a key sent again with another body is rejected with 422."""
+        self._post(RECIPES_URL, PAYLOAD)
+
+        res = self._post(RECIPES_URL, dict(PAYLOAD, title='Pancakes'))
+
+        self.assertEqual(res.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_key_in_progress_conflicts(self):
+        """Test that a duplicate of a request still being handled gets 409."""
+        self._post(RECIPES_URL, PAYLOAD)
+        record = IdempotencyRecord.objects.get(user=self.user, key='key-1')
+        record.status_code = record.response = None
+        record.save()
+
+        res = self._post(RECIPES_URL, PAYLOAD)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_expired_and_abandoned_keys_handled_again(self):
+        """Test that expired records and abandoned locks are taken over."""
+        self._post(RECIPES_URL, PAYLOAD)
+        IdempotencyRecord.objects.update(created=timezone.now() - timedelta(hours=25))
+
+        expired = self._post(RECIPES_URL, dict(PAYLOAD, title='Pancakes'))
+        IdempotencyRecord.objects.update(
+            status_code=None, response=None, created=timezone.now() - timedelta(minutes=5)
+        )
+        abandoned = self._post(RECIPES_URL, dict(PAYLOAD, title='Pancakes'))
+
+        self.assertEqual(expired.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(abandoned.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(abandoned.has_header(idempotency.REPLAYED_HEADER))
+        self.assertEqual(Recipe.objects.count(), 3)
+
+    def test_failed_request_releases_key(self):
+        """Test that a key used for an invalid request can be used again."""
+        invalid = self._post(RECIPES_URL, dict(PAYLOAD, time_minutes='soon'))
+        valid = self._post(RECIPES_URL, PAYLOAD)
+
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(valid.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(IdempotencyRecord.objects.get().status_code, 201)
+
+    def test_work_and_response_committed_together(self):
+        """Test that the work of a request is rolled back when its response is not stored."""
+        save = IdempotencyRecord.save
+
+        def fail_storing_response(record, *args, **kwargs):
+            if kwargs.get('update_fields'):
+                raise DatabaseError('Connection lost.')
+            return save(record, *args, **kwargs)
+
+        with mock.patch.object(IdempotencyRecord, 'save', fail_storing_response):
+            with self.assertRaises(DatabaseError):
+                self._post(RECIPES_URL, PAYLOAD)
+        retried = self._post(RECIPES_URL, PAYLOAD)
+
+        self.assertEqual(retried.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(retried.has_header(idempotency.REPLAYED_HEADER))
+        self.assertEqual(Recipe.objects.count(), 1)
+
+    def test_invalid_key_rejected(self):
+        """Test that empty and too long keys are rejected."""
+        empty = self._post(RECIPES_URL, PAYLOAD, key='')
+        long = self._post(RECIPES_URL, PAYLOAD, key='k' * 256)
+
+        self.assertEqual(empty.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(long.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_retry_image_upload_replayed(self):
+        """Test that a retried multipart upload is replayed, another file is not."""
+        recipe = Recipe.objects.create(user=self.user, title='Cake', time_minutes=1, price=1)
+        url = reverse('recipe:recipe-upload-image', args=[recipe.id])
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+
+        def upload(content):
+            image = SimpleUploadedFile('cake.jpg', content, content_type='image/jpeg')
+            return self._post(url, {'image': image}, format='multipart')
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root
+        ):
+            first = upload(buffer.getvalue())
+            second = upload(buffer.getvalue())
+            Image.new('RGB', (20, 20)).save(buffer, format='JPEG')
+            other = upload(buffer.getvalue())
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second[idempotency.REPLAYED_HEADER], 'true')
+        self.assertEqual(other.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_prune(self):
+        """Test that prune deletes the expired records only."""
+        self._post(TAGS_URL, {'name': 'Vegan'}, key='old')
+        self._post(TAGS_URL, {'name': 'Keto'}, key='new')
+        IdempotencyRecord.objects.filter(key='old').update(
+            created=timezone.now() - timedelta(hours=25)
+        )
+
+        self.assertEqual(idempotency.prune(), 1)
+        self.assertEqual(list(IdempotencyRecord.objects.values_list('key', flat=True)), ['new'])
@@ -0,0 +1,190 @@
+import importlib
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage, get_storage_class
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core import images
+from core.models import Recipe, StoredFile
+from core.storage import LocalObjectStorage, content_addressed_name
+
+
+class ContentAddressedImageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.user = get_user_model().objects.create_user('test@gmail.com', 'testpass')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def _create_recipe(self, content=None):
+        recipe = Recipe.objects.create(user=self.user, title='Dish', time_minutes=1, price=1)
+        if content is not None:
+            recipe.image.save('image.jpg', ContentFile(content))
+        return recipe
+
+    def _references(self, name):
+        return StoredFile.objects.get(name=name).references
+
+    def test_same_content_stored_once(self):
+        """Test that equal images share one file."""
+        recipe_1 = self._create_recipe(b'same')
+        recipe_2 = self._create_recipe(b'same')
+
+        self.assertEqual(recipe_1.image.name, recipe_2.image.name)
+        directory = recipe_1.image.name.rsplit('/', 1)[0]
+        self.assertEqual(len(default_storage.listdir(directory)[1]), 1)
+        self.assertEqual(self._references(recipe_1.image.name), 2)
+
+    def test_racing_saves_of_same_content(self):
+        """Test that the save losing the race to store equal content keeps the stored file."""
+        storage = LocalObjectStorage(location=self.media_root.name)
+        name = content_addressed_name(ContentFile(b'same'), 'jpg')
+        storage.save(name, ContentFile(b'same'))
+
+        # Both saves found no file before either stored it.
+        with mock.patch.object(LocalObjectStorage, 'exists', side_effect=[False, True]):
+            saved = storage.save(name, ContentFile(b'same'))
+
+        self.assertEqual(saved, name)
+        with storage.open(name) as file:
+            self.assertEqual(file.read(), b'same')
+
+    def test_replacing_image_releases_old(self):
+        """Test that replacing an image drops the reference to the old one."""
+        recipe = self._create_recipe(b'old')
+        old_name = recipe.image.name
+
+        recipe.image.save('image.jpg', ContentFile(b'new'))
+
+        self.assertEqual(self._references(old_name), 0)
+        self.assertEqual(self._references(recipe.image.name), 1)
+
+    def test_deleting_recipe_releases_image(self):
+        """Test that deleting a recipe drops its image reference."""
+        recipe = self._create_recipe(b'image')
+        name = recipe.image.name
+
+        Recipe.objects.get(pk=recipe.pk).delete()
+
+        self.assertEqual(self._references(name), 0)
+
+    def test_collect_garbage(self):
+        """Test that only files unreferenced for the grace period are deleted."""
+        kept = self._create_recipe(b'kept').image.name
+        released = self._create_recipe(b'released')
+        name = released.image.name
+        released.delete()
+
+        self.assertEqual(images.collect_garbage(grace=timedelta(hours=1)), [])
+        deleted = images.collect_garbage(grace=timedelta(0))
+
+        self.assertEqual(deleted, [name])
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(name=name).exists())
+        self.assertTrue(default_storage.exists(kept))
+
+    def test_collect_garbage_keeps_drifted_references(self):
+        """Test that files still used by a recipe survive a wrong count."""
+        recipe = self._create_recipe(b'image')
+        StoredFile.objects.filter(name=recipe.image.name).update(references=0)
+
+        deleted = images.collect_garbage(grace=timedelta(0))
+
+        self.assertEqual(deleted, [])
+        self.assertEqual(self._references(recipe.image.name), 1)
+
+    def test_recount(self):
+        """Test rebuilding reference counts from recipes."""
+        recipe = self._create_recipe(b'image')
+        StoredFile.objects.all().delete()
+
+        self.assertEqual(images.recount(), 1)
+        self.assertEqual(self._references(recipe.image.name), 1)
+
+    def test_migration_backfills_references(self):
+        """Test that the migration counts references to images stored before counting."""
+        recipe = self._create_recipe(b'image')
+        self._create_recipe(b'image')
+        StoredFile.objects.all().delete()
+        migration = importlib.import_module('core.migrations.0018_backfill_stored_files')
+
+        migration.backfill_stored_files(apps, None)
+
+        self.assertEqual(self._references(recipe.image.name), 2)
+
+    def test_gc_images_sweeps_orphans(self):
+        """Test that files unknown to the database are swept."""
+        kept = self._create_recipe(b'kept').image.name
+        orphan = default_storage.save('uploads/recipe/orphan.jpg', ContentFile(b'orphan'))
+
+        call_command('gc_images', grace_hours=0, sweep=True, stdout=StringIO())
+
+        self.assertFalse(default_storage.exists(orphan))
+        self.assertTrue(default_storage.exists(kept))
+
+
+class StoredFileLockTests(TransactionTestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.user = get_user_model().objects.create_user('test@gmail.com', 'testpass')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def _collect_garbage_concurrently(self) -> list:
+        deleted = []
+
+        def collect():
+            try:
+                deleted.extend(images.collect_garbage(grace=timedelta(0)))
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=collect)
+        thread.start()
+        thread.join()
+        return deleted
+
+    def test_collect_garbage_spares_file_being_saved(self):
+        """Test that an unreferenced file saved again is not collected before it is referenced."""
+        with transaction.atomic():
+            released = Recipe.objects.create(user=self.user, title='A', time_minutes=1, price=1)
+            released.image.save('image.jpg', ContentFile(b'same'))
+        name = released.image.name
+        released.delete()
+        recipe = Recipe.objects.create(user=self.user, title='B', time_minutes=1, price=1)
+
+        storage_class = get_storage_class()
+        exists = storage_class.exists
+        deleted = []
+
+        def exists_then_collect(storage, name):
+            # Collect right after the save found the file, before it is referenced.
+            found = exists(storage, name)
+            deleted.extend(self._collect_garbage_concurrently())
+            return found
+
+        with mock.patch.object(storage_class, 'exists', exists_then_collect):
+            with transaction.atomic():
+                recipe.image.save('image.jpg', ContentFile(b'same'))
+
+        self.assertEqual(deleted, [])
+        self.assertEqual(recipe.image.name, name)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
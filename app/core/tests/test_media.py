@@ -0,0 +1,103 @@
+import hashlib
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+from rest_framework import status
+
+
+class ServeMediaTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.content = bytes(range(256)) * 4
+        self.digest = hashlib.sha256(self.content).hexdigest()
+        self.name = f'uploads/recipe/{self.digest[:2]}/{self.digest}.jpg'
+        self._write(self.name, self.content)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.media_root.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+
+    def _get(self, name, **headers):
+        return self.client.get(f'/media/{name}', **headers)
+
+    def test_serve_content_addressed(self):
+        """Test that content addressed files are immutable with the digest as ETag."""
+        res = self._get(self.name)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Content-Length'], str(len(self.content)))
+        self.assertEqual(res['ETag'], f'"{self.digest}"')
+        self.assertIn('immutable', res['Cache-Control'])
+
+    def test_serve_other_file_not_immutable(self):
+        """Test that files under other names can be revalidated."""
+        self._write('uploads/recipe/legacy.jpg', b'legacy')
+
+        res = self._get('uploads/recipe/legacy.jpg')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('immutable', res['Cache-Control'])
+
+    def test_not_modified(self):
+        """Test that a matching If-None-Match returns 304 without a body."""
+        res = self._get(self.name, HTTP_IF_NONE_MATCH=f'"{self.digest}"')
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_range(self):
+        """Test a single byte range request."""
+        res = self._get(self.name, HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), self.content[10:20])
+        self.assertEqual(res['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(res['Content-Length'], '10')
+
+    def test_suffix_range(self):
+        """Test requesting the last bytes of a file."""
+        res = self._get(self.name, HTTP_RANGE='bytes=-5')
+
+        self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(res.streaming_content), self.content[-5:])
+
+    def test_range_not_satisfiable(self):
+        """Test a range beyond the end of the file."""
+        res = self._get(self.name, HTTP_RANGE=f'bytes={len(self.content)}-')
+
+        self.assertEqual(res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(res['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_if_range_mismatch_sends_whole_file(self):
+        """Test that a stale If-Range validator gets the full file."""
+        res = self._get(self.name, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), self.content)
+
+    @override_settings(MEDIA_SERVE_MODE='x-accel-redirect', MEDIA_ACCEL_PREFIX='/internal/')
+    def test_x_accel_redirect(self):
+        """Test handing the transfer over to nginx."""
+        res = self._get(self.name)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['X-Accel-Redirect'], f'/internal/{self.name}')
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['ETag'], f'"{self.digest}"')
+
+    def test_path_traversal(self):
+        """Test that files outside MEDIA_ROOT are not served."""
+        res = self._get('../settings.py')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
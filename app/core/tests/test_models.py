@@ -1,6 +1,8 @@
-from unittest.mock import patch
+import hashlib
+import tempfile
 
-from django.test import TestCase
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from core import models
 
@@ -76,13 +78,15 @@ class ModelTest(TestCase):
 
         self.assertEqual(str(recipe), recipe.title)
 
-    @patch('uuid.uuid4')
-    def test_recipe_file_name_under_uuid(self, mock_uuid):
-        """Test that image is saved in the correct location."""
-        uuid = 'test-uuid'
-        mock_uuid.return_value = uuid
-        expected_path = f'uploads/recipe/{uuid}.jpg'
+    def test_recipe_file_name_content_addressed(self):
+        """Test that image is saved under the digest of its content."""
+        content = b'image content'
+        digest = hashlib.sha256(content).hexdigest()
+        recipe = models.Recipe(user=create_sample_user(), title='Dish', time_minutes=1, price=1)
+        expected_path = f'uploads/recipe/{digest[:2]}/{digest}.jpg'
 
-        file_path = models.recipe_image_file_path(None, 'myimage.jpg')
+        with tempfile.TemporaryDirectory() as media_root:
+            with override_settings(MEDIA_ROOT=media_root):
+                recipe.image.save('myimage.JPG', ContentFile(content))
 
-        self.assertEqual(file_path, expected_path)
+        self.assertEqual(recipe.image.name, expected_path)
@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Tag
+from core.query_audit import QueryAudit, QueryAuditTestMixin, normalize_sql
+
+
+class NormalizeSqlTests(TestCase):
+    def test_in_lists_collapse(self):
+        """Test that IN lists of any length produce the same shape."""
+        short = normalize_sql('SELECT * FROM "core_tag" WHERE "id" IN (%s, %s)')
+        long = normalize_sql('SELECT * FROM "core_tag" WHERE "id" IN (%s, %s, %s, %s)')
+
+        self.assertEqual(short, long)
+
+    def test_literals_replaced(self):
+        """Test that inlined literals do not create new shapes."""
+        self.assertEqual(
+            normalize_sql("SELECT 1 FROM t WHERE name = 'a'  LIMIT 21"),
+            'SELECT ? FROM t WHERE name = ? LIMIT ?',
+        )
+
+
+class QueryAuditTests(QueryAuditTestMixin, TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('test@gmail.com', 'password123')
+
+    def test_repeated_shapes_detected(self):
+        """Test that a query executed in a loop is reported as repeated."""
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(3)]
+        audit = QueryAudit(repeat_threshold=3)
+
+        with audit.capture():
+            for tag in tags:
+                Tag.objects.get(pk=tag.pk)
+
+        self.assertEqual(len(audit), 3)
+        self.assertEqual(list(audit.repeated_shapes().values()), [3])
+
+    def test_slow_queries_explained(self):
+        """Test that queries over the threshold are reported with their plan."""
+        audit = QueryAudit(slow_query_ms=0)
+
+        with audit.capture():
+            list(Tag.objects.filter(user=self.user))
+
+        report = audit.report()
+        self.assertEqual(report['count'], 1)
+        self.assertEqual(len(report['slow']), 1)
+        self.assertIn('core_tag', report['slow'][0]['plan'])
+
+    def test_query_budget_exceeded_fails(self):
+        """Test that exceeding the query budget fails the test."""
+        with self.assertRaises(AssertionError):
+            with self.assertQueryBudget(1):
+                Tag.objects.count()
+                Tag.objects.count()
+
+    def test_repeated_queries_fail(self):
+        """Test that N+1 patterns fail the test."""
+        with self.assertRaises(AssertionError):
+            with self.assertNoRepeatedQueries(threshold=2):
+                Tag.objects.filter(pk=1).exists()
+                Tag.objects.filter(pk=2).exists()
+
+
+@override_settings(QUERY_AUDIT={'ENABLED': True, 'SLOW_QUERY_MS': 10000})
+class QueryAuditMiddlewareTests(TestCase):
+    def test_query_count_header(self):
+        """Test that audited responses report the number of queries."""
+        user = get_user_model().objects.create_user('test@gmail.com', 'password123')
+        client = APIClient()
+        client.force_authenticate(user)
+
+        res = client.get(reverse('recipe:tag-list'))
+
+        self.assertEqual(res['X-Query-Count'], '1')
@@ -0,0 +1,79 @@
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage
+from django.test import TestCase
+
+from core.storage import ClientError, DirectUploadMixin, S3Storage, supports_direct_upload
+
+
+class FakeS3Client:
+    """In-memory stand-in for the parts of the boto3 S3 client used by S3Storage."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None):
+        self.objects[(bucket, key)] = (fileobj.read(), ExtraArgs['ContentType'])
+
+    def get_object(self, Bucket, Key):
+        return {'Body': ContentFile(self.objects[(Bucket, Key)][0])}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        return {'ContentLength': len(self.objects[(Bucket, Key)][0])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def generate_presigned_url(self, method, Params, ExpiresIn=3600):
+        return f'https://s3.local/{Params["Bucket"]}/{Params["Key"]}?op={method}&exp={ExpiresIn}'
+
+
+class S3StorageTests(TestCase):
+    def setUp(self):
+        self.client = FakeS3Client()
+        self.storage = S3Storage(client=self.client, bucket='media')
+
+    def test_save_and_open(self):
+        """Test round-tripping an object through the bucket."""
+        name = self.storage.save('uploads/recipe/a.jpg', ContentFile(b'image'))
+
+        self.assertEqual(name, 'uploads/recipe/a.jpg')
+        self.assertEqual(self.client.objects[('media', name)][1], 'image/jpeg')
+        self.assertTrue(self.storage.exists(name))
+        self.assertEqual(self.storage.size(name), 5)
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'image')
+
+    def test_delete(self):
+        """Test deleting an object."""
+        name = self.storage.save('a.jpg', ContentFile(b'image'))
+
+        self.storage.delete(name)
+
+        self.assertFalse(self.storage.exists(name))
+
+    def test_presign_upload(self):
+        """Test that direct uploads are presigned PUT requests."""
+        upload = self.storage.presign_upload('a.jpg', 'image/jpeg', 60)
+
+        self.assertTrue(supports_direct_upload(self.storage))
+        self.assertEqual(upload['method'], 'PUT')
+        self.assertEqual(upload['headers'], {'Content-Type': 'image/jpeg'})
+        self.assertIn('op=put_object', upload['url'])
+        self.assertIn('exp=60', upload['url'])
+
+    def test_public_url(self):
+        """Test object URLs on a public bucket domain."""
+        storage = S3Storage(client=self.client, bucket='media', public_url='https://cdn.local/')
+
+        self.assertEqual(storage.url('a.jpg'), 'https://cdn.local/a.jpg')
+
+    def test_direct_upload_storage_must_presign(self):
+        """Test that a direct upload storage without presigned uploads is not created."""
+
+        class UnsignedStorage(DirectUploadMixin, Storage):
+            pass
+
+        with self.assertRaises(TypeError):
+            UnsignedStorage()
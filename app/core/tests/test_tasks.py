@@ -0,0 +1,168 @@
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import tasks
+from core.models import Task
+
+calls = []
+
+
+@tasks.task
+def record_call(value):
+    calls.append(value)
+
+
+@tasks.task(max_attempts=2)
+def always_fail():
+    raise RuntimeError('Boom')
+
+
+@tasks.task
+def record_lock():
+    time.sleep(0.2)
+    calls.append(Task.objects.get(status=Task.RUNNING).locked_at)
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_enqueue_and_run(self):
+        """Test that a queued task runs with its arguments."""
+        task = tasks.enqueue(record_call, {'value': 3})
+
+        self.assertEqual(tasks.run_pending(), 1)
+
+        task.refresh_from_db()
+        self.assertEqual(calls, [3])
+        self.assertEqual(task.status, Task.DONE)
+        self.assertEqual(task.attempts, 1)
+
+    def test_idempotency_key(self):
+        """Test that a task with the same key is only queued once."""
+        first = tasks.enqueue(record_call, {'value': 1}, key='once')
+        second = tasks.enqueue(record_call, {'value': 2}, key='once')
+
+        tasks.run_pending()
+
+        self.assertIsNotNone(first)
+        self.assertIsNone(second)
+        self.assertEqual(calls, [1])
+
+    def test_failed_task_enqueued_again(self):
+        """Test that a task which failed is queued again with the same key."""
+        failed = tasks.enqueue(record_call, {'value': 1}, key='retry')
+        Task.objects.filter(id=failed.id).update(status=Task.FAILED, attempts=5, last_error='Boom')
+
+        task = tasks.enqueue(record_call, {'value': 2}, key='retry')
+        tasks.run_pending()
+
+        self.assertEqual(task.id, failed.id)
+        self.assertEqual((task.status, task.attempts, task.last_error), (Task.QUEUED, 0, ''))
+        self.assertEqual(calls, [2])
+        self.assertEqual(Task.objects.get(id=task.id).status, Task.DONE)
+
+    def test_delayed_task_not_claimed(self):
+        """Test that tasks are only claimed once they are due."""
+        tasks.enqueue(record_call, {'value': 1}, delay=60)
+
+        self.assertEqual(tasks.claim(), [])
+
+    def test_claimed_task_not_claimed_again(self):
+        """Test that a claimed task is locked for other workers."""
+        task = tasks.enqueue(record_call, {'value': 1})
+
+        claimed = tasks.claim(limit=5)
+
+        self.assertEqual([t.id for t in claimed], [task.id])
+        self.assertEqual(Task.objects.get(id=task.id).status, Task.RUNNING)
+        self.assertEqual(tasks.claim(), [])
+
+    @patch('core.tasks.random.uniform', return_value=0)
+    def test_failed_task_retried_with_backoff(self, uniform):
+        """Test that a failing task is retried later, then marked failed."""
+        task = tasks.enqueue(always_fail)
+
+        with self.assertLogs('core.tasks', 'WARNING'):
+            tasks.run(tasks.claim()[0])
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.QUEUED)
+        self.assertIn('Boom', task.last_error)
+        self.assertGreater(task.run_after, timezone.now() + timedelta(seconds=4))
+
+        Task.objects.filter(id=task.id).update(run_after=timezone.now())
+        with self.assertLogs('core.tasks', 'ERROR'):
+            tasks.run(tasks.claim()[0])
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(task.attempts, 2)
+
+    def test_backoff_grows_exponentially(self):
+        """Test that retry delays double up to the maximum."""
+        with patch('core.tasks.random.uniform', side_effect=lambda low, high: high):
+            delays = [tasks.backoff(attempts) for attempts in (1, 2, 3, 20)]
+
+        self.assertEqual(delays, [10, 20, 40, 3600])
+
+    def test_requeue_stale(self):
+        """Test that tasks of dead workers are queued again."""
+        task = tasks.enqueue(record_call, {'value': 1})
+        tasks.claim()
+        Task.objects.filter(id=task.id).update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(tasks.requeue_stale(), 1)
+        self.assertEqual(Task.objects.get(id=task.id).status, Task.QUEUED)
+
+    def test_requeued_attempts_counted(self):
+        """Test that attempts of dead workers count, the last one fails the task."""
+        task = tasks.enqueue(always_fail)
+        stale = timezone.now() - timedelta(hours=1)
+        tasks.claim()
+        Task.objects.filter(id=task.id).update(locked_at=stale)
+
+        self.assertEqual(tasks.requeue_stale(), 1)
+        tasks.claim()
+        Task.objects.filter(id=task.id).update(locked_at=stale)
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.assertEqual(tasks.requeue_stale(), 0)
+
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), (Task.FAILED, 2))
+        self.assertEqual(task.last_error, tasks.STALE_ERROR)
+
+
+class RunWorkerCommandTests(TransactionTestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_run_worker_burst(self):
+        """Test that the worker runs due tasks and exits in burst mode."""
+        for value in range(3):
+            tasks.enqueue(record_call, {'value': value})
+        out = StringIO()
+
+        call_command('run_worker', '--burst', '--concurrency', '2', stdout=out)
+
+        self.assertEqual(sorted(calls), [0, 1, 2])
+        self.assertIn('Ran 3 tasks', out.getvalue())
+
+    @override_settings(TASK_QUEUE={**settings.TASK_QUEUE, 'HEARTBEAT_SECONDS': 0.01})
+    def test_running_task_lock_refreshed(self):
+        """Test that the lock of a running task is refreshed, so it is not requeued."""
+        tasks.enqueue(record_lock)
+        claimed = tasks.claim()[0]
+        locked_at = claimed.locked_at
+
+        tasks.run(claimed)
+
+        self.assertGreater(calls[0], locked_at)
+        self.assertEqual(Task.objects.get(id=claimed.id).status, Task.DONE)
@@ -0,0 +1,149 @@
+import hashlib
+import mimetypes
+import os
+import tempfile
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    HttpResponseNotModified,
+    JsonResponse,
+)
+from django.utils._os import safe_join
+from django.utils.http import parse_etags
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods, require_safe
+
+from core.health import get_readiness
+from core.media import FileRange, cache_control, media_etag, parse_range
+from core.storage import LocalObjectStorage, is_content_addressed
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+@never_cache
+@require_GET
+def healthz(request):
+    """Liveness probe, answers as long as the process serves requests."""
+    return JsonResponse({'status': 'ok'})
+
+
+@never_cache
+@require_GET
+def readyz(request):
+    """Readiness probe, checks that the database and the cache are reachable."""
+    checks = get_readiness()
+    ready = not any(checks.values())
+    return JsonResponse(
+        {
+            'status': 'ok' if ready else 'unavailable',
+            'checks': {name: error or 'ok' for name, error in checks.items()},
+        },
+        status=200 if ready else 503,
+    )
+
+
+@csrf_exempt
+@require_http_methods(['PUT'])
+def storage_upload(request):
+    """Receive a presigned upload for LocalObjectStorage, the way S3 would."""
+    try:
+        upload = LocalObjectStorage.load_upload_token(request.GET.get('token', ''))
+    except signing.BadSignature:
+        return HttpResponseForbidden('Invalid or expired upload token.')
+    if request.content_type != upload['content_type']:
+        return HttpResponseBadRequest('Content-Type does not match the signed upload.')
+
+    max_size = settings.OBJECT_STORAGE['MAX_UPLOAD_SIZE']
+    sha = hashlib.sha256()
+    with tempfile.SpooledTemporaryFile(max_size=UPLOAD_CHUNK_SIZE * 16) as buffer:
+        size = 0
+        for chunk in iter(lambda: request.read(UPLOAD_CHUNK_SIZE), b''):
+            size += len(chunk)
+            if size > max_size:
+                return HttpResponse('Upload too large.', status=413)
+            sha.update(chunk)
+            buffer.write(chunk)
+        if upload['sha256'] and sha.hexdigest() != upload['sha256']:
+            return HttpResponseBadRequest('Content does not match the signed SHA-256 digest.')
+        buffer.seek(0)
+        if not is_content_addressed(upload['name']) and default_storage.exists(upload['name']):
+            default_storage.delete(upload['name'])
+        default_storage.save(upload['name'], File(buffer))
+    return HttpResponse(status=200)
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file from MEDIA_ROOT with validators, cache headers and Range support.
+
+    Depending on MEDIA_SERVE_MODE the bytes are sent by the web server
+    (`x-accel-redirect` for nginx, `x-sendfile` for Apache/lighttpd) or by a
+    FileResponse, which WSGI servers send with `os.sendfile`.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat = os.stat(full_path)
+    except (OSError, SuspiciousFileOperation):
+        raise Http404('File not found.')
+    if not os.path.isfile(full_path):
+        raise Http404('File not found.')
+
+    etag = media_etag(path, stat)
+    headers = {
+        'ETag': etag,
+        'Cache-Control': cache_control(path),
+        'Accept-Ranges': 'bytes',
+    }
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    mode = settings.MEDIA_SERVE_MODE
+    if mode in ('x-accel-redirect', 'x-sendfile'):
+        response = HttpResponse(content_type=content_type)
+        if mode == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIX + path
+        else:
+            response['X-Sendfile'] = full_path
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    byte_range = None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+        response['Content-Length'] = stat.st_size
+    else:
+        first, last = byte_range
+        length = last - first + 1
+        response = FileResponse(FileRange(file, first, length), content_type=content_type)
+        response.status_code = 206
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+    for header, value in headers.items():
+        response[header] = value
+    return response
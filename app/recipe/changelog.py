@@ -0,0 +1,111 @@
+from typing import Dict, Iterable, NamedTuple, Set, Tuple
+
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import ChangeLogEntry, Ingredient, Recipe, Tag
+from recipe import changes, events
+
+MODEL_NAMES = {
+    Recipe: ChangeLogEntry.RECIPE,
+    Tag: ChangeLogEntry.TAG,
+    Ingredient: ChangeLogEntry.INGREDIENT,
+}
+
+
+class Changes(NamedTuple):
+    seq: int
+    has_more: bool
+    saved: Dict[str, Set[int]]
+    deleted: Dict[str, Set[int]]
+
+
+def record(user_id: int, model: str, object_ids: Iterable[int], action: str):
+    """Append entries for changed objects of a user.
+
+    The entries are written when the batch of changes ends, one per object
+    with its last action.
+    """
+    object_ids = list(object_ids)
+    if not object_ids:
+        return
+    with changes.batch():
+        entries = changes.pending('changelog', user_id)
+        for object_id in object_ids:
+            # Moved to the end, entries are in the order of the last changes.
+            entries.pop((model, object_id), None)
+            entries[model, object_id] = action
+
+
+@changes.applier('changelog', dict)
+def write_entries(user_id: int, entries: Dict[Tuple[str, int], str]):
+    """Write the entries of a batch.
+
+    Sequence values are taken when rows are inserted, not when they commit.
+    The user's lock, held until the transaction ends, makes a user's
+    entries commit in sequence order, so clients never skip one.
+    """
+    using = router.db_for_write(ChangeLogEntry)
+    ChangeLogEntry.objects.using(using).bulk_create(
+        ChangeLogEntry(user_id=user_id, model=model, object_id=object_id, action=action)
+        for (model, object_id), action in entries.items()
+    )
+    events.notify(user_id, using)
+
+
+def changes_since(user, since: int, limit: int) -> Changes:
+    """Return the objects saved and deleted after `since`, at most `limit` entries."""
+    entries = list(
+        ChangeLogEntry.objects.filter(user=user, id__gt=since)
+        .order_by('id')
+        .values_list('id', 'model', 'object_id', 'action')[: limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for _, model, object_id, action in entries:
+        latest[model, object_id] = action
+    saved = {name: set() for name in MODEL_NAMES.values()}
+    deleted = {name: set() for name in MODEL_NAMES.values()}
+    for (model, object_id), action in latest.items():
+        target = deleted if action == ChangeLogEntry.DELETED else saved
+        target[model].add(object_id)
+    return Changes(entries[-1][0] if entries else since, has_more, saved, deleted)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def object_saved(sender, instance, **kwargs):
+    record(instance.user_id, MODEL_NAMES[sender], [instance.pk], ChangeLogEntry.SAVED)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def object_deleted(sender, instance, **kwargs):
+    record(instance.user_id, MODEL_NAMES[sender], [instance.pk], ChangeLogEntry.DELETED)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def links_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            record(instance.user_id, ChangeLogEntry.RECIPE, [instance.pk], ChangeLogEntry.SAVED)
+        return
+    if action in ('post_add', 'post_remove'):
+        recipe_ids = pk_set
+    elif action == 'pre_clear':
+        recipe_ids = instance.recipe_set.values_list('id', flat=True)
+    else:
+        return
+    record(instance.user_id, ChangeLogEntry.RECIPE, recipe_ids, ChangeLogEntry.SAVED)
+
+
+@receiver(post_delete, sender=get_user_model())
+def user_deleted(sender, instance, **kwargs):
+    ChangeLogEntry.objects.filter(user_id=instance.pk).delete()
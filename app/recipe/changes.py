@@ -0,0 +1,111 @@
+import functools
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Tuple
+
+from django.db import connections, router, transaction
+
+from core.deletion import is_deleting
+from core.models import Recipe
+
+# First key of the advisory lock serializing the writes of a user.
+USER_LOCK = 0x43484C47
+
+# What is maintained from a user's recipes, in the order it is locked and written.
+APPLY_ORDER = ('changelog', 'matching', 'stats')
+
+_appliers: Dict[str, Tuple[Callable[[], object], Callable[[int, object], None]]] = {}
+_local = threading.local()
+
+
+def applier(name: str, factory: Callable[[], object]):
+    """Register the function applying the changes `name` collected for a user.
+
+    `factory` returns the empty collection that receivers add changes to
+    with `pending`.
+    """
+
+    def register(apply):
+        _appliers[name] = (factory, apply)
+        return apply
+
+    return register
+
+
+def pending(name: str, user_id: int):
+    """Return the changes `name` of a user collected by the current batch.
+
+    Changes of a user being deleted are not collected.
+    """
+    if is_deleting(user_id):
+        return _appliers[name][0]()
+    users = _local.users
+    collected = users.setdefault(user_id, {})
+    if name not in collected:
+        collected[name] = _appliers[name][0]()
+    return collected[name]
+
+
+def _noop():
+    pass
+
+
+def on_commit_once(key: Hashable, using: str, func: Callable[[], None] = _noop) -> bool:
+    """Run `func` when the transaction commits, unless a hook with `key` already will.
+
+    Returns False when the hook was registered before, so work done once per
+    transaction is skipped. Hooks registered in a savepoint rolled back are
+    forgotten, like the work done in it.
+    """
+    connection = connections[using]
+    if connection.in_atomic_block:
+        for _, hook in connection.run_on_commit:
+            if getattr(hook, 'once_key', None) == key:
+                return False
+    hook = functools.partial(func)
+    hook.once_key = key
+    transaction.on_commit(hook, using=using)
+    return True
+
+
+def lock_user(user_id: int, using: str):
+    """Hold the advisory lock of a user until the transaction ends."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql' and on_commit_once(('lock', user_id), using):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [USER_LOCK, user_id])
+
+
+def _apply(users: Dict[int, dict], using: str):
+    for user_id in sorted(users):
+        lock_user(user_id, using)
+        for name in APPLY_ORDER:
+            if name in users[user_id]:
+                _appliers[name][1](user_id, users[user_id][name])
+
+
+@contextmanager
+def batch():
+    """Collect the changes of the block and apply them when it ends, in its transaction.
+
+    Each user's changes are applied once, in APPLY_ORDER, after taking the
+    user's advisory lock. As every write of a user takes that lock first,
+    the rows locked after it are always locked in the same order, and
+    concurrent writes of a user cannot deadlock. Batches nested in another
+    are applied with it. Like `atomic(savepoint=False)`, an error in the
+    block rolls back the enclosing transaction.
+    """
+    if getattr(_local, 'users', None) is not None:
+        yield
+        return
+    using = router.db_for_write(Recipe)
+    with transaction.atomic(using=using, savepoint=False):
+        _local.users = {}
+        try:
+            yield
+            # Applying may change more, e.g. when an index is rebuilt.
+            while _local.users:
+                users, _local.users = _local.users, {}
+                _apply(users, using)
+        finally:
+            _local.users = None
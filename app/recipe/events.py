@@ -0,0 +1,326 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from rest_framework.exceptions import AuthenticationFailed
+
+from core.authentication import ExpiringTokenAuthentication, authenticate_access_token
+from core.models import ChangeLogEntry
+from recipe import changes
+
+logger = logging.getLogger(__name__)
+
+EVENTS_PATH = '/api/recipe/events/'
+
+
+class Broadcaster:
+    """Wakes the event streams of a user, within one process."""
+
+    def __init__(self):
+        self.loop = None
+        self.subscribers = defaultdict(set)
+
+    async def subscribe(self, user_id: int) -> asyncio.Event:
+        self.loop = asyncio.get_event_loop()
+        wakeup = asyncio.Event()
+        self.subscribers[user_id].add(wakeup)
+        return wakeup
+
+    def unsubscribe(self, user_id: int, wakeup: asyncio.Event):
+        subscribers = self.subscribers.get(user_id)
+        if subscribers is not None:
+            subscribers.discard(wakeup)
+            if not subscribers:
+                del self.subscribers[user_id]
+
+    def wake(self, user_id: int):
+        for wakeup in self.subscribers.get(user_id, ()):
+            wakeup.set()
+
+    def wake_all(self):
+        for user_id in list(self.subscribers):
+            self.wake(user_id)
+
+    def publish(self, user_id: int):
+        """Wake the streams of a user, callable from any thread."""
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.wake, user_id)
+
+
+class PostgresBroadcaster(Broadcaster):
+    """Broadcaster fed by Postgres NOTIFY, so changes made by any process are seen."""
+
+    def __init__(self, channel: str, using: str = 'default'):
+        super().__init__()
+        self.channel = channel
+        self.using = using
+        self.connection = None
+        # The connection being opened, or the scheduled retry after it was lost.
+        self.pending = None
+
+    async def subscribe(self, user_id):
+        wakeup = await super().subscribe(user_id)
+        if self.connection is None and self.pending is None:
+            self.listen()
+        return wakeup
+
+    def listen(self):
+        """Connect in a thread, the streams are served meanwhile."""
+        params = connections[self.using].get_connection_params()
+        self.pending = self.loop.run_in_executor(None, self.connect, params)
+        self.pending.add_done_callback(self.on_connected)
+
+    def connect(self, params: dict):
+        import psycopg2
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+        connection = psycopg2.connect(**params)
+        try:
+            connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+        except psycopg2.Error:
+            connection.close()
+            raise
+        return connection
+
+    def on_connected(self, future: asyncio.Future):
+        import psycopg2
+
+        self.pending = None
+        try:
+            self.connection = future.result()
+        except psycopg2.Error:
+            logger.exception('Could not listen for change notifications.')
+            self.reconnect()
+            return
+        self.loop.add_reader(self.connection.fileno(), self.on_readable)
+        # Changes committed while connecting were not notified.
+        self.wake_all()
+
+    def on_readable(self):
+        import psycopg2
+
+        try:
+            self.connection.poll()
+        except psycopg2.Error:
+            logger.exception('Lost the change notification connection.')
+            self.loop.remove_reader(self.connection.fileno())
+            self.reconnect()
+            return
+        while self.connection.notifies:
+            notify = self.connection.notifies.pop(0)
+            self.wake(int(notify.payload))
+
+    def reconnect(self, delay: float = 1):
+        if self.connection is not None:
+            self.connection.close()
+        self.connection = None
+        # Notifications may have been missed, the streams check their logs.
+        self.wake_all()
+        self.pending = self.loop.call_later(delay, self.listen)
+
+
+_broadcaster = None
+
+
+def get_broadcaster() -> Broadcaster:
+    global _broadcaster
+    if _broadcaster is None:
+        options = settings.EVENT_STREAM
+        if options['BROADCASTER'] == 'postgres':
+            _broadcaster = PostgresBroadcaster(options['CHANNEL'])
+        else:
+            _broadcaster = Broadcaster()
+    return _broadcaster
+
+
+def notify(user_id: int, using: str):
+    """Announce new change log entries of a user once the transaction commits.
+
+    Announced once per transaction, however many times entries are written.
+    """
+    options = settings.EVENT_STREAM
+    connection = connections[using]
+    if options['BROADCASTER'] == 'postgres' and connection.vendor == 'postgresql':
+        # Delivered on commit, the hook only marks the notification as sent.
+        if changes.on_commit_once(('notify', user_id), using):
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_notify(%s, %s)', [options['CHANNEL'], str(user_id)])
+    else:
+        changes.on_commit_once(
+            ('notify', user_id), using, lambda: get_broadcaster().publish(user_id)
+        )
+
+
+def format_event(entry: ChangeLogEntry) -> bytes:
+    data = json.dumps({'model': entry.model, 'id': entry.object_id, 'action': entry.action})
+    return f'id: {entry.id}\nevent: change\ndata: {data}\n\n'.encode()
+
+
+@sync_to_async
+def authenticate(key: str):
+    """Return the user of a signed access token or a database token, None when invalid."""
+    try:
+        user = authenticate_access_token(key)
+        if user is None:
+            user, _ = ExpiringTokenAuthentication().authenticate_credentials(key)
+    except AuthenticationFailed:
+        return None
+    finally:
+        close_old_connections()
+    return user
+
+
+@sync_to_async
+def latest_seq(user_id: int) -> int:
+    try:
+        entry = ChangeLogEntry.objects.filter(user_id=user_id).order_by('-id').first()
+    finally:
+        close_old_connections()
+    return entry.id if entry else 0
+
+
+@sync_to_async
+def read_entries(user_id: int, since: int, limit: int) -> List[ChangeLogEntry]:
+    try:
+        entries = ChangeLogEntry.objects.filter(user_id=user_id, id__gt=since).order_by('id')
+        return list(entries[:limit])
+    finally:
+        close_old_connections()
+
+
+def _credentials(scope) -> dict:
+    """Return the token and last event id of a request, EventSource cannot set headers."""
+    headers = {name.decode('latin1'): value.decode('latin1') for name, value in scope['headers']}
+    query = parse_qs(scope.get('query_string', b'').decode('latin1'))
+    token = query.get('token', [''])[0]
+    authorization = headers.get('authorization', '').split()
+    if len(authorization) == 2 and authorization[0].lower() in ('token', 'bearer'):
+        token = authorization[1]
+    return {
+        'token': token,
+        'last_event_id': headers.get('last-event-id') or query.get('last_event_id', [''])[0],
+    }
+
+
+def _parse_seq(value: str) -> Optional[int]:
+    try:
+        seq = int(value)
+    except ValueError:
+        return None
+    return seq if seq >= 0 else None
+
+
+async def _send_error(send, status: int, detail: str):
+    await send(
+        {
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json')],
+        }
+    )
+    await send({'type': 'http.response.body', 'body': json.dumps({'detail': detail}).encode()})
+
+
+async def _wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_events(scope, receive, send):
+    """ASGI application streaming the change events of the authenticated user.
+
+    Events are the user's change log entries, the event id is the entry
+    sequence. A broadcaster only wakes the streams of a user whose log grew,
+    the streams then read the new entries themselves. A wakeup is a flag, not
+    a message, so a stream buffers no more than one page of entries however
+    slow the client is, and resuming from `Last-Event-ID` is reading the log
+    from that sequence. The token is checked again with every heartbeat, the
+    stream ends once it expired or was revoked.
+    """
+    if scope['method'] != 'GET':
+        await _send_error(send, 405, 'Method not allowed.')
+        return
+    credentials = _credentials(scope)
+    user = await authenticate(credentials['token']) if credentials['token'] else None
+    if user is None:
+        await _send_error(send, 401, 'Authentication credentials were not provided or invalid.')
+        return
+    since = _parse_seq(credentials['last_event_id'])
+    if since is None:
+        since = await latest_seq(user.id)
+
+    options = settings.EVENT_STREAM
+    broadcaster = get_broadcaster()
+    wakeup = await broadcaster.subscribe(user.id)
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        await send(
+            {
+                'type': 'http.response.start',
+                'status': 200,
+                'headers': [
+                    (b'content-type', b'text/event-stream'),
+                    (b'cache-control', b'no-cache'),
+                    (b'x-accel-buffering', b'no'),
+                ],
+            }
+        )
+        await send(
+            {
+                'type': 'http.response.body',
+                'body': f'retry: {options["RETRY_MS"]}\n\n'.encode(),
+                'more_body': True,
+            }
+        )
+        while not disconnected.done():
+            # Cleared before reading, so a change committed meanwhile is not missed.
+            wakeup.clear()
+            entries = await read_entries(user.id, since, options['PAGE_SIZE'])
+            if entries:
+                await send(
+                    {
+                        'type': 'http.response.body',
+                        'body': b''.join(format_event(entry) for entry in entries),
+                        'more_body': True,
+                    }
+                )
+                since = entries[-1].id
+                if len(entries) == options['PAGE_SIZE']:
+                    continue
+
+            woken = asyncio.ensure_future(wakeup.wait())
+            done, _ = await asyncio.wait(
+                {woken, disconnected},
+                timeout=options['HEARTBEAT_SECONDS'],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            woken.cancel()
+            if not done:
+                # The stream ends once its token expired or was revoked.
+                if await authenticate(credentials['token']) != user:
+                    await send({'type': 'http.response.body', 'body': b''})
+                    return
+                await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+    finally:
+        broadcaster.unsubscribe(user.id, wakeup)
+        disconnected.cancel()
+
+
+class EventStreamRouter:
+    """Serve the event stream next to an ASGI application handling everything else."""
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+            return await stream_events(scope, receive, send)
+        return await self.application(scope, receive, send)
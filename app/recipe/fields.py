@@ -0,0 +1,50 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Many related field resolving all primary keys with a single `pk__in` query."""
+
+    default_error_messages = {
+        'does_not_exist': _('Invalid pks {pk_values} - objects do not exist.'),
+        'incorrect_type': _('Incorrect types {values}. Expected pk values.'),
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+
+        pk_field = self.child_relation.pk_field
+        pks, invalid = [], []
+        for item in data:
+            try:
+                pks.append(pk_field.to_internal_value(item) if pk_field else int(item))
+            except (TypeError, ValueError):
+                invalid.append(item)
+        if invalid:
+            self.fail('incorrect_type', values=invalid)
+
+        pks = list(dict.fromkeys(pks))
+        objects = self.child_relation.get_queryset().in_bulk(pks)
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            self.fail('does_not_exist', pk_values=missing)
+        return [objects[pk] for pk in pks]
+
+
+class UserPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Primary key relation limited to objects owned by the requesting user."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.context['request'].user)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
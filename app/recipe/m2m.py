@@ -0,0 +1,137 @@
+from typing import Dict, Iterable, Set
+
+from django.db import router, transaction
+from django.db.models.signals import m2m_changed, pre_delete
+from django.dispatch import receiver
+
+from core.deletion import is_deleting
+from core.models import Ingredient, Recipe, Tag
+from recipe import changes
+
+RELATION_NAMES = {Tag: 'tags', Ingredient: 'ingredients'}
+
+
+def _send(instance, field, action: str, pk_set: set, using: str, reverse: bool = False):
+    m2m_changed.send(
+        sender=field.remote_field.through,
+        instance=instance,
+        action=action,
+        reverse=reverse,
+        model=field.model if reverse else field.related_model,
+        pk_set=pk_set,
+        using=using,
+    )
+
+
+def _send_removed(instance, field, pk_set: set, using: str, reverse: bool = False):
+    if pk_set:
+        _send(instance, field, 'pre_remove', pk_set, using, reverse)
+        _send(instance, field, 'post_remove', pk_set, using, reverse)
+
+
+def set_related(instance, field_name: str, objects: Iterable, created: bool = False):
+    """Replace the objects of a forward many-to-many field by applying the difference.
+
+    Unlike `manager.set()`, the added links are written with one `bulk_create`
+    and the removed ones with one delete. The current links are read with one
+    query, skipped for a freshly `created` instance. `m2m_changed` is sent
+    just like the related manager does, so receivers see the same changes.
+    """
+    field = instance._meta.get_field(field_name)
+    through = field.remote_field.through
+    source = field.m2m_field_name() + '_id'
+    target = field.m2m_reverse_field_name() + '_id'
+    using = router.db_for_write(through, instance=instance)
+
+    new_ids = {obj.pk for obj in objects}
+    with transaction.atomic(using=using, savepoint=False):
+        if created:
+            current_ids = set()
+        else:
+            current_ids = set(
+                through.objects.using(using)
+                .filter(**{source: instance.pk})
+                .values_list(target, flat=True)
+            )
+        added, removed = new_ids - current_ids, current_ids - new_ids
+        if removed:
+            _send(instance, field, 'pre_remove', removed, using)
+            through.objects.using(using).filter(
+                **{source: instance.pk, f'{target}__in': removed}
+            ).delete()
+            _send(instance, field, 'post_remove', removed, using)
+        if added:
+            _send(instance, field, 'pre_add', added, using)
+            through.objects.using(using).bulk_create(
+                [through(**{source: instance.pk, target: pk}) for pk in added]
+            )
+            _send(instance, field, 'post_add', added, using)
+
+    prefetched = getattr(instance, '_prefetched_objects_cache', None)
+    if prefetched:
+        prefetched.pop(field.name, None)
+
+
+def add_related(field_name: str, related_ids: Dict[object, Set[int]]):
+    """Add links of a forward many-to-many field to many instances of one model.
+
+    The links of all instances are written with one `bulk_create`, and
+    `m2m_changed` is sent for each instance as `manager.add()` would.
+    """
+    related_ids = {instance: ids for instance, ids in related_ids.items() if ids}
+    if not related_ids:
+        return
+    instance = next(iter(related_ids))
+    field = instance._meta.get_field(field_name)
+    through = field.remote_field.through
+    source = field.m2m_field_name() + '_id'
+    target = field.m2m_reverse_field_name() + '_id'
+    using = router.db_for_write(through, instance=instance)
+
+    with transaction.atomic(using=using, savepoint=False):
+        for instance, ids in related_ids.items():
+            _send(instance, field, 'pre_add', ids, using)
+        through.objects.using(using).bulk_create(
+            [
+                through(**{source: instance.pk, target: pk})
+                for instance, ids in related_ids.items()
+                for pk in ids
+            ]
+        )
+        for instance, ids in related_ids.items():
+            _send(instance, field, 'post_add', ids, using)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, using, **kwargs):
+    """Send `m2m_changed` for the links of a deleted recipe, as if they were removed.
+
+    The links are deleted with the recipe without the signal, so receivers
+    maintaining data from links handle deletes like any other removal.
+    """
+    if is_deleting(instance.user_id):
+        return
+    with changes.batch():
+        for field in sender._meta.many_to_many:
+            through = field.remote_field.through
+            source = field.m2m_field_name() + '_id'
+            target = field.m2m_reverse_field_name() + '_id'
+            related_ids = through.objects.using(using).filter(**{source: instance.pk})
+            _send_removed(instance, field, set(related_ids.values_list(target, flat=True)), using)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def related_deleting(sender, instance, using, **kwargs):
+    """Send `m2m_changed` for the links of a deleted tag or ingredient, like `recipe_deleting`."""
+    if is_deleting(instance.user_id):
+        return
+    field = Recipe._meta.get_field(RELATION_NAMES[sender])
+    through = field.remote_field.through
+    source = field.m2m_reverse_field_name() + '_id'
+    target = field.m2m_field_name() + '_id'
+    recipe_ids = through.objects.using(using).filter(**{source: instance.pk})
+    with changes.batch():
+        _send_removed(
+            instance, field, set(recipe_ids.values_list(target, flat=True)), using, reverse=True
+        )
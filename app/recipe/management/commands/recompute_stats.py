@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+
+from core.models import UserRecipeStats
+from recipe import changes
+from recipe.stats import recompute
+
+
+class Command(BaseCommand):
+    """Django command rebuilding the recipe statistics of users from scratch."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', help='Only this user id.')
+
+    def handle(self, *args, **options):
+        user_ids = get_user_model().objects.order_by('id').values_list('id', flat=True)
+        if options['user']:
+            user_ids = user_ids.filter(id__in=options['user'])
+        using = router.db_for_write(UserRecipeStats)
+        count = 0
+        for user_id in user_ids.iterator():
+            with transaction.atomic():
+                # Writes of the user wait, their changes are not applied to the old totals.
+                changes.lock_user(user_id, using)
+                recompute(user_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Recomputed statistics of {count} users.'))
@@ -0,0 +1,365 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models.signals import m2m_changed, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.deletion import is_deleting
+from core.models import Ingredient, IngredientBitmap, IngredientIndex, Recipe
+from recipe import changes
+
+COVERAGE = 'coverage'
+JACCARD = 'jaccard'
+METRICS = (COVERAGE, JACCARD)
+
+# Positions of the set bits of every byte value.
+BYTE_BITS = tuple(tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256))
+
+
+def _to_int(data) -> int:
+    return int.from_bytes(bytes(data), 'little')
+
+
+def _to_bytes(bits: int) -> bytes:
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+def bit_positions(bits: int) -> Iterator[int]:
+    """Yield the positions of the set bits, fast for large sparse integers."""
+    for offset, value in enumerate(_to_bytes(bits)):
+        if value:
+            base = offset * 8
+            for bit in BYTE_BITS[value]:
+                yield base + bit
+
+
+def popcount(bits: int) -> int:
+    """Return the number of set bits."""
+    return bits.bit_count() if hasattr(bits, 'bit_count') else bin(bits).count('1')
+
+
+def _add(planes: List[int], bits: int):
+    """Add one to the bit-sliced counters set in `bits`.
+
+    `planes[k]` holds bit k of every slot's counter, so counters of all
+    slots are added to with a few operations on large integers.
+    """
+    carry = bits
+    for position, plane in enumerate(planes):
+        if not carry:
+            return
+        planes[position], carry = plane ^ carry, plane & carry
+    if carry:
+        planes.append(carry)
+
+
+def _subtract(planes: List[int], bits: int):
+    """Subtract one from the bit-sliced counters set in `bits`, which are not zero."""
+    borrow = bits
+    for position, plane in enumerate(planes):
+        if not borrow:
+            break
+        planes[position], borrow = plane ^ borrow, ~plane & borrow
+    while planes and not planes[-1]:
+        planes.pop()
+
+
+def _group(planes: List[int], bits: int) -> List[Tuple[int, int]]:
+    """Split the slots set in `bits` by their bit-sliced counter, as (value, slots) pairs."""
+    groups = [(0, bits)] if bits else []
+    for position in range(len(planes) - 1, -1, -1):
+        plane, split = planes[position], []
+        for value, slots in groups:
+            ones = slots & plane
+            if ones:
+                split.append((value | 1 << position, ones))
+            if ones != slots:
+                split.append((value, slots ^ ones))
+        groups = split
+    return groups
+
+
+def rebuild(user_id: int, exclude: Iterable[int] = ()):
+    """Assign slots to all recipes of a user and build the ingredient bitmaps from scratch.
+
+    `exclude` are the ids of recipes left out, because they are being deleted.
+    """
+    index, _ = IngredientIndex.objects.select_for_update().get_or_create(user_id=user_id)
+    recipes = Recipe.objects.filter(user_id=user_id).order_by('id').only('id', 'slot')
+    exclude = list(exclude)
+    if exclude:
+        recipes = recipes.exclude(id__in=exclude)
+    recipes = list(recipes)
+    slots = {}
+    for slot, recipe in enumerate(recipes):
+        recipe.slot = slots[recipe.id] = slot
+    Recipe.objects.bulk_update(recipes, ['slot'], batch_size=1000)
+
+    bitmaps = {}
+    links = Recipe.ingredients.through.objects.filter(recipe__user_id=user_id).values_list(
+        'ingredient_id', 'recipe_id'
+    )
+    for ingredient_id, recipe_id in links.iterator():
+        if recipe_id in slots:
+            bitmaps[ingredient_id] = bitmaps.get(ingredient_id, 0) | 1 << slots[recipe_id]
+    index.version += 1
+    IngredientBitmap.objects.filter(user_id=user_id).delete()
+    IngredientBitmap.objects.bulk_create(
+        [
+            IngredientBitmap(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                bits=_to_bytes(bits),
+                version=index.version,
+            )
+            for ingredient_id, bits in bitmaps.items()
+        ],
+        batch_size=1000,
+    )
+    index.next_slot, index.free_slots = len(recipes), []
+    index.save()
+
+
+class IndexChanges:
+    """Changes to a user's index collected by a batch."""
+
+    def __init__(self):
+        # Recipes to assign a slot to.
+        self.created: List[Recipe] = []
+        # Whether a recipe uses an ingredient, by recipe and ingredient id.
+        self.links: Dict[Tuple[int, int], bool] = {}
+        # Slots of deleted recipes, None when unknown.
+        self.deleted: Dict[int, Optional[int]] = {}
+        self.create = False
+
+
+def _pending(user_id: int, create: bool = True) -> IndexChanges:
+    """Return the changes to the user's index of the current batch.
+
+    Without an index yet, it is built from scratch when the batch ends
+    (`create`), which includes the changes.
+    """
+    pending = changes.pending('matching', user_id)
+    pending.create = pending.create or create
+    return pending
+
+
+@changes.applier('matching', IndexChanges)
+def apply_changes(user_id: int, pending: IndexChanges):
+    """Apply the changes of a batch, holding a lock on the index.
+
+    The index is rebuilt when it turns out to be inconsistent, e.g. after
+    recipes were bulk created without a slot.
+    """
+    index = IngredientIndex.objects.select_for_update().filter(user_id=user_id).first()
+    if index is None:
+        if pending.create:
+            rebuild(user_id, exclude=pending.deleted)
+        return
+    created_ids = {recipe.id for recipe in pending.created}
+    # Recipes created and deleted by the batch never take a slot.
+    skipped = created_ids & pending.deleted.keys()
+    deleted = {pk: slot for pk, slot in pending.deleted.items() if pk not in skipped}
+    slots = dict(deleted)
+    unknown = {pk for pk, _ in pending.links} - created_ids - slots.keys()
+    if unknown:
+        slots.update(Recipe.objects.filter(id__in=unknown).values_list('id', 'slot'))
+    if None in slots.values():
+        rebuild(user_id, exclude=pending.deleted)
+        return
+
+    created = [recipe for recipe in pending.created if recipe.id not in skipped]
+    for recipe in created:
+        if index.free_slots:
+            recipe.slot = index.free_slots.pop()
+        else:
+            recipe.slot, index.next_slot = index.next_slot, index.next_slot + 1
+        slots[recipe.id] = recipe.slot
+    if created:
+        Recipe.objects.bulk_update(created, ['slot'], batch_size=1000)
+
+    values = {}
+    for (recipe_id, ingredient_id), value in pending.links.items():
+        # Links of recipes deleted since, or without signals, are gone.
+        if slots.get(recipe_id) is not None:
+            values.setdefault(ingredient_id, {})[slots[recipe_id]] = value
+    index.version += 1
+    _set_bits(user_id, values, index.version)
+    index.free_slots.extend(deleted.values())
+    index.save()
+
+
+def _set_bits(user_id: int, values: Dict[int, Dict[int, bool]], version: int):
+    """Set or clear the slots of ingredients, `values` are the slot values by ingredient.
+
+    The bitmaps written are marked with the index `version`.
+    """
+    bitmaps = {
+        bitmap.ingredient_id: bitmap
+        for bitmap in IngredientBitmap.objects.filter(ingredient_id__in=values)
+    }
+    created, updated = [], []
+    for ingredient_id, slot_values in values.items():
+        bitmap = bitmaps.get(ingredient_id)
+        if bitmap is None and not any(slot_values.values()):
+            continue
+        if bitmap is None:
+            bitmap = IngredientBitmap(user_id=user_id, ingredient_id=ingredient_id)
+            created.append(bitmap)
+        else:
+            updated.append(bitmap)
+        bits = _to_int(bitmap.bits)
+        for slot, value in slot_values.items():
+            bits = bits | 1 << slot if value else bits & ~(1 << slot)
+        bitmap.bits, bitmap.version = _to_bytes(bits), version
+    if created:
+        IngredientBitmap.objects.bulk_create(created)
+    if updated:
+        IngredientBitmap.objects.bulk_update(updated, ['bits', 'version'])
+
+
+def _link(user_id: int, recipe_ids: Iterable[int], ingredient_ids: Iterable[int], value: bool):
+    ingredient_ids = list(ingredient_ids)
+    with changes.batch():
+        links = _pending(user_id).links
+        for recipe_id in recipe_ids:
+            for ingredient_id in ingredient_ids:
+                links[recipe_id, ingredient_id] = value
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        with changes.batch():
+            _pending(instance.user_id).created.append(instance)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    # Its links are removed by recipe.m2m, the slot is freed.
+    slot = instance.slot
+    if slot is None and not is_deleting(instance.user_id):
+        slot = Recipe.objects.filter(id=instance.id).values_list('slot', flat=True).first()
+    with changes.batch():
+        _pending(instance.user_id, create=False).deleted[instance.id] = slot
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def ingredients_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    value = action == 'post_add'
+    if not reverse:
+        if action == 'pre_clear':
+            pk_set = instance.ingredients.values_list('id', flat=True)
+        _link(instance.user_id, [instance.id], pk_set, value)
+    else:
+        if action == 'pre_clear':
+            pk_set = instance.recipe_set.values_list('id', flat=True)
+        _link(instance.user_id, pk_set, [instance.id], value)
+
+
+class LoadedIndex(NamedTuple):
+    version: int
+    bitmaps: Dict[int, int]
+    # Versions of the bitmaps, by ingredient id.
+    versions: Dict[int, int]
+    # Number of ingredients of every slot, bit-sliced as in `_add`.
+    sizes: List[int]
+
+
+EMPTY_INDEX = LoadedIndex(0, {}, {}, [])
+
+_cache: 'OrderedDict[int, LoadedIndex]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def load(user_id: int) -> LoadedIndex:
+    """Return the user's index, from the process cache while its version is current.
+
+    A cached index of an older version is updated with the bitmaps written
+    since, the sizes of the slots are adjusted by the bits that changed.
+    """
+    version = IngredientIndex.objects.filter(user_id=user_id).values_list('version', flat=True)
+    version = version.first()
+    if version is None:
+        with transaction.atomic():
+            changes.lock_user(user_id, router.db_for_write(IngredientIndex))
+            rebuild(user_id)
+        return load(user_id)
+    with _cache_lock:
+        cached = _cache.get(user_id)
+        if cached is not None and cached.version == version:
+            _cache.move_to_end(user_id)
+            return cached
+    if cached is None or cached.version > version:
+        cached = EMPTY_INDEX
+
+    bitmaps = IngredientBitmap.objects.filter(user_id=user_id)
+    versions = dict(bitmaps.values_list('ingredient_id', 'version'))
+    if cached.versions:
+        changed = [pk for pk, written in versions.items() if cached.versions.get(pk) != written]
+        bitmaps = bitmaps.filter(ingredient_id__in=changed)
+    loaded = LoadedIndex(version, dict(cached.bitmaps), versions, list(cached.sizes))
+    for ingredient_id in cached.bitmaps.keys() - versions.keys():
+        _subtract(loaded.sizes, loaded.bitmaps.pop(ingredient_id))
+    for ingredient_id, bits in bitmaps.values_list('ingredient_id', 'bits'):
+        old, new = loaded.bitmaps.get(ingredient_id, 0), _to_int(bits)
+        _subtract(loaded.sizes, old & ~new)
+        _add(loaded.sizes, new & ~old)
+        loaded.bitmaps[ingredient_id] = new
+    with _cache_lock:
+        _cache[user_id] = loaded
+        _cache.move_to_end(user_id)
+        while len(_cache) > settings.INGREDIENT_INDEX_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return loaded
+
+
+class Match(NamedTuple):
+    slot: int
+    score: float
+    matched: int
+
+
+def match(user_id: int, ingredient_ids: Set[int], metric: str, limit: int) -> List[Match]:
+    """Rank the user's recipes by overlap of their ingredients with `ingredient_ids`.
+
+    `coverage` is the share of a recipe's ingredients that are given,
+    `jaccard` the size of the intersection over the size of the union.
+    Ids of ingredients the user does not have are ignored.
+    Slots are grouped by matched count and size with operations on whole
+    bitmaps, only the slots returned are taken out, lowest first on ties.
+    """
+    index = load(user_id)
+    counts, candidates = [], 0
+    for ingredient_id in ingredient_ids:
+        bits = index.bitmaps.get(ingredient_id)
+        if bits:
+            _add(counts, bits)
+            candidates |= bits
+
+    given = len(ingredient_ids)
+    missing = [id_ for id_ in ingredient_ids if id_ not in index.bitmaps]
+    if missing and metric == JACCARD:
+        # Only the user's ingredients are part of the union, those in no recipe are not indexed.
+        given -= len(missing) - Ingredient.objects.filter(user_id=user_id, id__in=missing).count()
+    groups = []
+    for count, counted in _group(counts, candidates):
+        for size, slots in _group(index.sizes, counted):
+            union = size if metric == COVERAGE else size + given - count
+            groups.append((count / union, count, slots))
+    groups.sort(key=lambda group: group[:2], reverse=True)
+
+    matches = []
+    for score, count, slots in groups:
+        for _ in range(min(limit - len(matches), popcount(slots))):
+            lowest = slots & -slots
+            matches.append(Match(lowest.bit_length() - 1, round(score, 4), count))
+            slots ^= lowest
+        if len(matches) >= limit:
+            break
+    return matches
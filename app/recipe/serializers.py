@@ -1,6 +1,27 @@
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
 
-from core.models import Tag, Ingredient, Recipe
+from core.models import Tag, Ingredient, Recipe, StoredFile
+from core.storage import IMAGE_CONTENT_TYPES
+from core.tasks import enqueue
+from recipe import versions
+from recipe.fields import UserPrimaryKeyRelatedField
+from recipe.m2m import set_related
+from recipe.tasks import verify_image
+
+IMAGE_UPLOAD_SALT = 'recipe.image-upload'
+# Most recipes copied by one request.
+RECIPE_COPY_MAX_COUNT = 100
+# Most recipes retrieved by one batch request.
+RECIPE_BATCH_MAX_COUNT = 100
+
+
+def make_image_upload_token(recipe: Recipe, name: str) -> str:
+    """Sign the object name a client may upload and then attach to the recipe."""
+    return signing.dumps({'recipe': recipe.id, 'name': name}, salt=IMAGE_UPLOAD_SALT)
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -24,15 +45,40 @@ class IngredientSerializer(serializers.ModelSerializer):
 class RecipeSerializer(serializers.ModelSerializer):
     """Serializer for the Recipe objects."""
 
-    tags = serializers.PrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
-    ingredients = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Ingredient.objects.all()
-    )
+    tags = UserPrimaryKeyRelatedField(many=True, queryset=Tag.objects.all())
+    ingredients = UserPrimaryKeyRelatedField(many=True, queryset=Ingredient.objects.all())
 
     class Meta:
         model = Recipe
-        fields = ('id', 'title', 'time_minutes', 'price', 'link', 'ingredients', 'tags')
-        read_only_fields = ('id', 'ingredients', 'tags')
+        fields = ('id', 'title', 'time_minutes', 'price', 'link', 'ingredients', 'tags', 'version')
+        read_only_fields = ('id', 'ingredients', 'tags', 'version')
+
+    def _pop_related(self, validated_data) -> dict:
+        return {
+            name: validated_data.pop(name)
+            for name in ('tags', 'ingredients')
+            if name in validated_data
+        }
+
+    def create(self, validated_data):
+        related = self._pop_related(validated_data)
+        with transaction.atomic():
+            recipe = super().create(validated_data)
+            for name, objects in related.items():
+                set_related(recipe, name, objects, created=True)
+        return recipe
+
+    def update(self, instance, validated_data):
+        """Save the given fields and the version `versions.bump_version` set."""
+        related = self._pop_related(validated_data)
+        with transaction.atomic():
+            for name, value in validated_data.items():
+                setattr(instance, name, value)
+            # Only the given fields, a full save could write back an image changed since.
+            instance.save(update_fields=[*validated_data, 'version'])
+            for name, objects in related.items():
+                set_related(instance, name, objects)
+        return instance
 
 
 class RecipeDetailSerializer(RecipeSerializer):
@@ -42,6 +88,22 @@ class RecipeDetailSerializer(RecipeSerializer):
     ingredients = IngredientSerializer(many=True)
 
 
+class RecipeCopySerializer(serializers.Serializer):
+    """Serializer for the ids of recipes to copy."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=RECIPE_COPY_MAX_COUNT
+    )
+
+
+class RecipeBatchSerializer(serializers.Serializer):
+    """Serializer for the ids of recipes to retrieve at once."""
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=RECIPE_BATCH_MAX_COUNT
+    )
+
+
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for uploading images."""
 
@@ -49,3 +111,59 @@ class RecipeImageSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'image')
         read_only_fields = ('id',)
+
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            instance.image = validated_data['image']
+            versions.save_new_version(instance, ['image'])
+        return instance
+
+
+class RecipeImageUploadUrlSerializer(serializers.Serializer):
+    """Serializer for requesting a direct-to-storage image upload."""
+
+    content_type = serializers.ChoiceField(choices=list(IMAGE_CONTENT_TYPES))
+    sha256 = serializers.RegexField(r'^[0-9a-f]{64}$', required=False)
+
+
+class RecipeImageAttachSerializer(serializers.ModelSerializer):
+    """Serializer for attaching a directly uploaded image to a recipe."""
+
+    upload_token = serializers.CharField(write_only=True)
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'image', 'upload_token')
+        read_only_fields = ('id', 'image')
+
+    def validate_upload_token(self, value):
+        """Return the name of the uploaded object the token was issued for."""
+        options = settings.OBJECT_STORAGE
+        try:
+            upload = signing.loads(
+                value, salt=IMAGE_UPLOAD_SALT, max_age=options['UPLOAD_EXPIRES'] * 2
+            )
+        except signing.BadSignature:
+            raise serializers.ValidationError('Invalid or expired upload token.')
+        if upload['recipe'] != self.instance.id:
+            raise serializers.ValidationError('Upload token was issued for another recipe.')
+        # Held until the image is attached, validate in a transaction.
+        StoredFile.objects.lock(upload['name'])
+        if not default_storage.exists(upload['name']):
+            raise serializers.ValidationError('Image has not been uploaded.')
+        if default_storage.size(upload['name']) > options['MAX_UPLOAD_SIZE']:
+            raise serializers.ValidationError('Image is too large.')
+        return upload['name']
+
+    def update(self, instance, validated_data):
+        name = validated_data['upload_token']
+        with transaction.atomic():
+            instance.image.name = name
+            versions.save_new_version(instance, ['image'])
+            # Decoding the image could take long, it is checked in the background.
+            enqueue(
+                verify_image,
+                {'recipe_id': instance.id, 'name': name},
+                key=f'{verify_image.task_name}:{instance.id}:{name}',
+            )
+        return instance
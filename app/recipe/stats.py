@@ -0,0 +1,195 @@
+from bisect import bisect_right
+from decimal import Decimal
+from typing import Callable, Dict, List
+
+from django.db import router, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from core.models import Ingredient, Recipe, Tag, UserRecipeStats
+from recipe import changes
+from recipe.m2m import RELATION_NAMES
+
+# Upper bounds of the price ranges, the last range has none.
+PRICE_BUCKET_BOUNDS = (Decimal(5), Decimal(10), Decimal(20), Decimal(50))
+
+COUNT_FIELDS = {Tag: 'tag_counts', Ingredient: 'ingredient_counts'}
+
+
+def price_bucket(price) -> int:
+    return bisect_right(PRICE_BUCKET_BOUNDS, Decimal(str(price)))
+
+
+def price_bucket_labels() -> List[str]:
+    bounds = [0, *PRICE_BUCKET_BOUNDS]
+    labels = [f'{low}-{high}' for low, high in zip(bounds, bounds[1:])]
+    return labels + [f'{bounds[-1]}+']
+
+
+def _link_counts(through, field: str, user_id: int) -> Dict[str, int]:
+    rows = (
+        through.objects.filter(recipe__user_id=user_id)
+        .values_list(field)
+        .annotate(total=Count('id'))
+        .order_by()
+    )
+    return {str(pk): total for pk, total in rows}
+
+
+def recompute(user_id: int) -> UserRecipeStats:
+    """Compute the statistics of a user from scratch."""
+    buckets = {}
+    low = None
+    for index, high in enumerate([*PRICE_BUCKET_BOUNDS, None]):
+        price_filter = Q()
+        if low is not None:
+            price_filter &= Q(price__gte=low)
+        if high is not None:
+            price_filter &= Q(price__lt=high)
+        buckets[f'bucket_{index}'] = Count('id', filter=price_filter)
+        low = high
+    totals = Recipe.objects.filter(user_id=user_id).aggregate(
+        recipes=Count('id'), minutes=Sum('time_minutes'), prices=Sum('price'), **buckets
+    )
+    stats, _ = UserRecipeStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'recipe_count': totals['recipes'],
+            'total_time_minutes': totals['minutes'] or 0,
+            'total_price': totals['prices'] or 0,
+            'price_buckets': [totals[f'bucket_{index}'] for index in range(len(buckets))],
+            'tag_counts': _link_counts(Recipe.tags.through, 'tag_id', user_id),
+            'ingredient_counts': _link_counts(Recipe.ingredients.through, 'ingredient_id', user_id),
+        },
+    )
+    return stats
+
+
+def get_stats(user_id: int) -> UserRecipeStats:
+    stats = UserRecipeStats.objects.filter(user_id=user_id).first()
+    if stats is None:
+        with transaction.atomic():
+            changes.lock_user(user_id, router.db_for_write(UserRecipeStats))
+            stats = recompute(user_id)
+    return stats
+
+
+class StatsChanges:
+    """Changes to a user's statistics collected by a batch."""
+
+    def __init__(self):
+        self.changes: List[Callable[[UserRecipeStats], None]] = []
+        self.create = False
+        self.recompute = False
+
+
+def _update(user_id: int, change: Callable[[UserRecipeStats], None] = None, create: bool = True):
+    """Apply `change` to the user's statistics when the batch of changes ends.
+
+    Without statistics yet, they are computed from scratch (`create`), which
+    includes the change. Deletes pass `create=False`: the user may be
+    deleted with them, and missing statistics are computed when read anyway.
+    Without `change` the statistics are computed from scratch if they exist.
+    """
+    with changes.batch():
+        pending = changes.pending('stats', user_id)
+        if change is None:
+            pending.recompute = True
+        else:
+            pending.changes.append(change)
+        pending.create = pending.create or create
+
+
+@changes.applier('stats', StatsChanges)
+def apply_changes(user_id: int, pending: StatsChanges):
+    """Apply the changes of a batch, holding a lock on the statistics."""
+    stats = UserRecipeStats.objects.select_for_update().filter(user_id=user_id).first()
+    if stats is None:
+        if pending.create:
+            recompute(user_id)
+        return
+    if pending.recompute:
+        recompute(user_id)
+        return
+    for change in pending.changes:
+        change(stats)
+    stats.save()
+
+
+def _add_recipe(stats: UserRecipeStats, time_minutes: int, price, sign: int):
+    stats.recipe_count += sign
+    stats.total_time_minutes += sign * time_minutes
+    stats.total_price += sign * Decimal(str(price))
+    buckets = stats.price_buckets or [0] * (len(PRICE_BUCKET_BOUNDS) + 1)
+    buckets[price_bucket(price)] += sign
+    stats.price_buckets = buckets
+
+
+def _add_links(counts: Dict[str, int], pks, sign: int = 1, times: int = 1):
+    for pk in pks:
+        key = str(pk)
+        total = counts.get(key, 0) + sign * times
+        if total > 0:
+            counts[key] = total
+        else:
+            counts.pop(key, None)
+
+
+def _loaded_values(instance):
+    """Return the saved time and price, None when either is deferred."""
+    values = instance.__dict__.get('time_minutes'), instance.__dict__.get('price')
+    return None if None in values else values
+
+
+@receiver(post_init, sender=Recipe)
+def remember_values(sender, instance, **kwargs):
+    instance._stats_values = _loaded_values(instance) if instance.pk else None
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not {'time_minutes', 'price'} & set(update_fields):
+        return
+    old, new = instance._stats_values, _loaded_values(instance)
+    instance._stats_values = new
+    if created:
+        _update(instance.user_id, lambda stats: _add_recipe(stats, *new, 1))
+    elif old is None or new is None:
+        _update(instance.user_id)
+    elif old != new:
+
+        def change(stats):
+            _add_recipe(stats, *old, -1)
+            _add_recipe(stats, *new, 1)
+
+        _update(instance.user_id, change)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    values = _loaded_values(instance)
+    if values is not None:
+        _update(instance.user_id, lambda stats: _add_recipe(stats, *values, -1), create=False)
+    else:
+        _update(instance.user_id, create=False)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def links_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    sign = 1 if action == 'post_add' else -1
+    if not reverse:
+        field = COUNT_FIELDS[model]
+        if action == 'pre_clear':
+            related = getattr(instance, RELATION_NAMES[model])
+            pk_set = list(related.values_list('id', flat=True))
+        if pk_set:
+            _update(instance.user_id, lambda stats: _add_links(getattr(stats, field), pk_set, sign))
+        return
+    field, pks = COUNT_FIELDS[type(instance)], [instance.pk]
+    times = len(pk_set) if action != 'pre_clear' else instance.recipe_set.count()
+    if times:
+        _update(instance.user_id, lambda stats: _add_links(getattr(stats, field), pks, sign, times))
@@ -0,0 +1,22 @@
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from core.models import Recipe
+from core.tasks import task
+from recipe import versions
+
+
+@task(max_attempts=3)
+def verify_image(recipe_id: int, name: str):
+    """Detach a directly uploaded image that cannot be decoded."""
+    recipe = Recipe.objects.filter(id=recipe_id, image=name).first()
+    if recipe is None:
+        return
+    with default_storage.open(name) as file:
+        try:
+            Image.open(file).verify()
+            return
+        except (OSError, SyntaxError):
+            pass
+    recipe.image = None
+    versions.save_new_version(recipe, ['image'])
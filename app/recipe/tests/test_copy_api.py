@@ -0,0 +1,140 @@
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ChangeLogEntry, Ingredient, Recipe, StoredFile, Tag, UserRecipeStats
+from recipe import matching
+from recipe.serializers import RECIPE_COPY_MAX_COUNT
+from recipe.stats import recompute
+
+COPY_MANY_URL = reverse('recipe:recipe-copy-many')
+
+
+def copy_url(recipe_id):
+    return reverse('recipe:recipe-copy', args=[recipe_id])
+
+
+class CopyRecipeApiTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@gmail.com', 'password123')
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+        self.egg = Ingredient.objects.create(user=self.user, name='Egg')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def _create_recipe(self, title, ingredients=()):
+        recipe = Recipe.objects.create(user=self.user, title=title, time_minutes=10, price=5)
+        recipe.tags.add(self.tag)
+        recipe.ingredients.add(*ingredients)
+        return recipe
+
+    def test_copy_recipe(self):
+        """Test copying a recipe with its links, sharing its image."""
+        recipe = self._create_recipe('Omelette', [self.salt, self.egg])
+        recipe.image.save('image.jpg', ContentFile(b'image'))
+
+        res = self.client.post(copy_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        copy = Recipe.objects.get(id=res.data['id'])
+        self.assertNotEqual(copy.id, recipe.id)
+        self.assertEqual(res.data['title'], 'Omelette')
+        self.assertEqual(res.data['tags'], [self.tag.id])
+        self.assertEqual(sorted(res.data['ingredients']), sorted([self.salt.id, self.egg.id]))
+        self.assertEqual(copy.image.name, recipe.image.name)
+        self.assertEqual(StoredFile.objects.get(name=recipe.image.name).references, 2)
+
+    def test_copy_many_recipes_with_bulk_inserts(self):
+        """Test that many recipes are copied in order with one insert per table."""
+        recipes = [self._create_recipe(f'Dish {i}', [self.salt]) for i in range(5)]
+        ids = [recipe.id for recipe in reversed(recipes)]
+
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.post(COPY_MANY_URL, {'ids': ids}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [item['title'] for item in res.data], [f'Dish {i}' for i in range(4, -1, -1)]
+        )
+        inserts = [
+            query['sql'].split('"')[1]
+            for query in context.captured_queries
+            if query['sql'].startswith('INSERT INTO "core_recipe')
+        ]
+        self.assertEqual(
+            sorted(inserts), ['core_recipe', 'core_recipe_ingredients', 'core_recipe_tags']
+        )
+
+    def test_copy_query_count_independent_of_copies(self):
+        """Test that copying many recipes takes as many queries as copying one."""
+        recipes = [self._create_recipe(f'Dish {i}', [self.salt, self.egg]) for i in range(10)]
+        for recipe in recipes:
+            recipe.image.save('image.jpg', ContentFile(b'image'))
+        self.client.get(reverse('recipe:stats'))
+        self.client.post(COPY_MANY_URL, {'ids': [recipes[0].id]}, format='json')
+
+        counts = []
+        for count in (1, 10):
+            with CaptureQueriesContext(connection) as context:
+                res = self.client.post(
+                    COPY_MANY_URL, {'ids': [recipe.id for recipe in recipes[:count]]}, format='json'
+                )
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            counts.append(len(context.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(StoredFile.objects.get(name=recipes[0].image.name).references, 22)
+
+    def test_copies_keep_aggregates_consistent(self):
+        """Test that the change log, statistics and ingredient index include the copies."""
+        recipe = self._create_recipe('Omelette', [self.salt, self.egg])
+        self.client.get(reverse('recipe:stats'))
+
+        res = self.client.post(COPY_MANY_URL, {'ids': [recipe.id]}, format='json')
+
+        copy_id = res.data[0]['id']
+        self.assertTrue(
+            ChangeLogEntry.objects.filter(model=ChangeLogEntry.RECIPE, object_id=copy_id).exists()
+        )
+        stats = UserRecipeStats.objects.get(user=self.user)
+        self.assertEqual(stats.recipe_count, 2)
+        self.assertEqual(stats.ingredient_counts, recompute(self.user.id).ingredient_counts)
+        matches = matching.match(self.user.id, {self.salt.id, self.egg.id}, matching.COVERAGE, 5)
+        self.assertEqual(len(matches), 2)
+
+    def test_copy_others_recipes_rejected(self):
+        """Test that recipes of other users and unknown ids are not copied."""
+        other = get_user_model().objects.create_user('other@gmail.com', 'password123')
+        recipe = Recipe.objects.create(user=other, title='Secret', time_minutes=1, price=1)
+        own = self._create_recipe('Mine')
+
+        res = self.client.post(COPY_MANY_URL, {'ids': [own.id, recipe.id, 0]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(recipe.id), res.data['ids'][0])
+        self.assertEqual(self.client.post(copy_url(recipe.id)).status_code, 404)
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_copy_too_many_rejected(self):
+        """Test that the number of recipes copied at once is limited."""
+        res = self.client.post(
+            COPY_MANY_URL, {'ids': list(range(RECIPE_COPY_MAX_COUNT + 1))}, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import threading
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+
+from core.models import ChangeLogEntry, Recipe, Tag
+from recipe import events
+
+EVENT_STREAM = {
+    'BROADCASTER': 'local',
+    'CHANNEL': 'recipe_changes',
+    'HEARTBEAT_SECONDS': 5,
+    'RETRY_MS': 3000,
+    'PAGE_SIZE': 2,
+}
+
+
+def make_scope(path=events.EVENTS_PATH, token=None, last_event_id=None):
+    headers = []
+    if token:
+        headers.append((b'authorization', f'Token {token}'.encode()))
+    if last_event_id is not None:
+        headers.append((b'last-event-id', str(last_event_id).encode()))
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': b'',
+        'headers': headers,
+    }
+
+
+def parse_events(body: bytes):
+    parsed = []
+    for block in body.decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if ': ' in line)
+        if 'data' in fields:
+            parsed.append((int(fields['id']), json.loads(fields['data'])))
+    return parsed
+
+
+@override_settings(EVENT_STREAM=EVENT_STREAM)
+class EventStreamTests(TransactionTestCase):
+    def setUp(self):
+        events._broadcaster = None
+        self.user = get_user_model().objects.create_user('test@gmail.com', 'password123')
+        self.token = Token.objects.create(user=self.user)
+
+    def tearDown(self):
+        events._broadcaster = None
+
+    async def _connect(self, **kwargs):
+        communicator = ApplicationCommunicator(events.stream_events, make_scope(**kwargs))
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await communicator.receive_output(1)
+        return communicator, start
+
+    async def _read_body(self, communicator) -> bytes:
+        message = await communicator.receive_output(1)
+        return message['body']
+
+    async def _close(self, communicator):
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(1)
+
+    async def test_authentication_required(self):
+        """Test that the stream requires a valid token."""
+        communicator, start = await self._connect(token='invalid')
+
+        self.assertEqual(start['status'], 401)
+        await communicator.wait(1)
+
+    async def test_resume_from_last_event_id(self):
+        """Test that entries after Last-Event-ID are sent in pages on connect."""
+        create_recipe = sync_to_async(Recipe.objects.create)
+        for title in ('One', 'Two', 'Three', 'Four'):
+            await create_recipe(user=self.user, title=title, time_minutes=5, price=1)
+        first = await sync_to_async(ChangeLogEntry.objects.earliest)('id')
+
+        communicator, start = await self._connect(token=self.token.key, last_event_id=first.id)
+        retry = await self._read_body(communicator)
+        received = parse_events(await self._read_body(communicator))
+        received += parse_events(await self._read_body(communicator))
+        await self._close(communicator)
+
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertEqual(retry, b'retry: 3000\n\n')
+        self.assertEqual(len(received), 3)
+        self.assertGreater(received[0][0], first.id)
+        self.assertEqual(received[2][1]['model'], 'recipe')
+
+    async def test_live_change_wakes_stream(self):
+        """Test that a committed change is pushed to a connected stream."""
+        communicator, _ = await self._connect(token=self.token.key)
+        await self._read_body(communicator)
+
+        tag = await sync_to_async(Tag.objects.create)(user=self.user, name='Vegan')
+        received = parse_events(await self._read_body(communicator))
+        await self._close(communicator)
+
+        self.assertEqual(received[0][1], {'model': 'tag', 'id': tag.id, 'action': 'saved'})
+
+    @override_settings(EVENT_STREAM=dict(EVENT_STREAM, HEARTBEAT_SECONDS=0.01))
+    async def test_heartbeat(self):
+        """Test that an idle stream sends comments to keep the connection open."""
+        communicator, _ = await self._connect(token=self.token.key)
+        await self._read_body(communicator)
+
+        body = await self._read_body(communicator)
+        await self._close(communicator)
+
+        self.assertEqual(body, b': ping\n\n')
+
+    @override_settings(EVENT_STREAM=dict(EVENT_STREAM, HEARTBEAT_SECONDS=0.01))
+    async def test_revoked_token_ends_stream(self):
+        """Test that the stream ends once its token was revoked."""
+        communicator, _ = await self._connect(token=self.token.key)
+        await self._read_body(communicator)
+
+        await sync_to_async(self.token.delete)()
+        message = await communicator.receive_output(1)
+        while message.get('more_body'):
+            message = await communicator.receive_output(1)
+        await communicator.wait(1)
+
+        self.assertEqual(message['body'], b'')
+
+    async def test_subscribe_waits_for_reconnect(self):
+        """Test that subscribing while a reconnect is scheduled does not listen again."""
+        broadcaster = events.PostgresBroadcaster('recipe_changes')
+        with patch.object(broadcaster, 'listen') as listen:
+            await broadcaster.subscribe(self.user.id)
+            broadcaster.reconnect()
+            await broadcaster.subscribe(self.user.id)
+            broadcaster.pending.cancel()
+
+        self.assertEqual(listen.call_count, 1)
+
+    async def test_listen_does_not_block_streams(self):
+        """Test that the broadcaster connects in a thread, while the streams are served."""
+        broadcaster = events.PostgresBroadcaster('recipe_changes')
+        connect = broadcaster.connect
+        release = threading.Event()
+
+        def slow_connect(params):
+            release.wait(5)
+            return connect(params)
+
+        with patch.object(broadcaster, 'connect', slow_connect):
+            await broadcaster.subscribe(self.user.id)
+            connecting = broadcaster.connection is None
+            release.set()
+            for _ in range(100):
+                if broadcaster.connection is not None:
+                    break
+                await asyncio.sleep(0.01)
+        broadcaster.loop.remove_reader(broadcaster.connection.fileno())
+        broadcaster.connection.close()
+
+        self.assertTrue(connecting)
+        self.assertIsNone(broadcaster.pending)
+
+    async def test_router_passes_other_requests(self):
+        """Test that requests outside the stream path reach the wrapped application."""
+        called = []
+
+        async def application(scope, receive, send):
+            called.append(scope['path'])
+
+        router = events.EventStreamRouter(application)
+        await router(make_scope(path='/api/recipe/recipes/'), None, None)
+
+        self.assertEqual(called, ['/api/recipe/recipes/'])
@@ -0,0 +1,184 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, IngredientBitmap, IngredientIndex, Recipe
+from core.query_audit import QueryAuditTestMixin
+from recipe import matching
+
+MATCHING_URL = reverse('recipe:recipe-matching')
+
+
+def indexed_recipes(user):
+    """Return the recipe ids set in each ingredient's bitmap."""
+    recipes = dict(Recipe.objects.filter(user=user).values_list('slot', 'id'))
+    indexed = {}
+    for ingredient_id, bits in IngredientBitmap.objects.filter(user=user).values_list(
+        'ingredient_id', 'bits'
+    ):
+        slots = matching.bit_positions(matching._to_int(bits))
+        recipe_ids = {recipes[slot] for slot in slots}
+        if recipe_ids:
+            indexed[ingredient_id] = recipe_ids
+    return indexed
+
+
+class BitPositionsTests(TestCase):
+    def test_bit_positions(self):
+        """Test that set bits are found in large integers."""
+        bits = 1 | 1 << 9 | 1 << 100000
+
+        self.assertEqual(list(matching.bit_positions(bits)), [0, 9, 100000])
+        self.assertEqual(list(matching.bit_positions(0)), [])
+
+    def test_bit_sliced_counters(self):
+        """Test that bit-sliced counters count per slot and group slots by count."""
+        bitmaps = [0b1011, 0b0110, 0b1110, 0b0010]
+        planes = []
+        for bits in bitmaps:
+            matching._add(planes, bits)
+        matching._subtract(planes, bitmaps[-1])
+
+        groups = {count: slots for count, slots in matching._group(planes, 0b1111)}
+
+        self.assertEqual(groups, {1: 0b0001, 2: 0b1100, 3: 0b0010})
+        self.assertEqual(matching.popcount(groups[2]), 2)
+
+
+class MatchingApiTest(QueryAuditTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@gmail.com', 'password123')
+        self.client.force_authenticate(self.user)
+        self.salt, self.pepper, self.egg, self.milk = (
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Salt', 'Pepper', 'Egg', 'Milk')
+        )
+
+    def _create_recipe(self, title, ingredients):
+        recipe = Recipe.objects.create(user=self.user, title=title, time_minutes=5, price=1)
+        recipe.ingredients.add(*ingredients)
+        return recipe
+
+    def _match(self, ingredients, **params):
+        params['ingredients'] = ','.join(str(ingredient.id) for ingredient in ingredients)
+        res = self.client.get(MATCHING_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [(item['title'], item['score'], item['matched_ingredients']) for item in res.data]
+
+    def test_rank_by_coverage(self):
+        """Test that recipes are ranked by the share of their ingredients that are given."""
+        self._create_recipe('Seasoning', [self.salt, self.pepper])
+        self._create_recipe('Omelette', [self.salt, self.pepper, self.egg, self.milk])
+        self._create_recipe('Boiled egg', [self.egg])
+
+        results = self._match([self.salt, self.pepper])
+
+        self.assertEqual(results, [('Seasoning', 1.0, 2), ('Omelette', 0.5, 2)])
+
+    def test_rank_by_jaccard(self):
+        """Test that recipes are ranked by intersection over union."""
+        self._create_recipe('Seasoning', [self.salt])
+        self._create_recipe('Omelette', [self.salt, self.pepper, self.egg])
+
+        results = self._match([self.salt, self.pepper, self.egg, self.milk], metric='jaccard')
+
+        self.assertEqual(results, [('Omelette', 0.75, 3), ('Seasoning', 0.25, 1)])
+
+    def test_jaccard_ignores_other_ingredients(self):
+        """Test that unknown ids and ingredients of other users do not lower jaccard scores."""
+        other_user = get_user_model().objects.create_user('other@gmail.com', 'password123')
+        other = Ingredient.objects.create(user=other_user, name='Salt')
+        self._create_recipe('Seasoning', [self.salt, self.pepper])
+        params = {'ingredients': f'{self.salt.id},{self.pepper.id},{other.id},999999'}
+
+        res = self.client.get(MATCHING_URL, dict(params, metric='jaccard'))
+
+        self.assertEqual(res.data[0]['score'], 1.0)
+
+    def test_index_kept_up_to_date(self):
+        """Test that the maintained index equals an index built from scratch."""
+        first = self._create_recipe('First', [self.salt, self.egg])
+        second = self._create_recipe('Second', [self.pepper])
+        self.client.patch(
+            reverse('recipe:recipe-detail', args=[first.id]),
+            {'ingredients': [self.salt.id, self.milk.id]},
+        )
+        self.egg.recipe_set.add(second)
+        first.delete()
+        self._create_recipe('Third', [self.salt, self.pepper])
+        self.pepper.recipe_set.clear()
+        self.milk.delete()
+        maintained = indexed_recipes(self.user)
+
+        matching.rebuild(self.user.id)
+
+        self.assertEqual(set(Recipe.objects.values_list('slot', flat=True)), {0, 1})
+        self.assertEqual(maintained, indexed_recipes(self.user))
+        self.assertEqual(self._match([self.salt]), [('Third', 1.0, 1)])
+
+    def test_recipes_created_without_signals(self):
+        """Test that recipes without a slot cause a rebuild of the index."""
+        self._create_recipe('First', [self.salt])
+        recipe = Recipe.objects.bulk_create(
+            [Recipe(user=self.user, title='Bulk', time_minutes=5, price=1)]
+        )[0]
+
+        Recipe.ingredients.through.objects.create(recipe=recipe, ingredient=self.salt)
+        Recipe.objects.get(id=recipe.id).ingredients.add(self.egg)
+
+        self.assertEqual(len(self._match([self.salt, self.egg])), 2)
+
+    def test_ties_ranked_by_slot(self):
+        """Test that recipes with equal scores are returned in slot order."""
+        for title in ('First', 'Second', 'Third'):
+            self._create_recipe(title, [self.salt])
+
+        results = self._match([self.salt], limit=2)
+
+        self.assertEqual(results, [('First', 1.0, 1), ('Second', 1.0, 1)])
+
+    def test_cached_index_updated_with_changed_bitmaps(self):
+        """Test that a cached index only reloads the bitmaps written since."""
+        first = self._create_recipe('First', [self.salt, self.egg])
+        self._create_recipe('Second', [self.salt, self.pepper])
+        matching.load(self.user.id)
+        first.ingredients.remove(self.egg)
+        first.ingredients.add(self.milk)
+        self.pepper.delete()
+
+        with CaptureQueriesContext(connection) as context:
+            updated = matching.load(self.user.id)
+        matching._cache.clear()
+        loaded = matching.load(self.user.id)
+
+        self.assertEqual(len(context.captured_queries), 3)
+        self.assertIn('IN', context.captured_queries[-1]['sql'])
+        self.assertEqual(updated, loaded)
+        self.assertEqual(
+            self._match([self.salt, self.milk]), [('First', 1.0, 2), ('Second', 1.0, 1)]
+        )
+
+    def test_matching_query_count(self):
+        """Test that matching with a cached index takes a fixed number of queries."""
+        for i in range(10):
+            self._create_recipe(f'Recipe {i}', [self.salt, self.egg])
+        self._match([self.salt])
+
+        with self.assertQueryBudget(4):
+            results = self._match([self.salt], limit=5)
+
+        self.assertEqual(len(results), 5)
+        self.assertEqual(IngredientIndex.objects.get(user=self.user).next_slot, 10)
+
+    def test_matching_invalid_params(self):
+        """Test that invalid parameters are rejected."""
+        for params in ({}, {'ingredients': 'a'}, {'ingredients': '1', 'metric': 'cosine'}):
+            res = self.client.get(MATCHING_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,17 +1,25 @@
+import hashlib
 import tempfile
 import os
+from io import BytesIO
 
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models.signals import m2m_changed
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from rest_framework import status
 from rest_framework.test import APIClient
 from PIL import Image
 
+from core import tasks
 from core.models import Recipe, Ingredient, Tag
+from core.query_audit import QueryAuditTestMixin
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
 
 RECIPES_URL = reverse('recipe:recipe-list')
+RECIPES_BATCH_URL = reverse('recipe:recipe-batch')
 
 
 def get_recipe_detail_url(pk: int):
@@ -22,6 +30,20 @@ def get_image_upload_url(pk: int):
     return reverse('recipe:recipe-upload-image', args=[pk])
 
 
+def get_direct_upload_url(pk: int):
+    return reverse('recipe:recipe-image-upload-url', args=[pk])
+
+
+def get_attach_image_url(pk: int):
+    return reverse('recipe:recipe-attach-image', args=[pk])
+
+
+def create_jpeg_bytes() -> bytes:
+    buffer = BytesIO()
+    Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
 class PublicRecipesApiTest(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -33,7 +55,7 @@ class PublicRecipesApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateRecipesApiTest(TestCase):
+class PrivateRecipesApiTest(QueryAuditTestMixin, TestCase):
     def setUp(self):
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
@@ -70,6 +92,23 @@ class PrivateRecipesApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, expected_recipes.data)
 
+    def test_retrieve_recipes_query_budget(self):
+        """Test that listing recipes does not query relations per recipe."""
+        tag = Tag.objects.create(name='tag', user=self.user)
+        ingredient = Ingredient.objects.create(name='salt', user=self.user)
+        for i in range(5):
+            recipe = self._create_recipe(
+                title=f'Recipe {i}', user=self.user, time_minutes=5, price=10.00
+            )
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+
+        with self.assertNoRepeatedQueries(), self.assertQueryBudget(3):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 5)
+
     def test_recipes_limited_to_user(self):
         """Test retrieving only user's tags."""
         self._create_recipe(
@@ -123,6 +162,24 @@ class PrivateRecipesApiTest(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
 
+    def test_recipe_detail_ignores_list_filters(self):
+        """Test that list filters in the query string do not hide the recipe."""
+        recipe = self._create_recipe(title='Recipe', user=self.user, time_minutes=6, price=4)
+
+        res = self.client.get(get_recipe_detail_url(recipe.id), {'tags': '999'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_recipe_detail_query_budget(self):
+        """Test that the detail is one lookup by user and id, and a prefetch per relation."""
+        recipe = self._create_recipe(title='Recipe', user=self.user, time_minutes=6, price=4)
+        url = get_recipe_detail_url(recipe.id)
+
+        with self.assertQueryBudget(3):
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
     def test_recipe_create_success(self):
         """Test creating a new recipe."""
         payload = {'title': 'New Recipe', 'time_minutes': 5, 'price': 3.33}
@@ -170,6 +227,141 @@ class PrivateRecipesApiTest(TestCase):
         self.assertIn(ingredient_1, ingredients)
         self.assertIn(ingredient_2, ingredients)
 
+    def test_recipe_create_with_other_users_tag_fails(self):
+        """Test that recipes can only link the user's own tags."""
+        other_user = get_user_model().objects.create_user('other@gmail.com', 'password123')
+        tag = Tag.objects.create(user=other_user, name='Foreign')
+        payload = {'title': 'New Recipe', 'time_minutes': 5, 'price': 3.33, 'tags': [tag.id]}
+
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.filter(title=payload['title']).exists())
+
+    def test_recipe_create_reports_all_missing_ids(self):
+        """Test that every unknown id is reported at once."""
+        tag = Tag.objects.create(user=self.user, name='Tag')
+        payload = {
+            'title': 'New Recipe',
+            'time_minutes': 5,
+            'price': 3.33,
+            'tags': [tag.id, 0, -1],
+        }
+
+        res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('[0, -1]', str(res.data['tags'][0]))
+
+    def test_recipe_validation_one_query_per_relation(self):
+        """Test that related ids are resolved with one query per relation."""
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=self.user, name=f'Ingredient {i}') for i in range(30)
+        )
+        tags = Tag.objects.bulk_create(Tag(user=self.user, name=f'Tag {i}') for i in range(3))
+        payload = {
+            'title': 'New Recipe',
+            'time_minutes': 5,
+            'price': 3.33,
+            'tags': [tag.id for tag in tags],
+            'ingredients': [ingredient.id for ingredient in ingredients],
+        }
+        request = APIClient().get(RECIPES_URL).wsgi_request
+        request.user = self.user
+        serializer = RecipeSerializer(data=payload, context={'request': request})
+
+        with self.assertQueryBudget(2):
+            self.assertTrue(serializer.is_valid())
+
+        self.assertEqual(len(serializer.validated_data['ingredients']), 30)
+
+    def test_recipe_create_query_budget(self):
+        """Test that a created recipe is logged, indexed and counted once."""
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}').id for i in range(2)]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=f'Ingredient {i}').id for i in range(3)
+        ]
+        payload = {
+            'title': 'New Recipe',
+            'time_minutes': 5,
+            'price': 3.33,
+            'tags': tags,
+            'ingredients': ingredients,
+        }
+        self.client.post(RECIPES_URL, payload)
+
+        with self.assertQueryBudget(19):
+            res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_update_recipe_writes_only_changed_links(self):
+        """Test that updating ingredients only adds and removes the difference."""
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=self.user, name=f'Ingredient {i}') for i in range(30)
+        )
+        recipe = self._create_recipe(user=self.user, title='Soup', time_minutes=5, price=1)
+        recipe.ingredients.set(ingredients[:20])
+        payload = {'ingredients': [ingredient.id for ingredient in ingredients[10:]]}
+        changes = []
+
+        def receiver(action, pk_set, **kwargs):
+            changes.append((action, len(pk_set)))
+
+        m2m_changed.connect(receiver, sender=Recipe.ingredients.through)
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.patch(get_recipe_detail_url(recipe.id), payload)
+        finally:
+            m2m_changed.disconnect(receiver, sender=Recipe.ingredients.through)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertCountEqual(
+            recipe.ingredients.values_list('id', flat=True), payload['ingredients']
+        )
+        self.assertEqual(
+            changes, [('pre_remove', 10), ('post_remove', 10), ('pre_add', 10), ('post_add', 10)]
+        )
+        link_writes = [
+            query['sql']
+            for query in queries.captured_queries
+            if 'recipe_ingredients' in query['sql']
+            and query['sql'].startswith(('INSERT', 'DELETE'))
+        ]
+        self.assertEqual(len(link_writes), 2)
+
+    def test_deletes_send_link_removals(self):
+        """Test that deleting a recipe or an ingredient sends the removal of their links."""
+        salt, egg = (Ingredient.objects.create(user=self.user, name=name) for name in 'ab')
+        recipe, other = (
+            Recipe.objects.create(user=self.user, title=title, time_minutes=5, price=1)
+            for title in 'ab'
+        )
+        recipe.ingredients.add(salt, egg)
+        other.ingredients.add(salt)
+        salt_id, egg_id = salt.id, egg.id
+        changes = []
+
+        def receiver(instance, action, reverse, pk_set, **kwargs):
+            changes.append((type(instance).__name__, action, reverse, pk_set))
+
+        m2m_changed.connect(receiver, sender=Recipe.ingredients.through)
+        try:
+            recipe.delete()
+            salt.delete()
+        finally:
+            m2m_changed.disconnect(receiver, sender=Recipe.ingredients.through)
+
+        self.assertEqual(
+            changes,
+            [
+                ('Recipe', 'pre_remove', False, {salt_id, egg_id}),
+                ('Recipe', 'post_remove', False, {salt_id, egg_id}),
+                ('Ingredient', 'pre_remove', True, {other.id}),
+                ('Ingredient', 'post_remove', True, {other.id}),
+            ],
+        )
+
     def test_partial_update_recipe(self):
         """Test HTTP PATCH is possible on existing recipe objects."""
         recipe = Recipe.objects.create(
@@ -210,6 +402,177 @@ class PrivateRecipesApiTest(TestCase):
         self.assertNotIn(tag, recipe.tags.all())
         self.assertEqual(recipe.title, payload['title'])
 
+    def test_batch_retrieve_recipes(self):
+        """Test retrieving the details of many recipes with fixed queries."""
+        other = get_user_model().objects.create_user('other@gmail.com', 'password123')
+        forbidden = self._create_recipe(title='Secret', user=other, time_minutes=1, price=1)
+        recipes = []
+        for i in range(5):
+            recipe = self._create_recipe(title=f'Dish {i}', user=self.user, time_minutes=1, price=1)
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(Ingredient.objects.create(user=self.user, name=f'Salt {i}'))
+            recipes.append(recipe)
+        ids = [recipes[3].id, forbidden.id, recipes[0].id, 0, recipes[4].id]
+
+        with self.assertQueryBudget(3):
+            res = self.client.get(RECIPES_BATCH_URL, {'ids': ','.join(map(str, ids))})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        expected = [recipes[3], recipes[0], recipes[4]]
+        self.assertEqual(res.data['results'], RecipeDetailSerializer(expected, many=True).data)
+        self.assertEqual(res.data['missing'], [forbidden.id, 0])
+
+    def test_batch_retrieve_recipes_post(self):
+        """Test retrieving many recipes with the ids in the body."""
+        recipe = self._create_recipe(title='Dish', user=self.user, time_minutes=1, price=1)
+
+        res = self.client.post(RECIPES_BATCH_URL, {'ids': [recipe.id, recipe.id]}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in res.data['results']], [recipe.id])
+        self.assertEqual(res.data['missing'], [])
+
+    def test_batch_retrieve_invalid_ids(self):
+        """Test that missing, malformed and too many ids are rejected."""
+        for params in ({}, {'ids': '1,a'}, {'ids': ','.join(['1'] * 101)}):
+            res = self.client.get(RECIPES_BATCH_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeWriteLockTests(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@gmail.com', 'password123')
+        self.client.force_authenticate(self.user)
+        self.ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        self.payload = {
+            'title': 'Soup',
+            'time_minutes': 5,
+            'price': 3,
+            'tags': [],
+            'ingredients': [self.ingredient.id],
+        }
+        self.client.post(RECIPES_URL, self.payload, format='json')
+
+    def _locks_and_notifications(self, method, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            method(*args, **kwargs)
+        queries = [query['sql'] for query in context.captured_queries]
+        locks = []
+        for sql in queries:
+            if 'pg_advisory_xact_lock' in sql:
+                locks.append('user')
+            elif sql.endswith('FOR UPDATE'):
+                locks.append(sql.split(' FROM "', 1)[1].split('"', 1)[0])
+        return locks, sum('pg_notify' in sql for sql in queries)
+
+    def test_writes_lock_in_fixed_order(self):
+        """Test that writes lock the user, the index, then the statistics, and notify once."""
+        order = ['user', 'core_ingredientindex', 'core_userrecipestats']
+
+        created = self._locks_and_notifications(
+            self.client.post, RECIPES_URL, self.payload, format='json'
+        )
+        recipe = Recipe.objects.latest('id')
+        deleted = self._locks_and_notifications(
+            self.client.delete, get_recipe_detail_url(recipe.id)
+        )
+
+        self.assertEqual(created, (order, 1))
+        self.assertEqual(deleted, (order, 1))
+
+
+class RecipeRangeFilterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@gmail.com', 'password123')
+        self.client.force_authenticate(self.user)
+        for title, time_minutes, price in (
+            ('Salad', 10, '4.50'),
+            ('Curry', 45, '8.00'),
+            ('Stew', 120, '12.00'),
+            ('Toast', 5, '1.00'),
+        ):
+            Recipe.objects.create(
+                user=self.user, title=title, time_minutes=time_minutes, price=price
+            )
+
+    def _titles(self, params):
+        res = self.client.get(RECIPES_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe['title'] for recipe in res.data]
+
+    def _plan(self, params) -> str:
+        """Return the query plan of the recipe list query, with sequential scans disabled."""
+        # Statistics of more recipes, outside the ranges, make the plans deterministic.
+        Recipe.objects.bulk_create(
+            Recipe(user=self.user, title='Feast', time_minutes=200 + i, price=50 + i)
+            for i in range(500)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE core_recipe')
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(RECIPES_URL, params)
+        sql = next(
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT "core_recipe"."id"')
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def test_filter_time_and_price_ranges(self):
+        """Test filtering recipes by time and price ranges."""
+        titles = self._titles({'time_minutes_max': 30, 'price_max': '10'})
+        self.assertEqual(titles, ['Toast', 'Salad'])
+
+        titles = self._titles({'time_minutes_min': 10, 'price_min': '5', 'price_max': '12'})
+        self.assertEqual(titles, ['Stew', 'Curry'])
+
+    def test_ordering(self):
+        """Test ordering recipes by whitelisted fields."""
+        self.assertEqual(self._titles({'ordering': 'price'}), ['Toast', 'Salad', 'Curry', 'Stew'])
+        self.assertEqual(
+            self._titles({'ordering': '-time_minutes'}), ['Stew', 'Curry', 'Salad', 'Toast']
+        )
+        self.assertEqual(self._titles({'ordering': 'title'}), ['Curry', 'Salad', 'Stew', 'Toast'])
+
+    def test_invalid_filters_rejected(self):
+        """Test that unknown ordering fields and non numeric ranges are rejected."""
+        for params in ({'ordering': 'user'}, {'ordering': 'price,link'}, {'price_max': 'cheap'}):
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_out_of_range_filters_rejected(self):
+        """Test that range values the columns cannot hold are rejected, not sent to the database."""
+        for params in (
+            {'price_min': 'Infinity'},
+            {'price_max': 'NaN'},
+            {'price_min': '1e999999'},
+            {'price_max': '10000'},
+            {'time_minutes_min': '-1'},
+            {'time_minutes_max': str(2 ** 63)},
+        ):
+            res = self.client.get(RECIPES_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(list(params)[0], res.data)
+
+    def test_time_range_uses_index(self):
+        """Test that time range filters are planned on the user and time index."""
+        plan = self._plan({'time_minutes_max': 30, 'ordering': 'time_minutes'})
+
+        self.assertIn('recipe_user_time_idx', plan)
+
+    def test_price_range_uses_index(self):
+        """Test that price range filters are planned on the user and price index."""
+        plan = self._plan({'price_min': '2', 'price_max': '10', 'ordering': '-price'})
+
+        self.assertIn('recipe_user_price_idx', plan)
+
 
 class RecipeImageUploadTests(TestCase):
     def setUp(self):
@@ -295,3 +658,151 @@ class RecipeImageUploadTests(TestCase):
 
     def tearDown(self):
         self.recipe.image.delete()
+
+
+class DirectImageUploadTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@gmail.com', 'testpass')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Sample', time_minutes=1, price=1.0
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def _request_upload(self, recipe=None):
+        url = get_direct_upload_url((recipe or self.recipe).id)
+        return self.client.post(url, {'content_type': 'image/jpeg'})
+
+    def test_direct_upload_and_attach(self):
+        """Test uploading an image with a presigned request and attaching it."""
+        res = self._request_upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        upload = res.data['upload']
+        self.assertEqual(upload['method'], 'PUT')
+        put = APIClient().put(upload['url'], create_jpeg_bytes(), content_type='image/jpeg')
+        self.assertEqual(put.status_code, status.HTTP_200_OK)
+
+        res = self.client.post(
+            get_attach_image_url(self.recipe.id), {'upload_token': res.data['upload_token']}
+        )
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(self.recipe.image.name.startswith('uploads/recipe/'))
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def test_attached_image_verified_in_background(self):
+        """Test that an attached upload that is not an image is detached by a task."""
+        res = self._request_upload()
+        APIClient().put(res.data['upload']['url'], b'not an image', content_type='image/jpeg')
+        self.client.post(
+            get_attach_image_url(self.recipe.id), {'upload_token': res.data['upload_token']}
+        )
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image)
+        self.assertEqual(self.recipe.version, 2)
+
+        self.assertEqual(tasks.run_pending(), 1)
+
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+        self.assertEqual(self.recipe.version, 3)
+
+    def test_direct_upload_deduplicated(self):
+        """Test that content which is already stored is not uploaded again."""
+        content = create_jpeg_bytes()
+        sha256 = hashlib.sha256(content).hexdigest()
+        payload = {'content_type': 'image/jpeg', 'sha256': sha256}
+        res = self.client.post(get_direct_upload_url(self.recipe.id), payload)
+        APIClient().put(res.data['upload']['url'], content, content_type='image/jpeg')
+        self.client.post(
+            get_attach_image_url(self.recipe.id), {'upload_token': res.data['upload_token']}
+        )
+        other = Recipe.objects.create(user=self.user, title='Other', time_minutes=1, price=1.0)
+
+        res = self.client.post(get_direct_upload_url(other.id), payload)
+        self.assertIsNone(res.data['upload'])
+        self.client.post(get_attach_image_url(other.id), {'upload_token': res.data['upload_token']})
+
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(other.image.name, self.recipe.image.name)
+        self.assertIn(sha256, other.image.name)
+
+    def test_direct_upload_of_content_stored_for_other_user(self):
+        """Test that whether another user stored some content is not revealed."""
+        content = create_jpeg_bytes()
+        sha256 = hashlib.sha256(content).hexdigest()
+        payload = {'content_type': 'image/jpeg', 'sha256': sha256}
+        res = self.client.post(get_direct_upload_url(self.recipe.id), payload)
+        APIClient().put(res.data['upload']['url'], content, content_type='image/jpeg')
+        self.client.post(
+            get_attach_image_url(self.recipe.id), {'upload_token': res.data['upload_token']}
+        )
+        other_user = get_user_model().objects.create_user('other@gmail.com', 'testpass')
+        other = Recipe.objects.create(user=other_user, title='Other', time_minutes=1, price=1.0)
+        self.client.force_authenticate(other_user)
+
+        res = self.client.post(get_direct_upload_url(other.id), payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(res.data['upload'])
+
+    def test_direct_upload_digest_mismatch(self):
+        """Test that the storage rejects content not matching the signed digest."""
+        payload = {'content_type': 'image/jpeg', 'sha256': '0' * 64}
+        res = self.client.post(get_direct_upload_url(self.recipe.id), payload)
+
+        put = APIClient().put(
+            res.data['upload']['url'], create_jpeg_bytes(), content_type='image/jpeg'
+        )
+
+        self.assertEqual(put.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_attach_before_upload_fails(self):
+        """Test that an image which was never uploaded is not attached."""
+        token = self._request_upload().data['upload_token']
+
+        res = self.client.post(get_attach_image_url(self.recipe.id), {'upload_token': token})
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.recipe.image)
+
+    def test_attach_token_of_other_recipe_fails(self):
+        """Test that an upload token only attaches to the recipe it was issued for."""
+        other = Recipe.objects.create(user=self.user, title='Other', time_minutes=1, price=1.0)
+        res = self._request_upload(other)
+        APIClient().put(
+            res.data['upload']['url'], create_jpeg_bytes(), content_type='image/jpeg'
+        )
+
+        res = self.client.post(
+            get_attach_image_url(self.recipe.id), {'upload_token': res.data['upload_token']}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_with_forged_token_fails(self):
+        """Test that the storage stand-in rejects unsigned uploads."""
+        url = reverse('storage-upload') + '?token=forged'
+
+        res = APIClient().put(url, create_jpeg_bytes(), content_type='image/jpeg')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_request_upload_invalid_content_type(self):
+        """Test that only image uploads can be requested."""
+        res = self.client.post(
+            get_direct_upload_url(self.recipe.id), {'content_type': 'text/html'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
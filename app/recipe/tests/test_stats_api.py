@@ -0,0 +1,140 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag, UserRecipeStats
+from core.query_audit import QueryAuditTestMixin
+from recipe.stats import recompute
+
+STATS_URL = reverse('recipe:stats')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def snapshot(user_id):
+    stats = UserRecipeStats.objects.get(user_id=user_id)
+    return (
+        stats.recipe_count,
+        stats.total_time_minutes,
+        stats.total_price,
+        stats.price_buckets,
+        stats.tag_counts,
+        stats.ingredient_counts,
+    )
+
+
+class PublicStatsApiTest(TestCase):
+    def test_login_required(self):
+        """Test that login is required for statistics."""
+        res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateStatsApiTest(QueryAuditTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@gmail.com', 'password123')
+        self.client.force_authenticate(self.user)
+        self.vegan = Tag.objects.create(user=self.user, name='Vegan')
+        self.quick = Tag.objects.create(user=self.user, name='Quick')
+        self.salt = Ingredient.objects.create(user=self.user, name='Salt')
+
+    def _create_recipe(self, **params):
+        payload = {'title': 'Soup', 'time_minutes': 10, 'price': '4.00'}
+        payload.update(params)
+        res = self.client.post(RECIPES_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return Recipe.objects.get(id=res.data['id'])
+
+    def test_stats(self):
+        """Test the statistics of the user's recipes."""
+        self._create_recipe(tags=[self.vegan.id, self.quick.id], ingredients=[self.salt.id])
+        self._create_recipe(time_minutes=30, price='12.00', tags=[self.vegan.id])
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 2)
+        self.assertEqual(res.data['average_time_minutes'], 20)
+        self.assertEqual(res.data['average_price'], 8)
+        self.assertEqual(
+            [bucket['recipes'] for bucket in res.data['price_distribution']], [1, 0, 1, 0, 0]
+        )
+        self.assertEqual(res.data['price_distribution'][0]['range'], '0-5')
+        self.assertEqual(
+            res.data['top_tags'],
+            [
+                {'id': self.vegan.id, 'name': 'Vegan', 'recipes': 2},
+                {'id': self.quick.id, 'name': 'Quick', 'recipes': 1},
+            ],
+        )
+        self.assertEqual(res.data['top_ingredients'][0]['recipes'], 1)
+
+    def test_stats_without_recipes(self):
+        """Test statistics of a user without recipes."""
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertIsNone(res.data['average_price'])
+
+    def test_incremental_stats_match_recompute(self):
+        """Test that maintained statistics equal a full recompute after changes."""
+        first = self._create_recipe(tags=[self.vegan.id], ingredients=[self.salt.id])
+        second = self._create_recipe(price='25.00', tags=[self.quick.id])
+        third = self._create_recipe(price='60.00')
+
+        self.client.patch(
+            reverse('recipe:recipe-detail', args=[first.id]),
+            {'price': '7.50', 'tags': [self.quick.id]},
+        )
+        self.vegan.recipe_set.add(second, third)
+        self.quick.delete()
+        third.ingredients.add(self.salt)
+        third.ingredients.clear()
+        second.delete()
+        incremental = snapshot(self.user.id)
+
+        recompute(self.user.id)
+
+        self.assertEqual(incremental, snapshot(self.user.id))
+        self.assertEqual(incremental[0], 2)
+
+    def test_stats_read_with_fixed_queries(self):
+        """Test that reading statistics does not aggregate over recipes."""
+        for _ in range(5):
+            self._create_recipe(tags=[self.vegan.id], ingredients=[self.salt.id])
+
+        with self.assertQueryBudget(3):
+            self.client.get(STATS_URL)
+
+    def test_recompute_stats_command(self):
+        """Test that the command repairs drifted statistics."""
+        self._create_recipe(tags=[self.vegan.id])
+        UserRecipeStats.objects.filter(user=self.user).update(recipe_count=42, tag_counts={})
+
+        call_command('recompute_stats', stdout=StringIO())
+
+        stats = UserRecipeStats.objects.get(user=self.user)
+        self.assertEqual(stats.recipe_count, 1)
+        self.assertEqual(stats.tag_counts, {str(self.vegan.id): 1})
+
+    def test_recompute_stats_command_locks_user(self):
+        """Test that the command takes the user's lock before recomputing."""
+        # Without writes in this transaction yet, which would have locked the user.
+        user = get_user_model().objects.create_user('other@gmail.com', 'testpass')
+
+        with CaptureQueriesContext(connection) as context:
+            call_command('recompute_stats', user=[user.id], stdout=StringIO())
+
+        queries = [query['sql'] for query in context.captured_queries]
+        lock = next(i for i, sql in enumerate(queries) if 'pg_advisory_xact_lock' in sql)
+        stats = next(i for i, sql in enumerate(queries) if 'core_userrecipestats' in sql)
+        self.assertLess(lock, stats)
@@ -0,0 +1,120 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import ChangeLogEntry, Ingredient, Recipe, Tag
+from core.query_audit import QueryAuditTestMixin
+
+SYNC_URL = reverse('recipe:sync')
+
+
+class PublicSyncApiTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_login_required(self):
+        """Test that login is required for syncing."""
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateSyncApiTest(QueryAuditTestMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@gmail.com',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+
+    def _create_recipe(self, **params):
+        defaults = {'title': 'Soup', 'time_minutes': 10, 'price': 5}
+        defaults.update(params)
+        return Recipe.objects.create(user=self.user, **defaults)
+
+    def _sync(self, since=0):
+        res = self.client.get(SYNC_URL, {'since': since})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def test_sync_returns_changes_after_since(self):
+        """Test that only objects changed after `since` are returned."""
+        old = self._create_recipe(title='Old')
+        seq = self._sync()['seq']
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe = self._create_recipe(title='New')
+        recipe.tags.add(tag)
+
+        data = self._sync(seq)
+
+        self.assertEqual([item['id'] for item in data['recipes']['changed']], [recipe.id])
+        self.assertEqual(data['recipes']['changed'][0]['tags'], [tag.id])
+        self.assertEqual([item['id'] for item in data['tags']['changed']], [tag.id])
+        self.assertNotIn(old.id, [item['id'] for item in data['recipes']['changed']])
+        self.assertEqual(data['seq'], ChangeLogEntry.objects.latest('id').id)
+        self.assertFalse(data['has_more'])
+
+    def test_sync_returns_tombstones(self):
+        """Test that deleted objects are returned as ids."""
+        recipe = self._create_recipe()
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe.ingredients.add(ingredient)
+        seq = self._sync()['seq']
+
+        ingredient_id, recipe_id = ingredient.id, recipe.id
+        ingredient.delete()
+        recipe.delete()
+        data = self._sync(seq)
+
+        self.assertEqual(data['recipes'], {'changed': [], 'deleted': [recipe_id]})
+        self.assertEqual(data['ingredients'], {'changed': [], 'deleted': [ingredient_id]})
+
+    def test_sync_records_reverse_link_changes(self):
+        """Test that linking from the tag side marks the recipe as changed."""
+        recipe = self._create_recipe()
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        seq = self._sync()['seq']
+
+        tag.recipe_set.add(recipe)
+        data = self._sync(seq)
+
+        self.assertEqual([item['id'] for item in data['recipes']['changed']], [recipe.id])
+
+    def test_sync_is_limited_to_user(self):
+        """Test that changes of other users are not returned."""
+        other_user = get_user_model().objects.create_user('other@gmail.com', 'password123')
+        Tag.objects.create(user=other_user, name='Foreign')
+
+        data = self._sync()
+
+        self.assertEqual(data['tags'], {'changed': [], 'deleted': []})
+        self.assertEqual(data['seq'], 0)
+
+    def test_sync_query_count_independent_of_changes(self):
+        """Test that a sync takes a fixed number of queries."""
+        for i in range(20):
+            self._create_recipe(title=f'Recipe {i}')
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+
+        with self.assertQueryBudget(5):
+            data = self._sync()
+
+        self.assertEqual(len(data['recipes']['changed']), 20)
+
+    def test_sync_invalid_since(self):
+        """Test that an invalid `since` is rejected."""
+        res = self.client.get(SYNC_URL, {'since': 'yesterday'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deleting_user_removes_change_log(self):
+        """Test that the change log goes away with the user."""
+        self._create_recipe()
+
+        self.user.delete()
+
+        self.assertFalse(ChangeLogEntry.objects.exists())
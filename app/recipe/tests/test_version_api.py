@@ -0,0 +1,142 @@
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+from PIL import Image
+
+from core.models import Recipe
+from recipe.versions import PreconditionFailed, bump_version, parse_if_match
+
+
+def detail_url(recipe_id):
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def image_file() -> SimpleUploadedFile:
+    buffer = BytesIO()
+    Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+    return SimpleUploadedFile('image.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+class ParseIfMatchTests(SimpleTestCase):
+    def test_parse_if_match(self):
+        """Test that strong and weak version tags are accepted, others ignored."""
+        self.assertIsNone(parse_if_match(None))
+        self.assertIsNone(parse_if_match('*'))
+        self.assertEqual(parse_if_match('"3"'), [3])
+        self.assertEqual(parse_if_match('W/"3", "5"'), [3, 5])
+        self.assertEqual(parse_if_match('"abc"'), [])
+
+
+class RecipeVersionApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('test@gmail.com', 'password123')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title='Omelette', time_minutes=10, price=5
+        )
+
+    def _patch(self, data, if_match=None):
+        headers = {} if if_match is None else {'HTTP_IF_MATCH': if_match}
+        return self.client.patch(detail_url(self.recipe.id), data, format='json', **headers)
+
+    def test_retrieve_sends_version_as_etag(self):
+        """Test that the detail of a recipe has its version as ETag."""
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res['ETag'], '"1"')
+        self.assertEqual(res.data['version'], 1)
+
+    def test_update_with_matching_version(self):
+        """Test that an update with the current version applies and increments it."""
+        res = self._patch({'title': 'Pancakes'}, if_match='"1"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['ETag'], '"2"')
+        self.assertEqual(res.data['version'], 2)
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.title, self.recipe.version), ('Pancakes', 2))
+
+    def test_weak_etag_accepted(self):
+        """Test that the weak ETag of a compressed response matches too."""
+        payload = {'title': 'Pancakes', 'time_minutes': 5, 'price': '2.00'}
+        payload.update(tags=[], ingredients=[])
+
+        res = self.client.put(
+            detail_url(self.recipe.id), payload, format='json', HTTP_IF_MATCH='W/"1"'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_stale_version_rejected(self):
+        """Test that an update of an outdated version fails with 412 and changes nothing."""
+        self._patch({'title': 'Pancakes'})
+
+        res = self._patch({'title': 'Waffles'}, if_match='"1"')
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.title, self.recipe.version), ('Pancakes', 2))
+
+    def test_concurrent_update_rejected(self):
+        """Test that the conditional update fails when another write won the race."""
+        recipe = Recipe.objects.get(id=self.recipe.id)
+        Recipe.objects.filter(id=recipe.id).update(title='Crepes', version=2)
+
+        with CaptureQueriesContext(connection) as context:
+            with self.assertRaises(PreconditionFailed):
+                bump_version(recipe, [1])
+
+        self.assertEqual(Recipe.objects.get(id=recipe.id).version, 2)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertTrue(context.captured_queries[0]['sql'].startswith('UPDATE'))
+
+    def test_update_without_if_match_increments_version(self):
+        """Test that updates without If-Match still apply and increment the version."""
+        self._patch({'title': 'Pancakes'})
+        res = self._patch({'title': 'Waffles'}, if_match='*')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['ETag'], '"3"')
+        self.assertEqual(Recipe.objects.get(id=self.recipe.id).version, 3)
+
+    def test_update_saves_only_given_fields(self):
+        """Test that an update writes the given fields and the version, not the image."""
+        with CaptureQueriesContext(connection) as context:
+            self._patch({'title': 'Pancakes'})
+
+        updates = [
+            query['sql']
+            for query in context.captured_queries
+            if query['sql'].startswith('UPDATE "core_recipe" ')
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"title"', updates[0])
+        self.assertNotIn('"image"', updates[0])
+
+    def test_image_upload_increments_version(self):
+        """Test that an image upload increments the version, so stale updates are rejected."""
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root
+        ):
+            res = self.client.post(
+                reverse('recipe:recipe-upload-image', args=[self.recipe.id]),
+                {'image': image_file()},
+                format='multipart',
+            )
+            stale = self._patch({'title': 'Pancakes'}, if_match='"1"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(stale.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.title, self.recipe.version), ('Omelette', 2))
+        self.assertTrue(self.recipe.image.name)
@@ -13,4 +13,6 @@ app_name = 'recipe'
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('sync/', views.SyncView.as_view(), name='sync'),
+    path('stats/', views.StatsView.as_view(), name='stats'),
 ]
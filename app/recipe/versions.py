@@ -0,0 +1,70 @@
+from typing import Iterable, List, Optional
+
+from django.db.models import F
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from core.models import Recipe
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The recipe was changed since it was read, fetch it again.'
+    default_code = 'precondition_failed'
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def parse_if_match(header: Optional[str]) -> Optional[List[int]]:
+    """Return the versions an If-Match header accepts, None for any version.
+
+    Weak tags are compared as strong ones: the compression middleware
+    weakens the ETag of compressed responses, the recipe they name is the
+    same.
+    """
+    if header is None:
+        return None
+    versions = []
+    for tag in parse_etags(header):
+        if tag == '*':
+            return None
+        tag = tag[2:] if tag.startswith('W/') else tag
+        if tag[1:-1].isdigit():
+            versions.append(int(tag[1:-1]))
+    return versions
+
+
+def bump_version(recipe: Recipe, versions: Optional[List[int]]) -> None:
+    """Increment the version of `recipe` before it is saved.
+
+    When `versions` are given, the row is only updated if its version is
+    still the one `recipe` was read with, and one of them. The conditional
+    UPDATE holds the row until the transaction ends, no lock is taken for
+    reading. Raises PreconditionFailed otherwise. Without `versions` the
+    version is incremented by the save, refresh it afterwards.
+    """
+    if versions is None:
+        recipe.version = F('version') + 1
+        return
+    updated = recipe.version in versions and (
+        Recipe.objects.filter(pk=recipe.pk, version=recipe.version).update(
+            version=F('version') + 1
+        )
+    )
+    if not updated:
+        raise PreconditionFailed()
+    recipe.version += 1
+
+
+def save_new_version(recipe: Recipe, fields: Iterable[str]) -> None:
+    """Save only `fields` of `recipe` and increment its version.
+
+    Writes outside of updates, like image uploads, change the version too,
+    so an update of the version read before them is rejected.
+    """
+    recipe.version = F('version') + 1
+    recipe.save(update_fields=[*fields, 'version'])
+    recipe.refresh_from_db(fields=['version'])
@@ -1,26 +1,55 @@
 from typing import List
 
-from rest_framework import viewsets, mixins
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from rest_framework import serializers, viewsets, mixins
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
 
-from core.models import Tag, Ingredient, Recipe
+from core.authentication import ExpiringTokenAuthentication, SignedTokenAuthentication
+from core.idempotency import idempotent
+from core.models import RECIPE_PATH, ChangeLogEntry, Tag, Ingredient, Recipe
+from core.storage import new_upload_name, supports_direct_upload
+from recipe import changes, matching, versions
+from recipe.changelog import changes_since
+from recipe.copies import copy_recipes
+from recipe.stats import get_stats, price_bucket_labels
 from recipe.serializers import (
     TagSerializer,
     IngredientSerializer,
     RecipeSerializer,
     RecipeDetailSerializer,
     RecipeImageSerializer,
+    RecipeImageUploadUrlSerializer,
+    RecipeImageAttachSerializer,
+    RecipeCopySerializer,
+    RecipeBatchSerializer,
+    make_image_upload_token,
+)
+
+SYNC_PAGE_SIZE = 500
+MATCHING_MAX_LIMIT = 100
+STATS_TOP_COUNT = 5
+# Fields recipes can be ordered by, the range filtered ones are indexed per user.
+RECIPE_ORDERING_FIELDS = ('id', 'title', 'time_minutes', 'price')
+# Parse the range filter params, only values the columns can hold reach the database.
+RECIPE_RANGE_FIELDS = (
+    ('time_minutes', serializers.IntegerField(min_value=0, max_value=2 ** 31 - 1)),
+    ('price', serializers.DecimalField(max_digits=6, decimal_places=2)),
 )
 
 
 class BaseViewSet(
     viewsets.GenericViewSet, mixins.ListModelMixin, mixins.CreateModelMixin
 ):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (SignedTokenAuthentication, ExpiringTokenAuthentication)
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
@@ -31,9 +60,14 @@ class BaseViewSet(
             queryset = queryset.filter(recipe__isnull=False)
         return queryset.order_by('-name').distinct()
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Creates a new object."""
-        serializer.save(user=self.request.user)
+        with changes.batch():
+            serializer.save(user=self.request.user)
 
 
 class TagViewSet(BaseViewSet):
@@ -50,36 +84,226 @@ class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthenticated,)
     queryset = Recipe.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (SignedTokenAuthentication, ExpiringTokenAuthentication)
 
     def get_queryset(self):
         """Return objects for the current authenticated user."""
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset.filter(user=self.request.user).order_by('-id')
+        queryset = (
+            self.queryset.filter(user=self.request.user)
+            .prefetch_related('tags', 'ingredients')
+            .order_by('-id')
+        )
         if tags:
             tag_ids = self._params_to_ints(tags)
             queryset = queryset.filter(tags__id__in=tag_ids)
         if ingredients:
             ingredients_ids = self._params_to_ints(ingredients)
             queryset = queryset.filter(ingredients__id__in=ingredients_ids)
+        if self.action == 'list':
+            queryset = queryset.filter(**self._range_filters())
+            queryset = queryset.order_by(*self._ordering())
         return queryset
 
+    def _range_filters(self) -> dict:
+        """Return lookups for the `time_minutes_min/max` and `price_min/max` params."""
+        params = self.request.query_params
+        filters = {}
+        for field, parser in RECIPE_RANGE_FIELDS:
+            for suffix, lookup in (('min', 'gte'), ('max', 'lte')):
+                name = f'{field}_{suffix}'
+                if name not in params:
+                    continue
+                try:
+                    filters[f'{field}__{lookup}'] = parser.run_validation(params[name])
+                except ValidationError as error:
+                    raise ValidationError({name: error.detail})
+        return filters
+
+    def _ordering(self) -> List[str]:
+        """Return the fields of the `ordering` param, newest recipes first by default."""
+        ordering = self.request.query_params.get('ordering')
+        if not ordering:
+            return ['-id']
+        fields = ordering.split(',')
+        invalid = [name for name in fields if name.lstrip('-') not in RECIPE_ORDERING_FIELDS]
+        if invalid:
+            choices = ', '.join(RECIPE_ORDERING_FIELDS)
+            raise ValidationError({'ordering': f'Unknown fields {invalid}, choose from {choices}.'})
+        if not any(name.lstrip('-') == 'id' for name in fields):
+            # A unique tie breaker keeps the order stable.
+            fields.append('-id' if fields[0].startswith('-') else 'id')
+        return fields
+
+    def get_object(self):
+        """Return the user's recipe by primary key, ignoring list filters.
+
+        The recipe is looked up on the (user, id) index and kept for the rest
+        of the request.
+        """
+        if getattr(self, '_object', None) is not None:
+            return self._object
+
+        try:
+            pk = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise Http404
+        queryset = self.queryset
+        if self.action == 'retrieve':
+            queryset = queryset.prefetch_related('tags', 'ingredients')
+        recipe = get_object_or_404(queryset, user=self.request.user, pk=pk)
+
+        self.check_object_permissions(self.request, recipe)
+        self._object = recipe
+        return recipe
+
     def _params_to_ints(self, qs) -> List[int]:
         """Convert a list of string IDs to a list of integers."""
         return [int(num) for num in qs.split(',')]
 
     def get_serializer_class(self):
-        if self.action == 'retrieve':
+        if self.action in ('retrieve', 'batch'):
             return RecipeDetailSerializer
         elif self.action == 'upload_image':
             return RecipeImageSerializer
+        elif self.action == 'image_upload_url':
+            return RecipeImageUploadUrlSerializer
+        elif self.action == 'attach_image':
+            return RecipeImageAttachSerializer
+        elif self.action == 'copy_many':
+            return RecipeCopySerializer
         return RecipeSerializer
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
-        return serializer.save(user=self.request.user)
+        with changes.batch():
+            return serializer.save(user=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        response['ETag'] = versions.etag(self.get_object().version)
+        return response
+
+    def update(self, request, *args, **kwargs):
+        """Update a recipe, only if it is still the version of `If-Match` when given."""
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = versions.etag(self.get_object().version)
+        return response
+
+    def perform_update(self, serializer):
+        if_match = versions.parse_if_match(self.request.headers.get('If-Match'))
+        with transaction.atomic():
+            versions.bump_version(serializer.instance, if_match)
+            with changes.batch():
+                serializer.save()
+        if if_match is None:
+            serializer.instance.refresh_from_db(fields=['version'])
+
+    def perform_destroy(self, instance):
+        with changes.batch():
+            instance.delete()
+
+    @action(methods=['GET'], detail=False, url_path='matching')
+    def matching(self, request):
+        """Rank recipes by how well their ingredients match the given ones.
+
+        Takes `ingredients` (comma separated ids), `metric` (`coverage`, the
+        share of a recipe's ingredients that are given, or `jaccard`) and
+        `limit`.
+        """
+        params = request.query_params
+        try:
+            ingredient_ids = set(self._params_to_ints(params.get('ingredients', '')))
+        except ValueError:
+            raise ValidationError({'ingredients': 'Expected comma separated ids.'})
+        metric = params.get('metric', matching.COVERAGE)
+        if metric not in matching.METRICS:
+            raise ValidationError({'metric': f'Expected one of {", ".join(matching.METRICS)}.'})
+        try:
+            limit = min(max(int(params.get('limit', 20)), 1), MATCHING_MAX_LIMIT)
+        except ValueError:
+            raise ValidationError({'limit': 'Expected a number.'})
+
+        matches = matching.match(request.user.id, ingredient_ids, metric, limit)
+        recipes = {
+            recipe.slot: recipe
+            for recipe in self.queryset.filter(
+                user=request.user, slot__in=[match.slot for match in matches]
+            ).prefetch_related('tags', 'ingredients')
+        }
+        results = []
+        for match in matches:
+            if match.slot in recipes:
+                data = self.get_serializer(recipes[match.slot]).data
+                data.update(score=match.score, matched_ingredients=match.matched)
+                results.append(data)
+        return Response(results)
+
+    def _copy(self, recipes: List[Recipe]) -> list:
+        """Copy recipes to the user and return the serialized copies in the same order."""
+        copies = copy_recipes(recipes, self.request.user)
+        queryset = self.queryset.filter(id__in=[copy.id for copy in copies])
+        return RecipeSerializer(
+            queryset.prefetch_related('tags', 'ingredients').order_by('id'), many=True
+        ).data
+
+    @action(methods=['POST'], detail=True, url_path='copy')
+    @idempotent
+    def copy(self, request, pk=None):
+        """Copy a recipe with its tags, ingredients and image."""
+        data = self._copy([self.get_object()])
+        return Response(data[0], status=status.HTTP_201_CREATED)
+
+    @action(methods=['POST'], detail=False, url_path='copy', url_name='copy-many')
+    @idempotent
+    def copy_many(self, request):
+        """Copy the recipes of the given `ids`, return the copies in the same order."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        recipes = self.queryset.filter(user=request.user, id__in=ids).in_bulk()
+        missing = [pk for pk in ids if pk not in recipes]
+        if missing:
+            raise ValidationError({'ids': [f'Recipes not found: {missing}.']})
+        return Response(self._copy([recipes[pk] for pk in ids]), status=status.HTTP_201_CREATED)
+
+    @action(methods=['GET', 'POST'], detail=False, url_path='batch')
+    def batch(self, request):
+        """Return the detail of the recipes of the given `ids`, in the same order.
+
+        Takes the ids as `?ids=1,2,3` or a JSON body `{"ids": [1, 2, 3]}`.
+        Ids of recipes that do not exist or belong to other users are
+        reported together in `missing`.
+        """
+        data = request.data
+        if request.method == 'GET':
+            try:
+                data = {'ids': self._params_to_ints(request.query_params.get('ids', ''))}
+            except ValueError:
+                raise ValidationError({'ids': 'Expected comma separated ids.'})
+        serializer = RecipeBatchSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+
+        recipes = (
+            self.queryset.filter(user=request.user, id__in=ids)
+            .prefetch_related('tags', 'ingredients')
+            .in_bulk()
+        )
+        found = [recipes[pk] for pk in ids if pk in recipes]
+        return Response(
+            {
+                'results': self.get_serializer(found, many=True).data,
+                'missing': [pk for pk in ids if pk not in recipes],
+            }
+        )
 
     @action(methods=['POST'], detail=True, url_path='upload-image')
+    @idempotent
     def upload_image(self, request, pk=None):
         """Upload an image to recipe."""
         recipe = self.get_object()
@@ -89,3 +313,134 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['POST'], detail=True, url_path='image-upload-url')
+    def image_upload_url(self, request, pk=None):
+        """Return a presigned request that uploads an image straight to storage.
+
+        When the client sends the SHA-256 of an image the user already
+        attached to a recipe, there is nothing to upload and `upload` is null.
+        Content stored for other users is uploaded again, whether it is
+        stored is not revealed.
+        """
+        recipe = self.get_object()
+        if not supports_direct_upload():
+            return Response(
+                {'detail': 'Direct uploads are not supported by the storage.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = self.get_serializer(data=request.data)
+
+        if serializer.is_valid():
+            content_type = serializer.validated_data['content_type']
+            sha256 = serializer.validated_data.get('sha256')
+            name = new_upload_name(RECIPE_PATH, content_type, sha256)
+            expires_in = settings.OBJECT_STORAGE['UPLOAD_EXPIRES']
+            if sha256 and Recipe.objects.filter(user=request.user, image=name).exists():
+                # Content addressed and referenced by the user, nothing to upload.
+                upload = None
+            else:
+                upload = default_storage.presign_upload(name, content_type, expires_in, sha256)
+            data = {
+                'upload': upload,
+                'upload_token': make_image_upload_token(recipe, name),
+                'expires_in': expires_in,
+            }
+            return Response(data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['POST'], detail=True, url_path='image-upload-complete')
+    def attach_image(self, request, pk=None):
+        """Attach an image uploaded with `image-upload-url` to recipe."""
+        recipe = self.get_object()
+        serializer = self.get_serializer(recipe, data=request.data)
+
+        # The uploaded file stays locked from its validation until it is referenced.
+        with transaction.atomic():
+            if serializer.is_valid():
+                serializer.save()
+                return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class SyncView(APIView):
+    """Return the user's objects changed after the `since` sequence.
+
+    Saved objects are returned in full, deleted ones as ids. Clients pass the
+    returned `seq` as `since` next time and fetch again while `has_more`.
+    """
+
+    authentication_classes = (SignedTokenAuthentication, ExpiringTokenAuthentication)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            since = -1
+        if since < 0:
+            raise ValidationError({'since': 'Must be a non-negative integer.'})
+
+        entries = changes_since(request.user, since, SYNC_PAGE_SIZE)
+        data = {'seq': entries.seq, 'has_more': entries.has_more}
+        for key, model, queryset, serializer_class in (
+            (
+                'recipes',
+                ChangeLogEntry.RECIPE,
+                Recipe.objects.prefetch_related('tags', 'ingredients'),
+                RecipeSerializer,
+            ),
+            ('tags', ChangeLogEntry.TAG, Tag.objects.all(), TagSerializer),
+            (
+                'ingredients',
+                ChangeLogEntry.INGREDIENT,
+                Ingredient.objects.all(),
+                IngredientSerializer,
+            ),
+        ):
+            saved_ids = entries.saved[model]
+            objects = list(queryset.filter(user=request.user, id__in=saved_ids).order_by('id'))
+            # Deleted again after the last entry of this page.
+            gone = saved_ids - {obj.id for obj in objects}
+            data[key] = {
+                'changed': serializer_class(objects, many=True).data,
+                'deleted': sorted(entries.deleted[model] | gone),
+            }
+        return Response(data)
+
+
+class StatsView(APIView):
+    """Return statistics over the user's recipes, read from maintained aggregates."""
+
+    authentication_classes = (SignedTokenAuthentication, ExpiringTokenAuthentication)
+    permission_classes = (IsAuthenticated,)
+
+    def _top(self, model, counts: dict) -> list:
+        top = sorted(counts.items(), key=lambda item: (-item[1], int(item[0])))[:STATS_TOP_COUNT]
+        names = dict(
+            model.objects.filter(id__in=[int(pk) for pk, _ in top]).values_list('id', 'name')
+        )
+        return [
+            {'id': int(pk), 'name': names[int(pk)], 'recipes': total}
+            for pk, total in top
+            if int(pk) in names
+        ]
+
+    def get(self, request):
+        stats = get_stats(request.user.id)
+        count = stats.recipe_count
+        return Response(
+            {
+                'recipe_count': count,
+                'average_time_minutes': round(stats.total_time_minutes / count, 2)
+                if count
+                else None,
+                'average_price': round(stats.total_price / count, 2) if count else None,
+                'price_distribution': [
+                    {'range': label, 'recipes': total}
+                    for label, total in zip(price_bucket_labels(), stats.price_buckets)
+                ],
+                'top_tags': self._top(Tag, stats.tag_counts),
+                'top_ingredients': self._top(Ingredient, stats.ingredient_counts),
+            }
+        )
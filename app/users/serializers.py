@@ -72,3 +72,9 @@ class AuthUserSerializer(serializers.Serializer):
             raise serializers.ValidationError(msg, code='authentication')
         data['user'] = user
         return data
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer for a refresh token."""
+
+    refresh = serializers.CharField()
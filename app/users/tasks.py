@@ -0,0 +1,123 @@
+from collections import Counter
+from datetime import timedelta
+from typing import Callable, List
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router, transaction
+from django.db.models import QuerySet
+from django.utils import timezone
+
+from core import images
+from core.models import (
+    ChangeLogEntry,
+    Ingredient,
+    IngredientBitmap,
+    IngredientIndex,
+    Recipe,
+    Tag,
+    UserRecipeStats,
+)
+from core.tasks import enqueue, task
+
+
+def get_purge_settings() -> dict:
+    return settings.USER_PURGE
+
+
+def soft_delete_user(user):
+    """Deactivate the user at once and queue the purge of its data.
+
+    Deactivation hides the user and its data from the API: it can no longer
+    log in and its tokens are revoked.
+    """
+    with transaction.atomic():
+        user.deleted_at = timezone.now()
+        user.is_active = False
+        user.save(update_fields=['deleted_at', 'is_active'])
+        enqueue(purge_user, {'user_id': user.pk}, key=f'purge-user:{user.pk}')
+
+
+def _delete_in_batches(
+    queryset: QuerySet, batch_size: int, before: Callable[[List[int]], None] = None
+) -> int:
+    """Delete the rows of `queryset`, `batch_size` per transaction, return how many.
+
+    Rows are deleted without collecting related objects or sending signals,
+    `before` deletes what refers to a batch of ids first.
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    deleted = 0
+    while True:
+        with transaction.atomic(using=using):
+            ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            if before is not None:
+                before(ids)
+            deleted += model.objects.filter(pk__in=ids)._raw_delete(using)
+
+
+def _delete_links(field: str, ids: List[int]):
+    for through in (Recipe.tags.through, Recipe.ingredients.through):
+        if hasattr(through, field):
+            links = through.objects.filter(**{f'{field}__in': ids})
+            links._raw_delete(router.db_for_write(through))
+
+
+def _delete_recipe_links(recipe_ids: List[int]):
+    """Delete the tags and ingredients links of recipes, releasing their images."""
+    _delete_links('recipe_id', recipe_ids)
+    names = Counter(
+        Recipe.objects.filter(id__in=recipe_ids)
+        .exclude(image__isnull=True)
+        .exclude(image='')
+        .values_list('image', flat=True)
+    )
+    for name, count in names.items():
+        images.release(name, count)
+    if names:
+        # The files are deleted once the grace period for shared files passed.
+        grace = get_purge_settings()['IMAGE_GRACE_SECONDS']
+        enqueue(delete_released_images, {'names': list(names)}, delay=grace + 1)
+
+
+@task
+def purge_user(user_id: int):
+    """Delete a soft deleted user with its data, in short transactions.
+
+    The user's aggregates are deleted first, so nothing is maintained for
+    the rows deleted after them. The purge resumes where it stopped when
+    retried.
+    """
+    user = get_user_model().objects.filter(pk=user_id, deleted_at__isnull=False).first()
+    if user is None:
+        return
+    batch_size = get_purge_settings()['BATCH_SIZE']
+    UserRecipeStats.objects.filter(user_id=user_id).delete()
+    IngredientIndex.objects.filter(user_id=user_id).delete()
+    _delete_in_batches(IngredientBitmap.objects.filter(user_id=user_id), batch_size)
+    _delete_in_batches(
+        Recipe.objects.filter(user_id=user_id), batch_size, before=_delete_recipe_links
+    )
+    _delete_in_batches(
+        Tag.objects.filter(user_id=user_id),
+        batch_size,
+        before=lambda ids: _delete_links('tag_id', ids),
+    )
+    _delete_in_batches(
+        Ingredient.objects.filter(user_id=user_id),
+        batch_size,
+        before=lambda ids: _delete_links('ingredient_id', ids),
+    )
+    _delete_in_batches(ChangeLogEntry.objects.filter(user_id=user_id), batch_size)
+    # Only small rows, like tokens, are left to cascade.
+    user.delete()
+
+
+@task
+def delete_released_images(names: List[str]):
+    """Delete the files of images nothing refers to anymore."""
+    grace = timedelta(seconds=get_purge_settings()['IMAGE_GRACE_SECONDS'])
+    images.collect_garbage(grace, names=names)
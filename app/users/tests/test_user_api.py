@@ -1,14 +1,42 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
 
 from rest_framework import status
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
+from core import tasks
+from core.authentication import revocation_list
+from core.models import (
+    ChangeLogEntry,
+    Ingredient,
+    RefreshToken,
+    Recipe,
+    StoredFile,
+    Tag,
+    Task,
+    UserRecipeStats,
+)
+from users.tasks import delete_released_images, purge_user, soft_delete_user
+
 
 CREATE_USER_URL = reverse('users:create')
 TOKEN_URL = reverse('users:token')
 USER_URL = reverse('users:user')
+TOKEN_REFRESH_URL = reverse('users:token-refresh')
+TOKEN_REVOKE_URL = reverse('users:token-revoke')
+TAGS_URL = reverse('recipe:tag-list')
 
 
 def create_user(**params):
@@ -153,3 +181,224 @@ class PrivateUserApiTests(TestCase):
         self.user.refresh_from_db()
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
+
+
+class SignedTokenApiTests(TestCase):
+    """Test signed access tokens and refresh token rotation."""
+
+    def setUp(self):
+        self.payload = {'email': 'test@gmail.com', 'password': 'testpass'}
+        self.user = create_user(**self.payload, name='User')
+        self.client = APIClient()
+        revocation_list.invalidate()
+
+    def _login(self):
+        res = self.client.post(TOKEN_URL, self.payload)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def _get(self, url, access):
+        return APIClient().get(url, HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def test_access_token_needs_one_auth_query(self):
+        """Test that requests with an access token only load the user, not tokens."""
+        tokens = self._login()
+        self._get(TAGS_URL, tokens['access'])
+
+        with self.assertNumQueries(2):
+            res = self._get(TAGS_URL, tokens['access'])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_access_token_of_deactivated_user_rejected(self):
+        """Test that access tokens stop working as soon as their user is deactivated."""
+        tokens = self._login()
+        self._get(TAGS_URL, tokens['access'])
+
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+
+        self.assertEqual(self._get(TAGS_URL, tokens['access']).status_code, 401)
+
+    @override_settings(AUTH_TOKENS=dict(settings.AUTH_TOKENS, DATABASE_TOKEN_LIFETIME_DAYS=1))
+    def test_database_token_expires(self):
+        """Test that database tokens expire and logging in again replaces them."""
+        token = self._login()['token']
+        Token.objects.filter(key=token).update(created=timezone.now() - timedelta(days=2))
+
+        expired = APIClient().get(TAGS_URL, HTTP_AUTHORIZATION=f'Token {token}')
+        renewed = self._login()['token']
+
+        self.assertEqual(expired.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertNotEqual(renewed, token)
+        res = APIClient().get(TAGS_URL, HTTP_AUTHORIZATION=f'Token {renewed}')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_profile_with_access_token(self):
+        """Test that the profile is loaded for an access token user."""
+        tokens = self._login()
+
+        res = self._get(USER_URL, tokens['access'])
+
+        self.assertEqual(res.data, {'email': self.user.email, 'name': 'User'})
+
+    def test_expired_access_token_rejected(self):
+        """Test that access tokens expire."""
+        tokens = self._login()
+
+        with patch('django.core.signing.time.time', return_value=2 ** 40):
+            res = self._get(TAGS_URL, tokens['access'])
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tampered_access_token_rejected(self):
+        """Test that access tokens are verified."""
+        tokens = self._login()
+
+        res = self._get(TAGS_URL, tokens['access'][:-2] + 'xx')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_rotates_token(self):
+        """Test that a refresh token is exchanged once for new tokens."""
+        tokens = self._login()
+
+        res = self.client.post(TOKEN_REFRESH_URL, {'refresh': tokens['refresh']})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data['refresh'], tokens['refresh'])
+        self.assertEqual(self._get(TAGS_URL, res.data['access']).status_code, 200)
+
+    def test_refresh_token_reuse_revokes_family(self):
+        """Test that presenting a used refresh token revokes every token of its family."""
+        tokens = self._login()
+        rotated = self.client.post(TOKEN_REFRESH_URL, {'refresh': tokens['refresh']}).data
+
+        reuse = self.client.post(TOKEN_REFRESH_URL, {'refresh': tokens['refresh']})
+
+        self.assertEqual(reuse.status_code, status.HTTP_401_UNAUTHORIZED)
+        res = self.client.post(TOKEN_REFRESH_URL, {'refresh': rotated['refresh']})
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self._get(TAGS_URL, rotated['access']).status_code, 401)
+
+    def test_revoke_token(self):
+        """Test that revoking a refresh token rejects its access tokens."""
+        tokens = self._login()
+
+        res = self.client.post(TOKEN_REVOKE_URL, {'refresh': tokens['refresh']})
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._get(TAGS_URL, tokens['access']).status_code, 401)
+
+    def test_password_change_revokes_tokens(self):
+        """Test that changing the password revokes issued tokens."""
+        tokens = self._login()
+
+        self.user.set_password('newpassword')
+        self.user.save()
+
+        self.assertTrue(RefreshToken.objects.get(user=self.user).revoked_at)
+        self.assertEqual(self._get(TAGS_URL, tokens['access']).status_code, 401)
+
+
+class DeleteUserApiTests(TestCase):
+    """Test deleting users and purging their data."""
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.payload = {'email': 'test@gmail.com', 'password': 'testpass'}
+        self.user = create_user(**self.payload)
+        self.other = create_user(email='other@gmail.com', password='testpass')
+        self.client = APIClient()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def _create_data(self, user, recipes=3, image=b'image'):
+        tag = Tag.objects.create(user=user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=user, name='Salt')
+        for i in range(recipes):
+            recipe = Recipe.objects.create(user=user, title=f'Dish {i}', time_minutes=1, price=1)
+            recipe.tags.add(tag)
+            recipe.ingredients.add(ingredient)
+            recipe.image.save('image.jpg', ContentFile(image))
+        return recipe.image.name
+
+    def test_delete_user_hides_it(self):
+        """Test that deleting the user logs it out and queues the purge."""
+        access = self.client.post(TOKEN_URL, self.payload).data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+
+        res = self.client.delete(USER_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.deleted_at)
+        self.assertFalse(self.user.is_active)
+        self.assertEqual(self.client.get(TAGS_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials()
+        res = self.client.post(TOKEN_URL, self.payload)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Task.objects.filter(name=purge_user.task_name).exists())
+
+    @override_settings(USER_PURGE={'BATCH_SIZE': 2, 'IMAGE_GRACE_SECONDS': 0})
+    def test_purge_user(self):
+        """Test that the purge deletes the user's data in batches and nothing else."""
+        name = self._create_data(self.user)
+        self._create_data(self.other, recipes=1, image=b'other')
+        soft_delete_user(self.user)
+
+        tasks.run_pending()
+
+        self.assertFalse(get_user_model().objects.filter(pk=self.user.pk).exists())
+        for model in (Recipe, Tag, Ingredient, ChangeLogEntry, UserRecipeStats):
+            self.assertFalse(model.objects.filter(user_id=self.user.pk).exists())
+            self.assertTrue(model.objects.filter(user=self.other).exists())
+        self.assertEqual(Recipe.tags.through.objects.count(), 1)
+        self.assertEqual(StoredFile.objects.get(name=name).references, 0)
+        self.assertTrue(default_storage.exists(name))
+        self.assertTrue(Task.objects.filter(name=delete_released_images.task_name).exists())
+
+    @override_settings(USER_PURGE={'BATCH_SIZE': 2, 'IMAGE_GRACE_SECONDS': 0})
+    def test_released_images_deleted(self):
+        """Test that images of purged recipes are deleted, shared ones are kept."""
+        name = self._create_data(self.user, recipes=1)
+        shared = self._create_data(self.user, recipes=1, image=b'shared')
+        self._create_data(self.other, recipes=1, image=b'shared')
+        self.user.deleted_at = timezone.now()
+        self.user.save()
+        purge_user(user_id=self.user.pk)
+
+        delete_released_images(names=[name, shared])
+
+        self.assertFalse(default_storage.exists(name))
+        self.assertTrue(default_storage.exists(shared))
+
+    def test_delete_user_queries_do_not_grow(self):
+        """Test that deleting a user does not maintain aggregates of each of its objects."""
+        counts = []
+        for user, recipes in ((self.user, 1), (self.other, 10)):
+            tag = Tag.objects.create(user=user, name='Vegan')
+            ingredient = Ingredient.objects.create(user=user, name='Salt')
+            for _ in range(recipes):
+                recipe = Recipe.objects.create(user=user, title='Dish', time_minutes=1, price=1)
+                recipe.tags.add(tag)
+                recipe.ingredients.add(ingredient)
+            user_id = user.pk
+
+            with CaptureQueriesContext(connection) as context:
+                user.delete()
+
+            counts.append(len(context.captured_queries))
+            self.assertFalse(ChangeLogEntry.objects.filter(user_id=user_id).exists())
+        self.assertEqual(counts[0], counts[1])
+
+    def test_purge_ignores_active_user(self):
+        """Test that users not deleted are not purged."""
+        self._create_data(self.user, recipes=1)
+
+        purge_user(user_id=self.user.pk)
+
+        self.assertTrue(Recipe.objects.filter(user=self.user).exists())
@@ -7,5 +7,7 @@ app_name = 'users'
 urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
     path('token/', views.CreateTokenView.as_view(), name='token'),
+    path('token/refresh/', views.RefreshTokenView.as_view(), name='token-refresh'),
+    path('token/revoke/', views.RevokeTokenView.as_view(), name='token-revoke'),
     path('user/', views.ManageUserView.as_view(), name='user'),
 ]
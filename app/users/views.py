@@ -1,11 +1,23 @@
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions, status
+from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core.authentication import (
+    ExpiringTokenAuthentication,
+    SignedTokenAuthentication,
+    database_token_expired,
+    issue_tokens,
+    revoke_refresh_token,
+    rotate_refresh_token,
+)
+from users.tasks import soft_delete_user
 from users.serializers import (
     UserCreateSerializer,
     AuthUserSerializer,
     UserUpdateSerializer,
+    RefreshTokenSerializer,
 )
 
 
@@ -21,13 +33,58 @@ class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthUserSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        """Return the database token and a signed access token with its refresh token."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        token, created = Token.objects.get_or_create(user=user)
+        if not created and database_token_expired(token):
+            token.delete()
+            token = Token.objects.create(user=user)
+        return Response({'token': token.key, **issue_tokens(user)})
+
+
+class RefreshTokenView(generics.GenericAPIView):
+    """Exchange a refresh token for a new access token and refresh token."""
+
+    serializer_class = RefreshTokenSerializer
+    authentication_classes = ()
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tokens = rotate_refresh_token(serializer.validated_data['refresh'])
+        if tokens is None:
+            return Response(
+                {'detail': 'Invalid, expired or revoked refresh token.'},
+                status=status.HTTP_401_UNAUTHORIZED,
+            )
+        return Response(tokens)
+
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
-    """Manage authenticated user."""
+class RevokeTokenView(generics.GenericAPIView):
+    """Revoke a refresh token and the access tokens issued with it."""
+
+    serializer_class = RefreshTokenSerializer
+    authentication_classes = ()
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        revoke_refresh_token(serializer.validated_data['refresh'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ManageUserView(generics.RetrieveUpdateDestroyAPIView):
+    """Manage authenticated user, deleting it deactivates it and purges its data later."""
 
     serializer_class = UserUpdateSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (SignedTokenAuthentication, ExpiringTokenAuthentication)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
         return self.request.user
+
+    def perform_destroy(self, instance):
+        soft_delete_user(instance)